@@ -10,9 +10,21 @@ def create_app():
     app = Flask(__name__, template_folder=template_dir)
     app.config.from_object(Config)
     
+    # Pool con métricas de espera y overflow (perfil en DB_PERFIL)
+    from app.services.pool_bd import configurar_pool
+    configurar_pool(app)
+    
     # Inicializar extensiones
     db.init_app(app)
     
+    # Pool de bcrypt y costo calibrado para esta máquina
+    from app.services.contrasenas import configurar as configurar_contrasenas
+    configurar_contrasenas(app)
+    
+    # Procesos para las variantes de imagen (se inician con spawn, no fork)
+    from app.services.variantes_imagen import configurar as configurar_variantes
+    configurar_variantes(app)
+    
     # Configurar Flask-Login
     login_manager = LoginManager()
     login_manager.init_app(app)
@@ -22,7 +34,9 @@ def create_app():
     
     @login_manager.user_loader
     def load_user(user_id):
-        return Usuario.query.get(int(user_id))
+        # Usuario y rol en una sola consulta, con caché corta por id
+        from app.services.identidad import cargar_usuario
+        return cargar_usuario(int(user_id))
     
     # Importar y registrar blueprints
     from app.controllers.auth_controller import auth_bp
@@ -30,18 +44,35 @@ def create_app():
     from app.controllers.productos_controller import productos_bp
     from app.controllers.pedidos_controller import pedidos_bp
     from app.controllers.main_controller import main_bp
+    from app.controllers.diagnostico_controller import diagnostico_bp
     
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(usuarios_bp, url_prefix='/usuarios')
     app.register_blueprint(productos_bp, url_prefix='/productos')
     app.register_blueprint(pedidos_bp, url_prefix='/pedidos')
     app.register_blueprint(main_bp)
+    app.register_blueprint(diagnostico_bp, url_prefix='/diagnostico')
+    
+    # Contador del carrito en el menú (lee el carrito del servidor una vez por petición)
+    from app.services.almacen_carrito import cantidad_productos_carrito
+    app.jinja_env.globals['cantidad_carrito'] = cantidad_productos_carrito
+    
+    # Último evento de pedidos al renderizar: las páginas en vivo piden desde ahí
+    from app.services.eventos_pedidos import ultimo_evento
+    app.jinja_env.globals['ultimo_evento_pedidos'] = ultimo_evento
+    
+    # Comandos de mantenimiento (flask --app run ...)
+    from app.comandos import registrar_comandos
+    registrar_comandos(app)
     
     # Crear tablas de base de datos
     with app.app_context():
         db.create_all()
         # Crear roles por defecto si no existen
         crear_roles_por_defecto()
+        # Construir el índice de búsqueda de productos
+        from app.services.busqueda import construir_indice
+        construir_indice()
     
     return app
 
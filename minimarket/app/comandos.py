@@ -0,0 +1,77 @@
+"""
+Comandos de mantenimiento para ejecutar con `flask --app run <comando>`
+"""
+import click
+
+
+def registrar_comandos(app):
+
+    @app.cli.command('limpiar-imagenes')
+    @click.option('--gracia-horas', type=int, default=None,
+                  help='Solo borrar imágenes sin uso más antiguas que esto')
+    def limpiar_imagenes(gracia_horas):
+        """Elimina del almacén las imágenes que ningún producto usa"""
+        from app.services.almacen_imagenes import recolectar_basura
+
+        eliminadas = recolectar_basura(gracia_horas)
+        click.echo(f'Imágenes eliminadas: {eliminadas}')
+
+    @app.cli.command('reconstruir-ventas')
+    @click.option('--desde', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+                  help='Primer día a recalcular (AAAA-MM-DD)')
+    @click.option('--hasta', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+                  help='Último día a recalcular (AAAA-MM-DD)')
+    def reconstruir_ventas(desde, hasta):
+        """Recalcula los resúmenes de ventas desde pedidos y pedido_detalle"""
+        from app.services.ventas import reconstruir_ventas as reconstruir
+
+        reconstruir(desde.date() if desde else None, hasta.date() if hasta else None)
+        click.echo('Resúmenes de ventas reconstruidos')
+
+    @app.cli.command('limpiar-carritos')
+    @click.option('--dias', type=int, default=30, show_default=True,
+                  help='Eliminar carritos anónimos sin cambios hace más de estos días')
+    def limpiar_carritos(dias):
+        """Elimina carritos anónimos abandonados"""
+        from app.services.almacen_carrito import limpiar_carritos_anonimos
+
+        eliminados = limpiar_carritos_anonimos(dias)
+        click.echo(f'Carritos eliminados: {eliminados}')
+
+    @app.cli.command('limpiar-eventos')
+    @click.option('--dias', type=int, default=2, show_default=True,
+                  help='Eliminar eventos de pedidos de hace más de estos días')
+    def limpiar_eventos(dias):
+        """Elimina los eventos de pedidos viejos (las páginas en vivo ya no los piden)"""
+        from app.services.eventos_pedidos import limpiar_eventos as limpiar
+
+        eliminados = limpiar(dias)
+        click.echo(f'Eventos eliminados: {eliminados}')
+
+    @app.cli.command('calibrar-contrasenas')
+    @click.option('--objetivo-ms', type=int, default=None,
+                  help='Tiempo buscado por hash (por defecto CONTRASENAS_OBJETIVO_MS)')
+    def calibrar_contrasenas(objetivo_ms):
+        """Sugiere CONTRASENAS_COSTO para que un hash tarde cerca del objetivo en esta máquina"""
+        from app.services.contrasenas import calibrar_costo
+
+        objetivo_ms = objetivo_ms or app.config['CONTRASENAS_OBJETIVO_MS']
+        costo = calibrar_costo(objetivo_ms, app.config['CONTRASENAS_COSTO_MINIMO'])
+        click.echo(f'CONTRASENAS_COSTO={costo}  (objetivo {objetivo_ms} ms, '
+                   f'mínimo {app.config["CONTRASENAS_COSTO_MINIMO"]}, actual {app.config["CONTRASENAS_COSTO_ACTUAL"]})')
+
+    @app.cli.command('medir-login')
+    @click.option('--concurrencia', type=int, default=8, show_default=True,
+                  help='Inicios de sesión simultáneos')
+    @click.option('--total', type=int, default=100, show_default=True,
+                  help='Contraseñas a verificar')
+    def medir_login(concurrencia, total):
+        """Mide inicios de sesión por segundo con el costo y el pool de bcrypt configurados"""
+        from app.services.contrasenas import medir_inicios_sesion
+
+        resultado = medir_inicios_sesion(concurrencia, total)
+        click.echo(
+            f"costo {resultado['costo']}: {resultado['por_segundo']} inicios/s, "
+            f"p50 {resultado['p50_ms']} ms, p99 {resultado['p99_ms']} ms, "
+            f"rechazados {resultado['rechazados']}"
+        )
@@ -1,7 +1,9 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
 from flask_login import login_user, logout_user, login_required, current_user
+from app.services.almacen_carrito import fusionar_carrito, olvidar_carrito
 from app.models import Usuario, Rol, db
-from sqlalchemy import text
+from app.services.identidad import invalidar_identidad, usuario_desde_sp
+from app.services.procedimientos import ejecutar_sp
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -21,22 +23,41 @@ def login():
         
         try:
             # Llamar al procedimiento almacenado sp_autenticar
-            query = text("EXEC sp_autenticar :email")
-            result = db.session.execute(query, {'email': email}).fetchone()
+            result = ejecutar_sp('sp_autenticar', email=email).fetchone()
             
             if result:
-                usuario = Usuario.query.get(result.id_usuario)
+                # Usuario y rol salen de la misma fila del SP, sin volver a consultar
+                usuario = usuario_desde_sp(result)
                 
                 # Verificar la contraseña usando el método del modelo
-                if usuario and usuario.check_password(password):
+                if usuario.check_password(password):
+                    # Hash con un costo menor al actual: se rehace ahora que se conoce la contraseña
+                    if usuario.password_necesita_rehash():
+                        try:
+                            usuario.set_password(password)
+                            db.session.commit()
+                            invalidar_identidad(usuario.id_usuario)
+                        except Exception as e:
+                            db.session.rollback()
+                            print(f"No se pudo actualizar el hash: {e}")
+                    
                     login_user(usuario, remember=True)
+                    es_admin = usuario.is_admin()
                     flash(f'¡Bienvenido {usuario.nombre_completo}!, mediante sp', 'success')
                     
+                    # El carrito armado sin sesión se suma al guardado del usuario
+                    try:
+                        fusionar_carrito()
+                        db.session.commit()
+                    except Exception as e:
+                        db.session.rollback()
+                        print(f"No se pudo fusionar el carrito: {e}")
+                    
                     # Redirigir según el rol
                     next_page = request.args.get('next')
                     if next_page:
                         return redirect(next_page)
-                    elif result.nombre_rol == 'admin':  # Usar dato del SP
+                    elif es_admin:  # Rol armado con el dato del SP
                         return redirect(url_for('productos.admin_dashboard'))
                     else:
                         return redirect(url_for('main.index'))
@@ -113,6 +134,7 @@ def register():
 def logout():
     """Cierra la sesión del usuario"""
     logout_user()
+    olvidar_carrito()
     flash('Has cerrado sesión exitosamente', 'info')
     return redirect(url_for('main.index'))
 
@@ -136,11 +158,14 @@ def editar_perfil():
         if new_password:
             if len(new_password) < 6:
                 flash('La nueva contraseña debe tener al menos 6 caracteres', 'error')
+                # Descarta los cambios del formulario: nada debe guardarse a medias
+                db.session.rollback()
                 return render_template('auth/editar_perfil.html')
             current_user.set_password(new_password)
         
         try:
             db.session.commit()
+            invalidar_identidad(current_user.id_usuario)
             flash('Perfil actualizado exitosamente', 'success')
             return redirect(url_for('auth.perfil'))
         except Exception as e:
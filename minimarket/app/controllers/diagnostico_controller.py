@@ -0,0 +1,39 @@
+from flask import Blueprint, current_app, jsonify
+from flask_login import login_required, current_user
+from app.models import db
+from app.services.cache_catalogo import metricas_cache
+from app.services.cliente_imgbb import metricas_imgbb
+from app.services.pool_bd import metricas_pool
+
+diagnostico_bp = Blueprint('diagnostico', __name__)
+
+@diagnostico_bp.before_request
+@login_required
+def solo_admin():
+    """Todas las métricas son solo para administradores"""
+    if not current_user.is_admin():
+        return jsonify({'success': False, 'message': 'No autorizado'}), 403
+
+@diagnostico_bp.route('/cache-catalogo')
+def api_metricas_cache():
+    """
+    API endpoint con los contadores de la caché del catálogo
+    Retorna: JSON con entradas, aciertos, fallos e invalidaciones
+    """
+    return jsonify({'success': True, 'cache': metricas_cache()})
+
+@diagnostico_bp.route('/imgbb')
+def api_metricas_imgbb():
+    """
+    API endpoint con las métricas del cliente de imgbb
+    Retorna: JSON con subidas, reintentos, fallos, estado del circuito y latencias
+    """
+    return jsonify({'success': True, 'imgbb': metricas_imgbb()})
+
+@diagnostico_bp.route('/pool-bd')
+def api_metricas_pool_bd():
+    """
+    API endpoint con las métricas del pool de conexiones de este worker
+    Retorna: JSON con conexiones en uso, overflow, timeouts y esperas de checkout
+    """
+    return jsonify({'success': True, 'pool': metricas_pool(db.engine, current_app.config.get('DB_PERFIL'))})
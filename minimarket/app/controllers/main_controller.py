@@ -1,14 +1,17 @@
-from flask import Blueprint, render_template, request
-from app.models import Producto, Categoria, db
+from flask import Blueprint, render_template, request, abort, current_app, send_from_directory, jsonify, url_for
+from app.services.almacen_imagenes import NOMBRE_VALIDO
+from app.services.busqueda import buscar_productos
+from app.services.cache_catalogo import (obtener_producto, obtener_productos_categoria,
+                                         obtener_destacados, obtener_categorias, obtener_sugerencias)
 
 main_bp = Blueprint('main', __name__)
 
 @main_bp.route('/')
 def index():
     """Página principal con productos destacados"""
-    # Obtener productos más vendidos o destacados
-    productos_destacados = Producto.query.limit(8).all()
-    categorias = Categoria.query.all()
+    # Obtener productos más vendidos o destacados (desde la caché del catálogo)
+    productos_destacados = obtener_destacados()
+    categorias = obtener_categorias()
     
     return render_template('index.html', 
                          productos=productos_destacados, 
@@ -20,16 +23,14 @@ def listar_productos():
     categoria_id = request.args.get('categoria', type=int)
     busqueda = request.args.get('q', '')
     
-    query = Producto.query
-    
-    if categoria_id:
-        query = query.filter_by(id_categoria=categoria_id)
+    productos = obtener_productos_categoria(categoria_id)
     
     if busqueda:
-        query = query.filter(Producto.nombre.contains(busqueda))
+        # Índice en memoria: ids ordenados por relevancia
+        por_id = {producto.id_producto: producto for producto in productos}
+        productos = [por_id[i] for i in buscar_productos(busqueda, categoria_id) if i in por_id]
     
-    productos = query.all()
-    categorias = Categoria.query.all()
+    categorias = obtener_categorias()
     
     return render_template('productos.html', 
                          productos=productos, 
@@ -37,15 +38,56 @@ def listar_productos():
                          categoria_seleccionada=categoria_id,
                          busqueda=busqueda)
 
+@main_bp.route('/productos/sugerencias')
+def sugerencias_productos():
+    """
+    API endpoint para el buscador mientras se escribe
+    Parámetros: q, categoria (opcional), limite (opcional)
+    Retorna: JSON con los mejores productos para el texto
+    """
+    busqueda = request.args.get('q', '').strip()
+    categoria_id = request.args.get('categoria', type=int)
+    limite = min(request.args.get('limite', current_app.config.get('SUGERENCIAS_LIMITE', 8), type=int), 20)
+    
+    if len(busqueda) < current_app.config.get('SUGERENCIAS_MIN_CARACTERES', 2) or limite < 1:
+        return jsonify({'success': True, 'sugerencias': []})
+    
+    sugerencias = [
+        {
+            'id_producto': producto.id_producto,
+            'nombre': producto.nombre,
+            'precio': float(producto.precio),
+            'stock': producto.stock,
+            'imagen_url': producto.imagen_url,
+            'categoria': producto.categoria.nombre,
+            'url': url_for('main.detalle_producto', id=producto.id_producto)
+        }
+        for producto in obtener_sugerencias(busqueda, categoria_id, limite)
+    ]
+    
+    return jsonify({'success': True, 'sugerencias': sugerencias})
+
 @main_bp.route('/producto/<int:id>')
 def detalle_producto(id):
     """Detalle de un producto específico"""
-    producto = Producto.query.get_or_404(id)
-    productos_relacionados = Producto.query.filter(
-        Producto.id_categoria == producto.id_categoria,
-        Producto.id_producto != producto.id_producto
-    ).limit(4).all()
+    producto = obtener_producto(id)
+    if producto is None:
+        abort(404)
+    
+    productos_relacionados = [
+        p for p in obtener_productos_categoria(producto.id_categoria)
+        if p.id_producto != producto.id_producto
+    ][:4]
     
     return render_template('detalle_producto.html', 
                          producto=producto,
-                         productos_relacionados=productos_relacionados)
\ No newline at end of file
+                         productos_relacionados=productos_relacionados)
+
+@main_bp.route('/imagenes/<nombre>')
+def imagen_almacenada(nombre):
+    """Sirve imágenes del almacén local; el nombre es el hash, así que nunca cambian"""
+    if not NOMBRE_VALIDO.match(nombre):
+        abort(404)
+    
+    return send_from_directory(current_app.config['IMAGENES_DIR'], f'{nombre[:2]}/{nombre}',
+                               max_age=31536000)
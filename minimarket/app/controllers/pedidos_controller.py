@@ -1,41 +1,47 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import (Blueprint, render_template, request, redirect, url_for, flash, jsonify,
+                   abort, current_app, Response, stream_with_context)
 from flask_login import login_required, current_user
 from app.models import Pedido, PedidoDetalle, Producto, Usuario, Rol, db
+from app.services.cache_catalogo import invalidar_productos
+from app.services.almacen_carrito import guardar_carrito, obtener_carrito, vaciar_carrito
+from app.services.carrito import hidratar_carrito
+from app.services.consultas import con_relaciones_pedido, con_detalle_pedido, detalle_pedido_json, primeras_lineas
+from app.services.paginacion import paginar_keyset
+from app.services.procedimientos import ejecutar_sp
+from app.services.inventario import cantidades_por_producto, reservar_stock, liberar_stock
+from app.services.exportacion import (FORMATOS as FORMATOS_EXPORTACION, COLUMNAS_PEDIDOS, COLUMNAS_DETALLES,
+                                     filas_pedidos, filas_detalles, generar_exportacion)
+from app.services.estadisticas import (CLAVES_ESTADO, obtener_stats_pedidos, obtener_stats_repartidor,
+                                       registrar_cambio_estado)
+from app.services.ventas import registrar_pedido, registrar_cambio_estado_ventas
+from app.services.eventos_pedidos import (ROL_ADMIN, ROL_CLIENTE, ROL_REPARTIDOR, bus_pedidos,
+                                          eventos_desde, generar_eventos, iniciar_sondeo,
+                                          publicar_pedido, ultimo_evento)
 from datetime import datetime, timedelta
-from sqlalchemy import text
+from sqlalchemy.orm import joinedload, undefer
 
 
 pedidos_bp = Blueprint('pedidos', __name__)
 
+# Líneas que se muestran por pedido en el historial del cliente
+LINEAS_RESUMEN = 3
+
 @pedidos_bp.route('/carrito')
 def ver_carrito():
     """Muestra el carrito de compras"""
-    carrito = session.get('carrito', {})
-    productos_carrito = []
-    total = 0
-    
-    for producto_id, cantidad in carrito.items():
-        producto = Producto.query.get(int(producto_id))
-        if producto:
-            subtotal = producto.precio * cantidad
-            productos_carrito.append({
-                'producto': producto,
-                'cantidad': cantidad,
-                'subtotal': subtotal
-            })
-            total += subtotal
+    carrito = hidratar_carrito(obtener_carrito())
     
     return render_template('carrito/ver_carrito.html', 
-                         productos_carrito=productos_carrito, 
-                         total=total)
+                         productos_carrito=carrito.lineas, 
+                         total=carrito.total)
 
 @pedidos_bp.route('/agregar_carrito', methods=['POST'])
 def agregar_carrito():
     """Valida stock usando SP simplificado"""
-    producto_id = request.form.get('producto_id')
-    cantidad = int(request.form.get('cantidad', 1))
+    producto_id = request.form.get('producto_id', type=int)
+    cantidad = request.form.get('cantidad', 1, type=int)
     
-    if not producto_id:
+    if producto_id is None or cantidad is None:
         return jsonify({'success': False, 'message': 'Producto no válido'})
     
     try:
@@ -65,13 +71,10 @@ def agregar_carrito():
             return jsonify({'success': False, 'message': 'Stock con sp insuficiente'})
         
         # Agregar al carrito
-        if 'carrito' not in session:
-            session['carrito'] = {}
-        
-        carrito = session['carrito']
-        carrito[str(producto_id)] = carrito.get(str(producto_id), 0) + cantidad
-        session['carrito'] = carrito
-        session.modified = True
+        carrito = obtener_carrito()
+        carrito[int(producto_id)] = carrito.get(int(producto_id), 0) + cantidad
+        guardar_carrito(carrito)
+        db.session.commit()
         
         return jsonify({
             'success': True, 
@@ -86,13 +89,14 @@ def agregar_carrito():
 @pedidos_bp.route('/actualizar_carrito', methods=['POST'])
 def actualizar_carrito():
     """Actualiza la cantidad de un producto en el carrito"""
-    producto_id = request.form.get('producto_id')
-    cantidad = int(request.form.get('cantidad', 0))
+    producto_id = request.form.get('producto_id', type=int)
+    cantidad = request.form.get('cantidad', type=int)
     
-    if 'carrito' not in session:
-        session['carrito'] = {}
+    if producto_id is None or cantidad is None:
+        flash('Producto o cantidad no válidos', 'error')
+        return redirect(url_for('pedidos.ver_carrito'))
     
-    carrito = session['carrito']
+    carrito = obtener_carrito()
     
     if cantidad <= 0:
         # Eliminar del carrito
@@ -100,28 +104,27 @@ def actualizar_carrito():
             del carrito[producto_id]
     else:
         # Verificar stock
-        producto = Producto.query.get(int(producto_id))
+        producto = Producto.query.get(producto_id)
         if producto and cantidad <= producto.stock:
             carrito[producto_id] = cantidad
         else:
             flash('Stock insuficiente', 'error')
             return redirect(url_for('pedidos.ver_carrito'))
     
-    session['carrito'] = carrito
-    session.modified = True
+    guardar_carrito(carrito)
+    db.session.commit()
     
     return redirect(url_for('pedidos.ver_carrito'))
 
 @pedidos_bp.route('/eliminar_carrito/<int:producto_id>')
 def eliminar_carrito(producto_id):
     """Elimina un producto del carrito"""
-    if 'carrito' in session:
-        carrito = session['carrito']
-        if str(producto_id) in carrito:
-            del carrito[str(producto_id)]
-            session['carrito'] = carrito
-            session.modified = True
-            flash('Producto eliminado del carrito', 'info')
+    carrito = obtener_carrito()
+    if producto_id in carrito:
+        del carrito[producto_id]
+        guardar_carrito(carrito)
+        db.session.commit()
+        flash('Producto eliminado del carrito', 'info')
     
     return redirect(url_for('pedidos.ver_carrito'))
 
@@ -129,40 +132,29 @@ def eliminar_carrito(producto_id):
 @login_required
 def checkout():
     """Página de checkout"""
-    carrito = session.get('carrito', {})
+    carrito = obtener_carrito()
     
     if not carrito:
         flash('Tu carrito está vacío', 'warning')
         return redirect(url_for('main.index'))
     
-    productos_carrito = []
-    total = 0
+    carrito = hidratar_carrito(carrito)
     
-    for producto_id, cantidad in carrito.items():
-        producto = Producto.query.get(int(producto_id))
-        if producto:
-            if cantidad > producto.stock:
-                flash(f'Stock insuficiente para {producto.nombre}', 'error')
-                return redirect(url_for('pedidos.ver_carrito'))
-            
-            subtotal = producto.precio * cantidad
-            productos_carrito.append({
-                'producto': producto,
-                'cantidad': cantidad,
-                'subtotal': subtotal
-            })
-            total += subtotal
+    sin_stock = carrito.lineas_sin_stock()
+    if sin_stock:
+        flash(f'Stock insuficiente para {sin_stock[0]["producto"].nombre}', 'error')
+        return redirect(url_for('pedidos.ver_carrito'))
     
     return render_template('carrito/checkout.html', 
-                         productos_carrito=productos_carrito, 
-                         total=total,
+                         productos_carrito=carrito.lineas, 
+                         total=carrito.total,
                          usuario=current_user)
 
 @pedidos_bp.route('/procesar_pedido', methods=['POST'])
 @login_required
 def procesar_pedido():
     """Procesa un pedido y lo guarda en la base de datos"""
-    carrito = session.get('carrito', {})
+    carrito = obtener_carrito()
     
     if not carrito:
         flash('Tu carrito está vacío', 'error')
@@ -180,6 +172,17 @@ def procesar_pedido():
         return redirect(url_for('auth.editar_perfil'))
     
     try:
+        # Traer todos los productos del carrito en una sola consulta
+        carrito_hidratado = hidratar_carrito(carrito)
+        
+        if carrito_hidratado.ids_invalidos:
+            raise Exception(f'Producto {carrito_hidratado.ids_invalidos[0]} no válido')
+        
+        # Descontar stock de todas las líneas con un UPDATE condicional;
+        # falla sin escribir nada si alguna línea no alcanza
+        cantidades = cantidades_por_producto(carrito_hidratado.lineas)
+        reservar_stock(cantidades)
+        
         # Crear el pedido
         nuevo_pedido = Pedido(
             id_usuario=current_user.id_usuario,
@@ -190,17 +193,10 @@ def procesar_pedido():
         db.session.add(nuevo_pedido)
         db.session.flush()  # Para obtener el ID del pedido
         
-        total_pedido = 0
-        
         # Agregar detalles del pedido
-        for producto_id, cantidad in carrito.items():
-            producto = Producto.query.get(int(producto_id))
-            
-            if not producto:
-                raise Exception(f'Producto {producto_id} no válido')
-            
-            if cantidad > producto.stock:
-                raise Exception(f'Stock insuficiente para {producto.nombre}')
+        for linea in carrito_hidratado.lineas:
+            producto = linea['producto']
+            cantidad = linea['cantidad']
             
             # Crear detalle del pedido
             detalle = PedidoDetalle(
@@ -211,20 +207,20 @@ def procesar_pedido():
             )
             
             db.session.add(detalle)
-            
-            # Actualizar stock
-            producto.stock -= cantidad
-            
-            total_pedido += cantidad * producto.precio
         
         # Actualizar total del pedido
-        nuevo_pedido.total = total_pedido
+        nuevo_pedido.total = carrito_hidratado.total
         
-        db.session.commit()
+        # Resúmenes de ventas en la misma transacción
+        registrar_pedido(nuevo_pedido, carrito_hidratado.lineas)
         
-        # Limpiar carrito
-        session['carrito'] = {}
-        session.modified = True
+        # El carrito se elimina en la misma transacción que crea el pedido
+        vaciar_carrito()
+        publicar_pedido('pedido_creado', nuevo_pedido.id_pedido, nuevo_pedido.id_usuario, 'pendiente')
+        
+        db.session.commit()
+        registrar_cambio_estado(None, 'pendiente')
+        invalidar_productos(cantidades.keys())
         
         flash('¡Pedido realizado exitosamente!', 'success')
         return redirect(url_for('pedidos.detalle_pedido', id=nuevo_pedido.id_pedido))
@@ -238,95 +234,161 @@ def procesar_pedido():
 @login_required
 def mis_pedidos():
     """Lista los pedidos del usuario actual"""
-    pedidos = Pedido.query.filter_by(id_usuario=current_user.id_usuario)\
-                          .order_by(Pedido.id_pedido.desc()).all()
+    query = Pedido.query.options(
+        undefer(Pedido.num_lineas), joinedload(Pedido.usuario)
+    ).filter_by(id_usuario=current_user.id_usuario)
+    pagina = paginar_keyset(query, Pedido.id_pedido)
+    
+    # Solo las primeras líneas de cada pedido de la página, en una consulta
+    lineas = primeras_lineas([pedido.id_pedido for pedido in pagina.items], LINEAS_RESUMEN)
     
-    return render_template('pedidos/mis_pedidos.html', pedidos=pedidos)
+    return render_template('pedidos/mis_pedidos.html', pedidos=pagina.items, pagina=pagina,
+                         lineas=lineas, lineas_resumen=LINEAS_RESUMEN)
 
 @pedidos_bp.route('/pedido/<int:id>')
 @login_required
 def detalle_pedido(id):
     """Muestra el detalle de un pedido específico"""
-    pedido = Pedido.query.get_or_404(id)
+    pedido = con_detalle_pedido(Pedido.query).filter_by(id_pedido=id).first_or_404()
     
-    # Verificar que el usuario tenga permisos para ver este pedido
-    tiene_permisos = (
-        current_user.is_admin() or  # Admin puede ver todos
-        pedido.id_usuario == current_user.id_usuario or  # Cliente puede ver sus pedidos
-        (current_user.is_repartidor() and pedido.repartidor_id == current_user.id_usuario)  # Repartidor puede ver pedidos asignados
-    )
-    
-    if not tiene_permisos:
+    if not puede_ver_pedido(pedido.id_usuario, pedido.repartidor_id):
         flash('No tienes permisos para ver este pedido', 'error')
         return redirect(url_for('main.index'))
     
     return render_template('pedidos/detalle_pedido.html', pedido=pedido)
 
-@pedidos_bp.route('/admin/pedidos')
+def puede_ver_pedido(id_usuario, repartidor_id):
+    """Permisos para ver un pedido, según su cliente y su repartidor"""
+    return (
+        current_user.is_admin() or  # Admin puede ver todos
+        id_usuario == current_user.id_usuario or  # Cliente puede ver sus pedidos
+        (current_user.is_repartidor() and repartidor_id == current_user.id_usuario)  # Repartidor puede ver pedidos asignados
+    )
+
+@pedidos_bp.route('/api/pedido/<int:id>')
 @login_required
-def admin_listar_pedidos():
-    """Lista todos los pedidos para administradores"""
-    if not current_user.is_admin():
-        flash('No tienes permisos para acceder a esta página', 'error')
-        return redirect(url_for('main.index'))
-    
-    estado = request.args.get('estado')
-    busqueda = request.args.get('q')
-    fecha_desde = request.args.get('fecha_desde')
-    fecha_hasta = request.args.get('fecha_hasta')
-    
-    query = Pedido.query
-    
+def api_detalle_pedido(id):
+    """
+    API endpoint con el detalle de un pedido (mismos permisos que detalle_pedido)
+    Retorna: JSON con el pedido, cliente, repartidor y líneas; 304 si no cambió (ETag)
+    """
+    datos = detalle_pedido_json(id)
+    
+    if datos is None:
+        return jsonify({'success': False, 'message': 'Pedido no encontrado'}), 404
+    
+    if not puede_ver_pedido(datos['id_usuario'], datos['repartidor_id']):
+        return jsonify({'success': False, 'message': 'No autorizado'}), 403
+    
+    response = jsonify({'success': True, 'pedido': datos})
+    # El navegador revalida con If-None-Match y recibe 304 sin cuerpo si nada cambió
+    response.add_etag()
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+FILTROS_PEDIDOS = ('estado', 'q', 'fecha_desde', 'fecha_hasta')
+
+def filtros_pedidos(args):
+    """
+    Condiciones de los filtros del listado de pedidos (estado, cliente y
+    rango de fechas), compartidas por el listado y las exportaciones
+    """
+    condiciones = []
+    
+    estado = args.get('estado')
     if estado:
-        query = query.filter_by(estado=estado)
+        condiciones.append(Pedido.estado == estado)
     
+    busqueda = args.get('q')
     if busqueda:
-        # Especificar explícitamente que queremos hacer JOIN con el usuario del pedido (cliente)
-        query = query.join(Usuario, Pedido.id_usuario == Usuario.id_usuario).filter(Usuario.nombre_completo.contains(busqueda))
+        # EXISTS sobre el cliente del pedido: no choca con otros JOIN a usuarios
+        condiciones.append(Pedido.usuario.has(Usuario.nombre_completo.contains(busqueda)))
     
     # Filtros de fecha
+    fecha_desde = args.get('fecha_desde')
     if fecha_desde:
         try:
-            fecha_inicio = datetime.strptime(fecha_desde, '%Y-%m-%d')
-            query = query.filter(Pedido.fecha >= fecha_inicio)
+            condiciones.append(Pedido.fecha >= datetime.strptime(fecha_desde, '%Y-%m-%d'))
         except ValueError:
             pass  # Ignorar fechas inválidas
     
+    fecha_hasta = args.get('fecha_hasta')
     if fecha_hasta:
         try:
-            fecha_fin = datetime.strptime(fecha_hasta, '%Y-%m-%d')
             # Agregar 1 día para incluir todo el día hasta
-            fecha_fin = fecha_fin + timedelta(days=1)
-            query = query.filter(Pedido.fecha < fecha_fin)
+            fecha_fin = datetime.strptime(fecha_hasta, '%Y-%m-%d') + timedelta(days=1)
+            condiciones.append(Pedido.fecha < fecha_fin)
         except ValueError:
             pass  # Ignorar fechas inválidas
     
-    pedidos = query.order_by(Pedido.id_pedido.desc()).all()
+    return condiciones
+
+@pedidos_bp.route('/admin/pedidos')
+@login_required
+def admin_listar_pedidos():
+    """Lista todos los pedidos para administradores"""
+    if not current_user.is_admin():
+        flash('No tienes permisos para acceder a esta página', 'error')
+        return redirect(url_for('main.index'))
+    
+    estado = request.args.get('estado')
+    busqueda = request.args.get('q')
+    fecha_desde = request.args.get('fecha_desde')
+    fecha_hasta = request.args.get('fecha_hasta')
+    
+    query = con_relaciones_pedido(Pedido.query).filter(*filtros_pedidos(request.args))
+    
+    pagina = paginar_keyset(query, Pedido.id_pedido)
     
     # Obtener lista de repartidores disponibles (usuarios con rol repartidor)
     repartidores = Usuario.query.join(Rol).filter(Rol.nombre.ilike('%repartidor%')).all()
     
-    # Calcular estadísticas
-    todos_pedidos = Pedido.query.all()
-    stats = {
-        'total': len(todos_pedidos),
-        'pendientes': len([p for p in todos_pedidos if p.estado == 'pendiente']),
-        'confirmados': len([p for p in todos_pedidos if p.estado == 'confirmado']),
-        'en_preparacion': len([p for p in todos_pedidos if p.estado == 'en_preparacion']),
-        'en_camino': len([p for p in todos_pedidos if p.estado == 'en_camino']),
-        'entregados': len([p for p in todos_pedidos if p.estado == 'entregado']),
-        'cancelados': len([p for p in todos_pedidos if p.estado == 'cancelado'])
-    }
+    # Calcular estadísticas (un solo GROUP BY estado)
+    stats = obtener_stats_pedidos()
     
     return render_template('admin/pedidos_lista.html', 
-                         pedidos=pedidos, 
+                         pedidos=pagina.items,
+                         pagina=pagina, 
                          estado_filtro=estado,
                          fecha_desde_filtro=fecha_desde,
                          fecha_hasta_filtro=fecha_hasta,
                          busqueda_filtro=busqueda,
+                         filtros_exportacion={k: v for k, v in request.args.items() if k in FILTROS_PEDIDOS and v},
+                         claves_estado=CLAVES_ESTADO,
                          stats=stats,
                          repartidores=repartidores)
 
+@pedidos_bp.route('/admin/pedidos/exportar.<formato>')
+@login_required
+def admin_exportar_pedidos(formato):
+    """Exporta los pedidos filtrados (mismos filtros que el listado) en CSV o JSON Lines"""
+    return _exportar(formato, 'pedidos', COLUMNAS_PEDIDOS, filas_pedidos)
+
+@pedidos_bp.route('/admin/pedidos/detalles/exportar.<formato>')
+@login_required
+def admin_exportar_detalles(formato):
+    """Exporta las líneas (productos) de los pedidos filtrados en CSV o JSON Lines"""
+    return _exportar(formato, 'pedidos_detalle', COLUMNAS_DETALLES, filas_detalles)
+
+def _exportar(formato, nombre, columnas, consultar_filas):
+    if not current_user.is_admin():
+        flash('No tienes permisos para acceder a esta página', 'error')
+        return redirect(url_for('main.index'))
+    
+    if formato not in FORMATOS_EXPORTACION:
+        abort(404)
+    
+    filas = consultar_filas(filtros_pedidos(request.args))
+    archivo = f"{nombre}_{datetime.now().strftime('%Y%m%d_%H%M')}.{formato}"
+    
+    # stream_with_context mantiene la sesión de BD abierta mientras se envían las filas
+    return Response(
+        stream_with_context(generar_exportacion(formato, columnas, filas)),
+        content_type=FORMATOS_EXPORTACION[formato],
+        headers={'Content-Disposition': f'attachment; filename="{archivo}"'}
+    )
+
 @pedidos_bp.route('/repartidor/pedidos')
 @login_required
 def repartidor_mis_pedidos():
@@ -336,20 +398,94 @@ def repartidor_mis_pedidos():
         return redirect(url_for('main.index'))
     
     # Obtener solo los pedidos asignados a este repartidor
-    pedidos_asignados = Pedido.query.filter_by(repartidor_id=current_user.id_usuario).order_by(Pedido.id_pedido.desc()).all()
+    pedidos_asignados = con_relaciones_pedido(Pedido.query)\
+                        .filter_by(repartidor_id=current_user.id_usuario)\
+                        .order_by(Pedido.id_pedido.desc()).all()
     
     # Calcular estadísticas del repartidor
-    stats = {
-        'total': len(pedidos_asignados),
-        'en_camino': len([p for p in pedidos_asignados if p.estado == 'en_camino']),
-        'entregados': len([p for p in pedidos_asignados if p.estado == 'entregado']),
-        'cancelados': len([p for p in pedidos_asignados if p.estado == 'cancelado'])
-    }
+    stats = obtener_stats_repartidor(current_user.id_usuario)
     
     return render_template('repartidor/pedidos_lista.html', 
                          pedidos=pedidos_asignados, 
+                         claves_estado=CLAVES_ESTADO,
                          stats=stats)
 
+def rol_eventos():
+    """Alcance de los eventos de pedidos del usuario actual"""
+    if current_user.is_admin():
+        return ROL_ADMIN
+    if current_user.is_repartidor():
+        return ROL_REPARTIDOR
+    return ROL_CLIENTE
+
+@pedidos_bp.route('/eventos/recientes')
+@login_required
+def eventos_recientes():
+    """
+    API endpoint con los eventos de pedidos posteriores a ?desde=<id> que el
+    usuario puede ver: todos (admin), los asignados (repartidor) o los propios
+    Retorna: JSON con eventos y ultimo (id para la siguiente consulta), o
+    recargar=true si se perdieron demasiados
+    """
+    desde = request.args.get('desde', type=int)
+    if desde is None:
+        return jsonify({'success': True, 'eventos': [], 'ultimo': ultimo_evento()})
+    
+    eventos = eventos_desde(desde, current_user.id_usuario, rol_eventos(),
+                            current_app.config.get('EVENTOS_MAXIMO', 200))
+    if eventos is None:
+        return jsonify({'success': True, 'recargar': True, 'eventos': [], 'ultimo': ultimo_evento()})
+    
+    # Aunque no haya eventos visibles, se avanza hasta el último leído
+    ultimo = eventos[-1]['id'] if eventos else desde
+    return jsonify({'success': True, 'eventos': eventos, 'ultimo': ultimo})
+
+@pedidos_bp.route('/eventos')
+@login_required
+def eventos_pedidos():
+    """
+    Stream SSE con los mismos eventos (solo con EVENTOS_SSE; cada conexión
+    abierta ocupa un hilo del servidor)
+    """
+    if not current_app.config.get('EVENTOS_SSE'):
+        abort(404)
+    
+    iniciar_sondeo(current_app._get_current_object())
+    suscripcion = bus_pedidos.suscribir(current_user.id_usuario, rol_eventos())
+    
+    # Eventos perdidos desde la última conexión, o desde que se renderizó la
+    # página en la primera (se suscribe antes para no perder ninguno)
+    ultimo_id = request.headers.get('Last-Event-ID', type=int)
+    if ultimo_id is None:
+        ultimo_id = request.args.get('desde', type=int)
+    pendientes = []
+    if ultimo_id is not None:
+        pendientes = eventos_desde(ultimo_id, current_user.id_usuario, suscripcion.rol,
+                                   current_app.config.get('EVENTOS_MAXIMO', 200))
+    latido = current_app.config.get('EVENTOS_LATIDO', 15)
+    
+    # Sin stream_with_context: la sesión de BD se cierra al terminar esta vista
+    # y la conexión abierta no retiene una conexión del pool
+    return Response(
+        generar_eventos(suscripcion, pendientes, latido),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@pedidos_bp.route('/pedido/<int:id>/fila')
+@login_required
+def fila_pedido(id):
+    """Fila HTML de un pedido para actualizar los listados en vivo sin recargar"""
+    pedido = con_relaciones_pedido(Pedido.query).filter_by(id_pedido=id).first_or_404()
+    
+    if current_user.is_admin():
+        return render_template('admin/_fila_pedido.html', pedido=pedido)
+    
+    if current_user.is_repartidor() and pedido.repartidor_id == current_user.id_usuario:
+        return render_template('repartidor/_fila_pedido.html', pedido=pedido)
+    
+    abort(404)
+
 @pedidos_bp.route('/admin/pedido/<int:id>')
 @login_required
 def admin_ver_pedido(id):
@@ -358,7 +494,7 @@ def admin_ver_pedido(id):
         flash('No tienes permisos para acceder a esta página', 'error')
         return redirect(url_for('main.index'))
     
-    pedido = Pedido.query.get_or_404(id)
+    pedido = con_detalle_pedido(Pedido.query).filter_by(id_pedido=id).first_or_404()
     return render_template('admin/pedido_detalle.html', pedido=pedido)
 
 @pedidos_bp.route('/admin/pedido/<int:id>/imprimir')
@@ -369,7 +505,7 @@ def admin_imprimir_pedido(id):
         flash('No tienes permisos para acceder a esta página', 'error')
         return redirect(url_for('main.index'))
     
-    pedido = Pedido.query.get_or_404(id)
+    pedido = con_detalle_pedido(Pedido.query).filter_by(id_pedido=id).first_or_404()
     from datetime import datetime
     current_time = datetime.now()
     return render_template('admin/pedido_imprimir.html', pedido=pedido, current_time=current_time)
@@ -392,20 +528,22 @@ def admin_cambiar_estado(id):
         return redirect(url_for('pedidos.admin_listar_pedidos'))
     
     try:
-        query = text("""
-            EXEC sp_actualizar_estado_pedido 
-                @id_pedido = :id_pedido,
-                @nuevo_estado = :estado,
-                @repartidor_id = :repartidor_id
-        """)
-        
-        db.session.execute(query, {
-            'id_pedido': id,
-            'estado': nuevo_estado,
-            'repartidor_id': repartidor_id
-        })
+        anterior = db.session.query(Pedido.estado, Pedido.repartidor_id, Pedido.id_usuario)\
+                             .filter_by(id_pedido=id).first()
+        estado_anterior = anterior.estado if anterior else None
+        
+        ejecutar_sp('sp_actualizar_estado_pedido', id_pedido=id, nuevo_estado=nuevo_estado,
+                    repartidor_id=repartidor_id)
+        registrar_cambio_estado_ventas(id, estado_anterior, nuevo_estado)
+        if anterior is not None:
+            publicar_pedido('pedido_actualizado', id, anterior.id_usuario, nuevo_estado,
+                            int(repartidor_id) if repartidor_id else None,
+                            estado_anterior=estado_anterior, repartidor_anterior=anterior.repartidor_id)
         db.session.commit()
         
+        if anterior is not None:
+            registrar_cambio_estado(estado_anterior, nuevo_estado)
+        
         flash(f'Pedido #{id} actualizado con sp a {nuevo_estado}', 'success')
         
     except Exception as e:
@@ -444,7 +582,10 @@ def repartidor_entregar_pedido(id):
     pedido.estado = 'entregado'
     
     try:
+        publicar_pedido('pedido_actualizado', pedido.id_pedido, pedido.id_usuario, 'entregado',
+                        pedido.repartidor_id, estado_anterior='en_camino', repartidor_anterior=pedido.repartidor_id)
         db.session.commit()
+        registrar_cambio_estado('en_camino', 'entregado')
         
         if request.is_json:
             return jsonify({'success': True, 'message': f'Pedido #{pedido.id_pedido} marcado como entregado exitosamente'})
@@ -517,17 +658,27 @@ def cancelar_pedido(id):
     # Restaurar stock de productos si el pedido no estaba cancelado
     if pedido.estado != 'cancelado':
         try:
+            estado_anterior = pedido.estado
+            
+            devolver = {}
             for detalle in pedido.detalles:
-                producto = detalle.producto
-                producto.stock += detalle.cantidad
+                devolver[detalle.id_producto] = devolver.get(detalle.id_producto, 0) + detalle.cantidad
+            liberar_stock(devolver)
             
             # Cambiar estado a cancelado
             pedido.estado = 'cancelado'
+            registrar_cambio_estado_ventas(pedido.id_pedido, estado_anterior, 'cancelado')
             
             # Opcional: guardar motivo de cancelación (requeriría nueva columna en BD)
             # pedido.motivo_cancelacion = motivo_cancelacion
             
+            publicar_pedido('pedido_actualizado', pedido.id_pedido, pedido.id_usuario, 'cancelado',
+                            pedido.repartidor_id, estado_anterior=estado_anterior,
+                            repartidor_anterior=pedido.repartidor_id)
+            
             db.session.commit()
+            registrar_cambio_estado(estado_anterior, 'cancelado')
+            invalidar_productos(devolver.keys())
             
             # Mensaje de confirmación
             mensaje_exito = f'Pedido #{pedido.id_pedido} cancelado exitosamente'
@@ -1,79 +1,20 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
-from werkzeug.utils import secure_filename
-import requests
-import base64
-from app.models import Producto, Categoria, db
-import os
-from PIL import Image
-import io
+from sqlalchemy import func
+from app.models import Producto, Categoria, db, get_local_datetime
+from app.services.busqueda import (buscar_productos, filtro_ids, indexar_producto,
+                                   quitar_producto, indexar_categoria)
+from app.services.cache_catalogo import invalidar_productos, invalidar_categorias
+from app.services.cliente_imgbb import subir_bytes_imgbb
+from app.services.imagenes import optimizar_imagen, validar_archivo_imagen
+from app.services.paginacion import paginar_keyset
+from app.services.tareas_imagenes import encolar_imagen_producto, estado_tarea, tareas_pendientes
+from app.services.dashboard import obtener_dashboard
+from app.services.ventas import resumen_ventas, ventas_por_dia, productos_mas_vendidos, ventas_por_categoria
+from datetime import datetime, timedelta
 
 productos_bp = Blueprint('productos', __name__)
 
-# Configuración de formatos de imagen permitidos
-ALLOWED_IMAGE_EXTENSIONS = {
-    'jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp', 'avif', 'tiff', 'tif', 'ico'
-}
-
-def validar_archivo_imagen(archivo):
-    """
-    Valida si el archivo es una imagen válida
-    Retorna: (es_valido, mensaje_error)
-    """
-    if not archivo or not archivo.filename:
-        return False, "No se seleccionó ningún archivo"
-    
-    # Verificar extensión
-    filename = secure_filename(archivo.filename.lower())
-    if '.' not in filename:
-        return False, "El archivo debe tener una extensión válida"
-    
-    extension = filename.rsplit('.', 1)[1]
-    if extension not in ALLOWED_IMAGE_EXTENSIONS:
-        formatos_permitidos = ', '.join(sorted(ALLOWED_IMAGE_EXTENSIONS))
-        return False, f"❌ Formato de imagen no permitido. Por favor, use uno de estos formatos: {formatos_permitidos.upper()}"
-    
-    # Verificar que sea una imagen real usando PIL
-    try:
-        archivo.seek(0)  # Volver al inicio del archivo
-        imagen = Image.open(archivo)
-        imagen.verify()  # Verificar que sea una imagen válida
-        archivo.seek(0)  # Volver al inicio para uso posterior
-        return True, "✅ Archivo de imagen válido"
-    except Exception as e:
-        return False, f"❌ El archivo no es una imagen válida o está corrupto. Error: {str(e)}"
-
-def optimizar_imagen(archivo, max_width=1200, max_height=1200, quality=85):
-    """
-    Optimiza la imagen redimensionándola y comprimiéndola
-    """
-    try:
-        archivo.seek(0)
-        imagen = Image.open(archivo)
-        
-        # Convertir a RGB si es necesario (para JPEG)
-        if imagen.mode in ('RGBA', 'LA', 'P'):
-            rgb_imagen = Image.new('RGB', imagen.size, (255, 255, 255))
-            if imagen.mode == 'P':
-                imagen = imagen.convert('RGBA')
-            rgb_imagen.paste(imagen, mask=imagen.split()[-1] if imagen.mode == 'RGBA' else None)
-            imagen = rgb_imagen
-        
-        # Redimensionar si es necesario
-        if imagen.width > max_width or imagen.height > max_height:
-            imagen.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
-        
-        # Guardar en memoria como JPEG optimizado
-        output = io.BytesIO()
-        imagen.save(output, format='JPEG', quality=quality, optimize=True)
-        output.seek(0)
-        
-        return output
-    except Exception as e:
-        print(f"Error al optimizar imagen: {e}")
-        archivo.seek(0)
-        return archivo
-
 def subir_imagen_imgbb(archivo):
     """
     Sube una imagen a imgbb después de validarla y optimizarla
@@ -88,24 +29,7 @@ def subir_imagen_imgbb(archivo):
         # Optimizar la imagen
         archivo_optimizado = optimizar_imagen(archivo)
         
-        # Convertir archivo optimizado a base64
-        archivo_base64 = base64.b64encode(archivo_optimizado.read()).decode('utf-8')
-        
-        # Parámetros para la API de imgbb
-        payload = {
-            'key': current_app.config['IMGBB_API_KEY'],
-            'image': archivo_base64
-        }
-        
-        # Hacer la petición
-        response = requests.post(current_app.config['IMGBB_API_URL'], payload)
-        
-        if response.status_code == 200:
-            data = response.json()
-            if data['success']:
-                return data['data']['url'], "Imagen subida exitosamente"
-        
-        return None, f"Error del servidor de imágenes (código {response.status_code})"
+        return subir_bytes_imgbb(archivo_optimizado.read())
         
     except Exception as e:
         print(f"Error al subir imagen: {e}")
@@ -119,35 +43,47 @@ def admin_dashboard():
         flash('No tienes permisos para acceder a esta página', 'error')
         return redirect(url_for('main.index'))
     
-    total_productos = Producto.query.count()
-    productos_sin_stock = Producto.query.filter(Producto.stock <= 0).count()
-    categorias_count = Categoria.query.count()
-    
-    # Calcular pedidos de hoy usando la zona horaria de Perú
-    from datetime import datetime, timedelta
-    import pytz
-    from app.models import Pedido
+    # Conteos, ventas de hoy y productos recientes: una consulta, memorizada unos segundos
+    snapshot = obtener_dashboard()
     
-    # Zona horaria de Perú
-    peru_tz = pytz.timezone('America/Lima')
-    ahora = datetime.now(peru_tz)
-    inicio_del_dia = ahora.replace(hour=0, minute=0, second=0, microsecond=0)
-    fin_del_dia = inicio_del_dia + timedelta(days=1)
+    return render_template('admin/dashboard.html',
+                         total_productos=snapshot.total_productos,
+                         productos_sin_stock=snapshot.productos_sin_stock,
+                         categorias_count=snapshot.categorias_count,
+                         pedidos_hoy=snapshot.pedidos_hoy,
+                         ingresos_hoy=snapshot.ingresos_hoy,
+                         productos_recientes=snapshot.productos_recientes)
+
+@productos_bp.route('/admin/reportes')
+@login_required
+def admin_reportes():
+    """Reporte de ventas por día, producto y categoría (lee los resúmenes de ventas)"""
+    if not current_user.is_admin():
+        flash('No tienes permisos para acceder a esta página', 'error')
+        return redirect(url_for('main.index'))
     
-    # Contar pedidos del día actual
-    pedidos_hoy = Pedido.query.filter(
-        Pedido.fecha >= inicio_del_dia.astimezone(pytz.UTC),
-        Pedido.fecha < fin_del_dia.astimezone(pytz.UTC)
-    ).count()
+    hoy = get_local_datetime().date()
     
-    productos_recientes = Producto.query.limit(5).all()
+    try:
+        hasta = datetime.strptime(request.args.get('hasta', ''), '%Y-%m-%d').date()
+    except ValueError:
+        hasta = hoy
     
-    return render_template('admin/dashboard.html',
-                         total_productos=total_productos,
-                         productos_sin_stock=productos_sin_stock,
-                         categorias_count=categorias_count,
-                         pedidos_hoy=pedidos_hoy,
-                         productos_recientes=productos_recientes)
+    try:
+        desde = datetime.strptime(request.args.get('desde', ''), '%Y-%m-%d').date()
+    except ValueError:
+        desde = hasta - timedelta(days=29)
+    
+    if desde > hasta:
+        desde, hasta = hasta, desde
+    
+    return render_template('admin/reportes.html',
+                         desde=desde,
+                         hasta=hasta,
+                         resumen=resumen_ventas(desde, hasta),
+                         dias=ventas_por_dia(desde, hasta),
+                         productos=productos_mas_vendidos(desde, hasta),
+                         categorias=ventas_por_categoria(desde, hasta))
 
 @productos_bp.route('/admin/productos')
 @login_required
@@ -166,13 +102,15 @@ def admin_listar_productos():
         query = query.filter_by(id_categoria=categoria_id)
     
     if busqueda:
-        query = query.filter(Producto.nombre.contains(busqueda))
+        query = query.filter(filtro_ids(Producto.id_producto, buscar_productos(busqueda, categoria_id)))
     
-    productos = query.all()
+    pagina = paginar_keyset(query, Producto.id_producto, descendente=False)
     categorias = Categoria.query.all()
     
     return render_template('admin/productos_lista.html',
-                         productos=productos,
+                         productos=pagina.items,
+                         pagina=pagina,
+                         tareas_imagen=tareas_pendientes(),
                          categorias=categorias,
                          categoria_seleccionada=categoria_id,
                          busqueda=busqueda)
@@ -206,28 +144,25 @@ def admin_nuevo_producto():
             return render_template('admin/producto_form.html', 
                                  categorias=Categoria.query.all())
         
-        # Subir imagen si se proporciona
-        imagen_url = None
-        if imagen and imagen.filename:
-            imagen_url, mensaje = subir_imagen_imgbb(imagen)
-            if imagen_url:
-                flash(mensaje, 'success')
-            else:
-                flash(f'No se pudo subir la imagen: {mensaje} El producto se creará sin imagen.', 'error')
-        
-        # Crear producto
+        # Crear producto (la imagen se sube en segundo plano)
         nuevo_producto = Producto(
             nombre=nombre,
             precio=precio,
             stock=stock,
-            id_categoria=int(id_categoria),
-            imagen_url=imagen_url
+            id_categoria=int(id_categoria)
         )
         
         try:
             db.session.add(nuevo_producto)
             db.session.commit()
+            # Primero el índice: así las sugerencias no se vuelven a cachear sin el producto
+            indexar_producto(nuevo_producto)
+            invalidar_productos([nuevo_producto.id_producto], id_categorias=[nuevo_producto.id_categoria])
             flash('Producto creado exitosamente', 'success')
+            
+            if imagen and imagen.filename:
+                encolar_imagen_producto(nuevo_producto.id_producto, imagen)
+                flash('La imagen se está procesando y aparecerá en unos segundos', 'info')
             return redirect(url_for('productos.admin_listar_productos'))
         except Exception as e:
             db.session.rollback()
@@ -259,24 +194,27 @@ def admin_editar_producto(id):
                 categorias = Categoria.query.all()
                 return render_template('admin/producto_form.html', producto=producto, categorias=categorias)
             
+            categoria_anterior = producto.id_categoria
+            
             producto.nombre = nombre
             producto.precio = float(precio)
             producto.stock = int(stock)
             producto.id_categoria = int(id_categoria)
             
         
-            # Manejar imagen nueva
-            imagen = request.files.get('imagen')
-            if imagen and imagen.filename:
-                imagen_url, mensaje = subir_imagen_imgbb(imagen)
-                if imagen_url:
-                    producto.imagen_url = imagen_url
-                    flash(f'Imagen actualizada: {mensaje}', 'success')
-                else:
-                    flash(f'No se pudo actualizar la imagen: {mensaje}', 'error')
-        
             db.session.commit()
+            
+            # Solo si cambió de categoría hay una lista nueva que debe incluirlo
+            categorias_nuevas = [producto.id_categoria] if producto.id_categoria != categoria_anterior else []
+            indexar_producto(producto)
+            invalidar_productos([producto.id_producto], id_categorias=categorias_nuevas)
             flash('Producto actualizado exitosamente', 'success')
+            
+            # Manejar imagen nueva en segundo plano
+            imagen = request.files.get('imagen')
+            if imagen and imagen.filename:
+                encolar_imagen_producto(producto.id_producto, imagen)
+                flash('La nueva imagen se está procesando y aparecerá en unos segundos', 'info')
             return redirect(url_for('productos.admin_listar_productos'))
             
         except ValueError as e:
@@ -301,6 +239,8 @@ def admin_eliminar_producto(id):
     try:
         db.session.delete(producto)
         db.session.commit()
+        quitar_producto(id)
+        invalidar_productos([id])
         flash('Producto eliminado exitosamente', 'success')
     except Exception as e:
         db.session.rollback()
@@ -319,8 +259,18 @@ def admin_listar_categorias():
     # Obtener parámetro de búsqueda
     buscar = request.args.get('buscar', '').strip()
     
+    # Cantidad de productos por categoría en un solo GROUP BY, sin cargar los productos
+    conteos = db.session.query(
+        Producto.id_categoria,
+        func.count(Producto.id_producto).label('num_productos')
+    ).group_by(Producto.id_categoria).subquery()
+    
     # Construir consulta base
-    query = Categoria.query
+    query = db.session.query(
+        Categoria.id_categoria,
+        Categoria.nombre,
+        func.coalesce(conteos.c.num_productos, 0).label('num_productos')
+    ).outerjoin(conteos, conteos.c.id_categoria == Categoria.id_categoria)
     
     # Aplicar filtro de búsqueda si existe
     if buscar:
@@ -351,6 +301,8 @@ def admin_nueva_categoria():
         try:
             db.session.add(nueva_categoria)
             db.session.commit()
+            indexar_categoria(nueva_categoria.id_categoria, nueva_categoria.nombre)
+            invalidar_categorias()
             flash('Categoría creada exitosamente', 'success')
             return redirect(url_for('productos.admin_listar_categorias'))
         except Exception as e:
@@ -374,6 +326,8 @@ def admin_editar_categoria(id):
         
         try:
             db.session.commit()
+            indexar_categoria(categoria.id_categoria, categoria.nombre)
+            invalidar_categorias()
             flash('Categoría actualizada exitosamente', 'success')
             return redirect(url_for('productos.admin_listar_categorias'))
         except Exception as e:
@@ -392,15 +346,18 @@ def admin_eliminar_categoria(id):
     
     categoria = Categoria.query.get_or_404(id)
     
-    # Verificar si la categoría tiene productos
-    if categoria.productos:
-        flash(f'No se puede eliminar la categoría "{categoria.nombre}" porque tiene {len(categoria.productos)} productos asociados', 'error')
+    # Verificar si la categoría tiene productos (EXISTS, sin cargarlos)
+    productos_categoria = Producto.query.filter_by(id_categoria=id)
+    if db.session.query(productos_categoria.exists()).scalar():
+        flash(f'No se puede eliminar la categoría "{categoria.nombre}" porque tiene {productos_categoria.count()} productos asociados', 'error')
         return redirect(url_for('productos.admin_listar_categorias'))
     
     try:
         nombre_categoria = categoria.nombre
         db.session.delete(categoria)
         db.session.commit()
+        indexar_categoria(id)
+        invalidar_categorias()
         flash(f'Categoría "{nombre_categoria}" eliminada exitosamente', 'success')
     except Exception as e:
         db.session.rollback()
@@ -441,4 +398,20 @@ def api_validar_imagen():
         return jsonify({
             'success': False, 
             'message': f'Error al validar imagen: {str(e)}'
-        }), 500
\ No newline at end of file
+        }), 500
+
+@productos_bp.route('/api/imagen/<id_tarea>')
+@login_required
+def api_estado_imagen(id_tarea):
+    """
+    API endpoint para consultar una subida de imagen en segundo plano
+    Retorna: JSON con estado (pendiente, procesando, completada, error) e imagen_url
+    """
+    if not current_user.is_admin():
+        return jsonify({'success': False, 'message': 'No autorizado'}), 403
+    
+    tarea = estado_tarea(id_tarea)
+    if not tarea:
+        return jsonify({'success': False, 'message': 'Tarea no encontrada'}), 404
+    
+    return jsonify({'success': True, **tarea})
\ No newline at end of file
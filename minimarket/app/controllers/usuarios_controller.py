@@ -1,6 +1,9 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 from app.models import Usuario, Rol, db
+from app.services.clientes import estadisticas_cliente
+from app.services.identidad import invalidar_identidad
+from app.services.paginacion import paginar_keyset
 
 usuarios_bp = Blueprint('usuarios', __name__)
 
@@ -24,11 +27,12 @@ def admin_listar_usuarios():
         query = query.filter(Usuario.nombre_completo.contains(busqueda) | 
                            Usuario.email.contains(busqueda))
     
-    usuarios = query.order_by(Usuario.id_usuario.desc()).all()
+    pagina = paginar_keyset(query, Usuario.id_usuario)
     roles = Rol.query.all()
     
     return render_template('admin/usuarios_lista.html', 
-                         usuarios=usuarios, 
+                         usuarios=pagina.items,
+                         pagina=pagina, 
                          roles=roles,
                          rol_seleccionado=rol_id,
                          busqueda=busqueda)
@@ -41,8 +45,13 @@ def admin_detalle_usuario(id):
         flash('No tienes permisos para acceder a esta página', 'error')
         return redirect(url_for('main.index'))
     
+    return render_detalle_usuario(id)
+
+def render_detalle_usuario(id):
+    """Detalle de un usuario con sus estadísticas de compras (solo clientes)"""
     usuario = Usuario.query.get_or_404(id)
-    return render_template('admin/usuario_detalle.html', usuario=usuario)
+    estadisticas = estadisticas_cliente(usuario.id_usuario) if usuario.is_cliente() else None
+    return render_template('admin/usuario_detalle.html', usuario=usuario, estadisticas=estadisticas)
 
 @usuarios_bp.route('/admin/usuario/<int:id>/estado', methods=['POST'])
 @login_required
@@ -76,6 +85,7 @@ def admin_cambiar_rol_usuario(id):
             
             try:
                 db.session.commit()
+                invalidar_identidad(usuario.id_usuario)
                 flash(f'Rol de usuario cambiado a {rol.nombre}', 'success')
             except Exception as e:
                 db.session.rollback()
@@ -143,6 +153,7 @@ def admin_editar_usuario(id):
                 usuario.set_password(new_password)
             
             db.session.commit()
+            invalidar_identidad(usuario.id_usuario)
             flash('Usuario actualizado exitosamente', 'success')
             return redirect(url_for('usuarios.admin_listar_usuarios'))
             
@@ -161,8 +172,7 @@ def admin_ver_usuario(id):
         flash('No tienes permisos para acceder a esta página', 'error')
         return redirect(url_for('main.index'))
     
-    usuario = Usuario.query.get_or_404(id)
-    return render_template('admin/usuario_detalle.html', usuario=usuario)
+    return render_detalle_usuario(id)
 
 @usuarios_bp.route('/admin/usuario/<int:id>/eliminar', methods=['POST'])
 @login_required
@@ -190,6 +200,7 @@ def admin_eliminar_usuario(id):
         nombre_usuario = usuario.nombre_completo
         db.session.delete(usuario)
         db.session.commit()
+        invalidar_identidad(id)
         flash(f'Usuario "{nombre_usuario}" eliminado exitosamente', 'success')
     except Exception as e:
         db.session.rollback()
@@ -1,14 +1,20 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy import func, select
+from sqlalchemy.orm import column_property
 from datetime import datetime
-import bcrypt
 import pytz
+from app.services.contrasenas import hashear_contrasena, necesita_rehash, verificar_contrasena
 
 db = SQLAlchemy()
 
 # Zona horaria de Perú
 PERU_TZ = pytz.timezone('America/Lima')
 
+def armar_srcset(variantes, formato):
+    """Une (formato, ancho, url) de un formato como "url 160w, url 480w, ..." """
+    return ', '.join(f'{url} {ancho}w' for fmt, ancho, url in sorted(variantes, key=lambda v: v[1]) if fmt == formato)
+
 def get_local_datetime():
     """Obtiene la fecha y hora actual en zona horaria de Perú"""
     utc_now = datetime.utcnow()
@@ -21,8 +27,8 @@ class Rol(db.Model):
     id_rol = db.Column(db.Integer, primary_key=True)
     nombre = db.Column(db.String(50), nullable=False, unique=True)
     
-    # Relación con usuarios
-    usuarios = db.relationship('Usuario', backref='rol', lazy=True)
+    # Relación con usuarios (el rol se trae con JOIN junto al usuario)
+    usuarios = db.relationship('Usuario', backref=db.backref('rol', lazy='joined'), lazy=True)
     
     def __repr__(self):
         return f'<Rol {self.nombre}>'
@@ -45,24 +51,33 @@ class Usuario(UserMixin, db.Model):
         return str(self.id_usuario)
     
     def set_password(self, password):
-        """Hashea la contraseña usando bcrypt"""
-        self.contrasena = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        """Hashea la contraseña usando bcrypt (en el pool de hashing, con el costo configurado)"""
+        self.contrasena = hashear_contrasena(password)
     
     def check_password(self, password):
         """Verifica la contraseña"""
-        return bcrypt.checkpw(password.encode('utf-8'), self.contrasena.encode('utf-8'))
+        return verificar_contrasena(password, self.contrasena)
+    
+    def password_necesita_rehash(self):
+        """True si el hash guardado usa un costo menor al configurado"""
+        return necesita_rehash(self.contrasena)
+    
+    def nombre_rol(self):
+        """Nombre del rol en minúsculas, calculado una sola vez por id_rol"""
+        calculado = getattr(self, '_rol_calculado', None)
+        if calculado is None or calculado[0] != self.id_rol:
+            calculado = (self.id_rol, self.rol.nombre.lower())
+            self._rol_calculado = calculado
+        return calculado[1]
     
     def is_admin(self):
-        return self.rol.nombre.lower() == 'admin'
+        return self.nombre_rol() == 'admin'
     
     def is_cliente(self):
-        return self.rol.nombre.lower() == 'cliente'
+        return self.nombre_rol() == 'cliente'
     
     def is_repartidor(self):
-        return self.rol.nombre.lower() == 'repartidor'
-    
-    def is_repartidor(self):
-        return self.rol.nombre.lower() == 'repartidor'
+        return self.nombre_rol() == 'repartidor'
     
     def __repr__(self):
         return f'<Usuario {self.email}>'
@@ -87,19 +102,88 @@ class Producto(db.Model):
     precio = db.Column(db.Numeric(10, 2), nullable=False)
     stock = db.Column(db.Integer, nullable=False, default=0)
     imagen_url = db.Column(db.String(500))
-    id_categoria = db.Column(db.Integer, db.ForeignKey('categorias.id_categoria'), nullable=False)
+    id_categoria = db.Column(db.Integer, db.ForeignKey('categorias.id_categoria'), nullable=False, index=True)
     
     # Relación con detalles de pedido
     detalles_pedido = db.relationship('PedidoDetalle', backref='producto', lazy=True)
     
+    # Variantes de la imagen (miniatura, tarjeta, detalle) en WebP y JPEG
+    imagenes = db.relationship('ProductoImagen', backref='producto', lazy=True, cascade='all, delete-orphan')
+    
+    def srcset(self, formato):
+        """Valor para el atributo srcset con las variantes de un formato"""
+        return armar_srcset(((imagen.formato, imagen.ancho, imagen.url) for imagen in self.imagenes), formato)
+    
     def __repr__(self):
         return f'<Producto {self.nombre}>'
 
+class ProductoImagen(db.Model):
+    __tablename__ = 'producto_imagenes'
+    
+    id_imagen = db.Column(db.Integer, primary_key=True)
+    id_producto = db.Column(db.Integer, db.ForeignKey('productos.id_producto'), nullable=False)
+    variante = db.Column(db.String(20), nullable=False)
+    formato = db.Column(db.String(10), nullable=False)
+    ancho = db.Column(db.Integer, nullable=False)
+    url = db.Column(db.String(500), nullable=False)
+    # SHA-256 de los bytes de esta variante y de la imagen original subida
+    hash = db.Column(db.String(64), index=True)
+    hash_original = db.Column(db.String(64), index=True)
+    
+    def __repr__(self):
+        return f'<ProductoImagen {self.id_producto} {self.variante} {self.formato}>'
+
+class ImagenAlmacenada(db.Model):
+    __tablename__ = 'imagenes_almacen'
+    
+    # Índice hash del contenido -> URL donde quedó guardado
+    hash = db.Column(db.String(64), primary_key=True)
+    formato = db.Column(db.String(10), nullable=False)
+    url = db.Column(db.String(500), nullable=False)
+    tamano = db.Column(db.Integer, nullable=False)
+    fecha = db.Column(db.DateTime, default=get_local_datetime)
+    
+    def __repr__(self):
+        return f'<ImagenAlmacenada {self.hash[:12]}>'
+
+class EventoPedido(db.Model):
+    __tablename__ = 'eventos_pedidos'
+    
+    # Creación y cambios de estado de pedidos, leídos por id creciente desde
+    # cualquier worker (listados en vivo)
+    id_evento = db.Column(db.Integer, primary_key=True)
+    fecha = db.Column(db.DateTime, default=get_local_datetime, index=True)
+    tipo = db.Column(db.String(30), nullable=False)
+    id_pedido = db.Column(db.Integer, nullable=False)
+    id_usuario = db.Column(db.Integer, nullable=False)
+    estado = db.Column(db.String(20), nullable=False)
+    estado_anterior = db.Column(db.String(20))
+    repartidor_id = db.Column(db.Integer)
+    repartidor_anterior = db.Column(db.Integer)
+    
+    def __repr__(self):
+        return f'<EventoPedido {self.id_evento} {self.tipo} {self.id_pedido}>'
+
+class TareaImagen(db.Model):
+    __tablename__ = 'tareas_imagen'
+    
+    # Estado de una subida de imagen en segundo plano, visible desde cualquier worker.
+    # Sin clave foránea: la tarea puede terminar después de eliminado el producto
+    id_tarea = db.Column(db.String(32), primary_key=True)
+    id_producto = db.Column(db.Integer, nullable=False, index=True)
+    estado = db.Column(db.String(20), nullable=False)
+    mensaje = db.Column(db.String(500))
+    imagen_url = db.Column(db.String(500))
+    actualizado = db.Column(db.DateTime, default=get_local_datetime, onupdate=get_local_datetime)
+    
+    def __repr__(self):
+        return f'<TareaImagen {self.id_tarea} {self.estado}>'
+
 class Pedido(db.Model):
     __tablename__ = 'pedidos'
     
     id_pedido = db.Column(db.Integer, primary_key=True)
-    id_usuario = db.Column(db.Integer, db.ForeignKey('usuarios.id_usuario'), nullable=False)
+    id_usuario = db.Column(db.Integer, db.ForeignKey('usuarios.id_usuario'), nullable=False, index=True)
     repartidor_id = db.Column(db.Integer, db.ForeignKey('usuarios.id_usuario'), nullable=True)
     total = db.Column(db.Numeric(10, 2), nullable=False)
     es_delivery = db.Column(db.Boolean, default=False)
@@ -124,7 +208,7 @@ class PedidoDetalle(db.Model):
     __tablename__ = 'pedido_detalle'
     
     id_detalle = db.Column(db.Integer, primary_key=True)
-    id_pedido = db.Column(db.Integer, db.ForeignKey('pedidos.id_pedido'), nullable=False)
+    id_pedido = db.Column(db.Integer, db.ForeignKey('pedidos.id_pedido'), nullable=False, index=True)
     id_producto = db.Column(db.Integer, db.ForeignKey('productos.id_producto'), nullable=False)
     cantidad = db.Column(db.Integer, nullable=False)
     precio_unitario = db.Column(db.Numeric(10, 2), nullable=False)
@@ -133,4 +217,75 @@ class PedidoDetalle(db.Model):
         return self.cantidad * self.precio_unitario
     
     def __repr__(self):
-        return f'<PedidoDetalle {self.id_detalle}>'
\ No newline at end of file
+        return f'<PedidoDetalle {self.id_detalle}>'
+
+# Cantidad de líneas de cada pedido (subconsulta correlacionada). Es diferida:
+# solo se calcula en las consultas que la piden con undefer(Pedido.num_lineas)
+Pedido.num_lineas = column_property(
+    select(func.count(PedidoDetalle.id_detalle))
+    .where(PedidoDetalle.id_pedido == Pedido.id_pedido)
+    .correlate_except(PedidoDetalle)
+    .scalar_subquery(),
+    deferred=True
+)
+
+# Tablas de resumen de ventas (se actualizan al crear o cancelar pedidos).
+# pedidos: pedidos creados; cancelados: cuántos de ellos se cancelaron;
+# unidades e ingresos: solo de los pedidos vigentes (no cancelados).
+
+class VentaDiaria(db.Model):
+    __tablename__ = 'ventas_diarias'
+    
+    fecha = db.Column(db.Date, primary_key=True)
+    pedidos = db.Column(db.Integer, nullable=False, default=0)
+    cancelados = db.Column(db.Integer, nullable=False, default=0)
+    unidades = db.Column(db.Integer, nullable=False, default=0)
+    ingresos = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<VentaDiaria {self.fecha}>'
+
+class VentaProducto(db.Model):
+    __tablename__ = 'ventas_producto_dia'
+    
+    fecha = db.Column(db.Date, primary_key=True)
+    id_producto = db.Column(db.Integer, primary_key=True, index=True)
+    pedidos = db.Column(db.Integer, nullable=False, default=0)
+    cancelados = db.Column(db.Integer, nullable=False, default=0)
+    unidades = db.Column(db.Integer, nullable=False, default=0)
+    ingresos = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<VentaProducto {self.fecha} {self.id_producto}>'
+
+class VentaCategoria(db.Model):
+    __tablename__ = 'ventas_categoria_dia'
+    
+    fecha = db.Column(db.Date, primary_key=True)
+    id_categoria = db.Column(db.Integer, primary_key=True, index=True)
+    pedidos = db.Column(db.Integer, nullable=False, default=0)
+    cancelados = db.Column(db.Integer, nullable=False, default=0)
+    unidades = db.Column(db.Integer, nullable=False, default=0)
+    ingresos = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<VentaCategoria {self.fecha} {self.id_categoria}>'
+
+class Carrito(db.Model):
+    __tablename__ = 'carritos'
+    __table_args__ = (
+        # Un carrito por usuario; los anónimos no cuentan (igual que en el script SQL)
+        db.Index('ix_carritos_id_usuario', 'id_usuario', unique=True,
+                 mssql_where=db.text('id_usuario IS NOT NULL'),
+                 sqlite_where=db.text('id_usuario IS NOT NULL')),
+    )
+    
+    # La cookie de sesión solo guarda este id; las líneas viven aquí
+    id_carrito = db.Column(db.String(32), primary_key=True)
+    id_usuario = db.Column(db.Integer, db.ForeignKey('usuarios.id_usuario'), nullable=True)
+    # Líneas compactas "id_producto:cantidad,..." en el orden en que se agregaron
+    lineas = db.Column(db.Text, nullable=False, default='')
+    actualizado = db.Column(db.DateTime, default=get_local_datetime, onupdate=get_local_datetime)
+    
+    def __repr__(self):
+        return f'<Carrito {self.id_carrito}>'
@@ -0,0 +1,299 @@
+"""
+Carrito de compras del lado del servidor.
+La cookie de sesión solo guarda el id del carrito (session['carrito_id']);
+las líneas viven en un almacén intercambiable: la tabla carritos ('bd', el
+carrito sobrevive a reinicios y se comparte entre dispositivos del mismo
+usuario) o un diccionario en memoria ('memoria', rápido pero por proceso,
+para desarrollo o un solo worker).
+
+Las líneas son {id_producto: cantidad} en el orden en que se agregaron; en la
+base de datos se guardan compactas como "12:3,7:1".
+
+El almacén BD solo hace flush: el controlador hace commit junto con el resto
+de la petición. Leer el carrito (incluido el contador del menú, que se
+evalúa al renderizar) nunca escribe; la migración de la cookie antigua y la
+fusión del carrito anónimo se guardan en la siguiente escritura.
+"""
+import secrets
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from flask import current_app, g, session
+from flask_login import current_user
+from sqlalchemy.exc import IntegrityError
+from app.models import Carrito, db, get_local_datetime
+
+CLAVE_SESION = 'carrito_id'
+# Carrito completo que guardaban en la cookie las sesiones anteriores
+CLAVE_LEGADO = 'carrito'
+
+
+def codificar_lineas(lineas):
+    """{12: 3, 7: 1} -> "12:3,7:1" """
+    return ','.join(f'{id_producto}:{cantidad}' for id_producto, cantidad in lineas.items())
+
+
+def decodificar_lineas(texto):
+    """ "12:3,7:1" -> {12: 3, 7: 1}, ignorando pares mal formados """
+    lineas = {}
+    for par in (texto or '').split(','):
+        id_producto, _, cantidad = par.partition(':')
+        try:
+            lineas[int(id_producto)] = int(cantidad)
+        except ValueError:
+            continue
+    return lineas
+
+
+class AlmacenCarritoBD:
+    """Carritos en la tabla carritos, una fila por carrito"""
+
+    def obtener(self, id_carrito):
+        """(id_usuario, lineas) o None si el carrito no existe"""
+        fila = db.session.query(Carrito.id_usuario, Carrito.lineas) \
+            .filter(Carrito.id_carrito == id_carrito).first()
+        if fila is None:
+            return None
+        return fila.id_usuario, decodificar_lineas(fila.lineas)
+
+    def de_usuario(self, id_usuario):
+        fila = db.session.query(Carrito.id_carrito).filter(Carrito.id_usuario == id_usuario).first()
+        return fila.id_carrito if fila else None
+
+    def guardar(self, id_carrito, lineas, id_usuario=None):
+        """UPDATE de la fila; si no existe se inserta (con punto de guardado por si otra petición la crea)"""
+        valores = {'lineas': codificar_lineas(lineas), 'actualizado': get_local_datetime()}
+        consulta = Carrito.query.filter_by(id_carrito=id_carrito)
+
+        if not consulta.update(valores, synchronize_session=False):
+            try:
+                with db.session.begin_nested():
+                    db.session.add(Carrito(id_carrito=id_carrito, id_usuario=id_usuario, **valores))
+            except IntegrityError:
+                # Otra petición creó este carrito, o el usuario ya tiene uno (índice único)
+                if not consulta.update(valores, synchronize_session=False) and id_usuario is not None:
+                    Carrito.query.filter_by(id_usuario=id_usuario).update(valores, synchronize_session=False)
+        db.session.flush()
+
+    def asignar_usuario(self, id_carrito, id_usuario):
+        Carrito.query.filter_by(id_carrito=id_carrito).update(
+            {'id_usuario': id_usuario}, synchronize_session=False
+        )
+        db.session.flush()
+
+    def eliminar(self, id_carrito):
+        Carrito.query.filter_by(id_carrito=id_carrito).delete(synchronize_session=False)
+        db.session.flush()
+
+    def limpiar_anonimos(self, dias):
+        """Elimina los carritos anónimos sin cambios en los últimos días"""
+        limite = get_local_datetime() - timedelta(days=dias)
+        eliminados = Carrito.query.filter(
+            Carrito.id_usuario.is_(None), Carrito.actualizado < limite
+        ).delete(synchronize_session=False)
+        db.session.flush()
+        return eliminados
+
+
+class AlmacenCarritoMemoria:
+    """Carritos en un diccionario del proceso; descarta los menos usados al pasar el máximo"""
+
+    def __init__(self, maximo=10000):
+        self.maximo = maximo
+        self._lock = threading.Lock()
+        self._carritos = OrderedDict()
+        self._por_usuario = {}
+
+    def obtener(self, id_carrito):
+        with self._lock:
+            entrada = self._carritos.get(id_carrito)
+            if entrada is None:
+                return None
+            self._carritos.move_to_end(id_carrito)
+            return entrada[0], dict(entrada[1])
+
+    def de_usuario(self, id_usuario):
+        with self._lock:
+            return self._por_usuario.get(id_usuario)
+
+    def guardar(self, id_carrito, lineas, id_usuario=None):
+        with self._lock:
+            entrada = self._carritos.get(id_carrito)
+            if entrada is not None:
+                id_usuario = entrada[0]
+            self._carritos[id_carrito] = (id_usuario, dict(lineas))
+            self._carritos.move_to_end(id_carrito)
+            if id_usuario is not None:
+                self._por_usuario[id_usuario] = id_carrito
+
+            while len(self._carritos) > self.maximo:
+                viejo, (dueno, _) = self._carritos.popitem(last=False)
+                if dueno is not None and self._por_usuario.get(dueno) == viejo:
+                    del self._por_usuario[dueno]
+
+    def asignar_usuario(self, id_carrito, id_usuario):
+        with self._lock:
+            entrada = self._carritos.get(id_carrito)
+            if entrada is not None:
+                self._carritos[id_carrito] = (id_usuario, entrada[1])
+                self._por_usuario[id_usuario] = id_carrito
+
+    def eliminar(self, id_carrito):
+        with self._lock:
+            entrada = self._carritos.pop(id_carrito, None)
+            if entrada is not None and entrada[0] is not None \
+                    and self._por_usuario.get(entrada[0]) == id_carrito:
+                del self._por_usuario[entrada[0]]
+
+    def limpiar_anonimos(self, dias):
+        # En memoria los carritos viejos ya salen por el máximo
+        return 0
+
+
+_almacen_bd = AlmacenCarritoBD()
+_almacen_memoria = None
+
+
+def obtener_almacen():
+    """Almacén configurado en CARRITO_BACKEND: 'bd' o 'memoria'"""
+    global _almacen_memoria
+
+    if current_app.config.get('CARRITO_BACKEND', 'bd') == 'memoria':
+        if _almacen_memoria is None:
+            _almacen_memoria = AlmacenCarritoMemoria(current_app.config.get('CARRITO_MEMORIA_MAXIMO', 10000))
+        return _almacen_memoria
+    return _almacen_bd
+
+
+def _usuario_actual():
+    return current_user.id_usuario if current_user.is_authenticated else None
+
+
+def _cargar():
+    """
+    (id_carrito, lineas, id_descartar) de la petición actual, sin escribir.
+    Solo se usa el carrito de la sesión si es del usuario actual. Un carrito
+    anónimo (o el de la cookie antigua) que llega con un usuario logueado se
+    suma en memoria al suyo; id_descartar es el carrito anónimo que se
+    elimina cuando esas líneas se guarden.
+    """
+    almacen = obtener_almacen()
+    id_usuario = _usuario_actual()
+    anonimo = None
+
+    id_carrito = session.get(CLAVE_SESION)
+    if id_carrito:
+        encontrado = almacen.obtener(id_carrito)
+        if encontrado is not None:
+            dueno, lineas = encontrado
+            if dueno == id_usuario:
+                return id_carrito, lineas, None
+            if dueno is None:
+                anonimo = (id_carrito, lineas)
+        else:
+            session.pop(CLAVE_SESION, None)
+    elif session.get(CLAVE_LEGADO):
+        # Sesiones anteriores guardaban el carrito entero en la cookie
+        anonimo = (None, decodificar_lineas(codificar_lineas(session[CLAVE_LEGADO])))
+
+    if id_usuario is None:
+        return None, anonimo[1] if anonimo else {}, None
+
+    # Mismo usuario desde otro dispositivo o con la sesión renovada
+    id_guardado = almacen.de_usuario(id_usuario)
+    guardado = almacen.obtener(id_guardado) if id_guardado else None
+    if guardado is None:
+        id_guardado, lineas = None, {}
+    else:
+        lineas = guardado[1]
+
+    if anonimo is None:
+        # Solo la cookie: la próxima petición lo encuentra sin buscar por usuario
+        if id_guardado is not None:
+            session[CLAVE_SESION] = id_guardado
+        return id_guardado, lineas, None
+    for id_producto, cantidad in anonimo[1].items():
+        lineas[id_producto] = lineas.get(id_producto, 0) + cantidad
+    return id_guardado, lineas, anonimo[0]
+
+
+def _actual():
+    """Carrito memorizado por petición (la vista y el contador del menú leen una vez)"""
+    if 'carrito_actual' not in g:
+        g.carrito_actual = _cargar()
+    return g.carrito_actual
+
+
+def _pendiente(carrito):
+    """True si hay líneas leídas de un carrito anónimo o de la cookie antigua sin guardar"""
+    return carrito[2] is not None or CLAVE_LEGADO in session
+
+
+def obtener_carrito():
+    """Copia de las líneas {id_producto: cantidad} del carrito actual"""
+    return dict(_actual()[1])
+
+
+def guardar_carrito(lineas):
+    """
+    Reemplaza las líneas del carrito actual (lo crea si todavía no existe).
+    El controlador hace el commit.
+    """
+    id_carrito, _, id_descartar = _actual()
+    almacen = obtener_almacen()
+    lineas = {int(id_producto): cantidad for id_producto, cantidad in lineas.items() if cantidad > 0}
+
+    if id_descartar is not None:
+        almacen.eliminar(id_descartar)
+    session.pop(CLAVE_LEGADO, None)
+
+    if id_carrito is None:
+        if not lineas:
+            session.pop(CLAVE_SESION, None)
+            g.carrito_actual = (None, {}, None)
+            return
+        id_carrito = secrets.token_hex(16)
+
+    almacen.guardar(id_carrito, lineas, _usuario_actual())
+    session[CLAVE_SESION] = id_carrito
+    g.carrito_actual = (id_carrito, lineas, None)
+
+
+def vaciar_carrito():
+    """Elimina el carrito actual (por ejemplo, junto con la creación del pedido)"""
+    id_carrito, _, id_descartar = _actual()
+    almacen = obtener_almacen()
+    for id_eliminar in (id_carrito, id_descartar):
+        if id_eliminar is not None:
+            almacen.eliminar(id_eliminar)
+    session.pop(CLAVE_SESION, None)
+    session.pop(CLAVE_LEGADO, None)
+    g.carrito_actual = (None, {}, None)
+
+
+def fusionar_carrito():
+    """
+    Llamar después de login_user: suma el carrito anónimo de la sesión al
+    carrito guardado del usuario. El controlador hace el commit.
+    """
+    g.pop('carrito_actual', None)
+    carrito = _actual()
+    if _pendiente(carrito):
+        guardar_carrito(carrito[1])
+
+
+def olvidar_carrito():
+    """Al cerrar sesión: el carrito queda guardado para el usuario, pero la cookie ya no lo apunta"""
+    session.pop(CLAVE_SESION, None)
+    g.pop('carrito_actual', None)
+
+
+def cantidad_productos_carrito():
+    """Cantidad de productos distintos en el carrito (contador del menú, solo lectura)"""
+    return len(_actual()[1])
+
+
+def limpiar_carritos_anonimos(dias):
+    eliminados = obtener_almacen().limpiar_anonimos(dias)
+    db.session.commit()
+    return eliminados
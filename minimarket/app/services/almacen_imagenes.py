@@ -0,0 +1,123 @@
+"""
+Almacén de imágenes direccionado por contenido.
+Cada archivo se identifica por el SHA-256 de sus bytes: si ya se guardó (o
+ya se subió a imgbb) se reutiliza su URL, y si la imagen original ya fue
+procesada antes, se reutilizan sus variantes sin volver a generarlas.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from datetime import timedelta
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from app.models import ImagenAlmacenada, ProductoImagen, db, get_local_datetime
+from app.services.cliente_imgbb import subir_bytes_imgbb
+
+EXTENSIONES = {'webp': 'webp', 'jpeg': 'jpg'}
+NOMBRE_VALIDO = re.compile(r'^[0-9a-f]{64}\.(webp|jpg)$')
+
+
+def calcular_hash(contenido):
+    return hashlib.sha256(contenido).hexdigest()
+
+
+def _directorio():
+    return current_app.config['IMAGENES_DIR']
+
+
+def ruta_local(nombre):
+    """Ruta en disco de un archivo del almacén local (<dir>/ab/abcd....ext)"""
+    return os.path.join(_directorio(), nombre[:2], nombre)
+
+
+def _guardar_local(hash_contenido, formato, contenido):
+    """Escribe el archivo de forma atómica y retorna su URL pública"""
+    nombre = f'{hash_contenido}.{EXTENSIONES[formato]}'
+    destino = ruta_local(nombre)
+
+    if not os.path.exists(destino):
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(destino))
+        with os.fdopen(descriptor, 'wb') as archivo:
+            archivo.write(contenido)
+        os.replace(temporal, destino)
+
+    return f"{current_app.config['IMAGENES_URL_BASE'].rstrip('/')}/{nombre}"
+
+
+def _guardar_imgbb(contenido):
+    url, mensaje = subir_bytes_imgbb(contenido)
+    if not url:
+        raise Exception(mensaje)
+    return url
+
+
+def guardar_imagen(contenido, formato):
+    """
+    Guarda unos bytes ya procesados y retorna su URL. Si el mismo contenido
+    ya está en el índice no se escribe ni se sube otra vez.
+    """
+    hash_contenido = calcular_hash(contenido)
+
+    existente = db.session.get(ImagenAlmacenada, hash_contenido)
+    if existente:
+        return existente.url, hash_contenido
+
+    if current_app.config.get('IMAGENES_BACKEND', 'imgbb') == 'local':
+        url = _guardar_local(hash_contenido, formato, contenido)
+    else:
+        url = _guardar_imgbb(contenido)
+
+    # Punto de guardado: si otro proceso registró el mismo hash, se usa el suyo
+    try:
+        with db.session.begin_nested():
+            db.session.add(ImagenAlmacenada(
+                hash=hash_contenido, formato=formato, url=url, tamano=len(contenido)
+            ))
+    except IntegrityError:
+        url = db.session.get(ImagenAlmacenada, hash_contenido).url
+
+    return url, hash_contenido
+
+
+def variantes_existentes(hash_original):
+    """
+    Variantes ya generadas para la misma imagen original
+    Retorna: lista de (variante, formato, ancho, url, hash) o [] si es nueva
+    """
+    filas = ProductoImagen.query.filter_by(hash_original=hash_original).all()
+
+    unicas = {}
+    for fila in filas:
+        unicas.setdefault((fila.variante, fila.formato), (fila.variante, fila.formato, fila.ancho, fila.url, fila.hash))
+    return list(unicas.values())
+
+
+def recolectar_basura(gracia_horas=None):
+    """
+    Elimina del índice (y del disco, en el backend local) las imágenes que ya
+    no usa ningún producto. Se respeta un margen de tiempo para no borrar las
+    que una subida en curso todavía no enlazó.
+    Retorna: cantidad de imágenes eliminadas
+    """
+    if gracia_horas is None:
+        gracia_horas = current_app.config.get('IMAGENES_GC_GRACIA_HORAS', 24)
+    limite = get_local_datetime() - timedelta(hours=gracia_horas)
+
+    en_uso = select(ProductoImagen.hash).where(ProductoImagen.hash.isnot(None))
+    huerfanas = ImagenAlmacenada.query.filter(
+        ImagenAlmacenada.fecha < limite,
+        ImagenAlmacenada.hash.notin_(en_uso)
+    ).all()
+
+    for imagen in huerfanas:
+        nombre = f'{imagen.hash}.{EXTENSIONES.get(imagen.formato, imagen.formato)}'
+        ruta = ruta_local(nombre)
+        if os.path.exists(ruta):
+            os.remove(ruta)
+        db.session.delete(imagen)
+
+    db.session.commit()
+    return len(huerfanas)
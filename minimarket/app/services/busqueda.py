@@ -0,0 +1,208 @@
+"""
+Índice invertido en memoria para buscar productos por nombre y categoría.
+Reemplaza los LIKE '%q%' (que recorren toda la tabla) por búsqueda por
+prefijos de palabra, sin distinguir mayúsculas ni tildes ("platano" encuentra
+"Plátano").
+"""
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from flask import current_app
+from sqlalchemy import bindparam
+from app.models import Producto, Categoria
+
+_SEPARADORES = re.compile(r'[^0-9a-z]+')
+
+
+def normalizar(texto):
+    """Minúsculas y sin tildes ni diéresis (á→a, ñ→n, ü→u)"""
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    sin_marcas = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return sin_marcas.lower()
+
+
+def tokenizar(texto):
+    """Palabras normalizadas de un texto"""
+    return [token for token in _SEPARADORES.split(normalizar(texto)) if token]
+
+
+def _texto_tokens(tokens):
+    """Tokens separados y rodeados por espacios: " leche entera " """
+    return f' {" ".join(tokens)} '
+
+
+class IndiceBusqueda:
+    """Índice de prefijos de palabra → ids de producto"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._prefijos = defaultdict(set)
+        # id_producto -> (tokens del nombre, tokens totales, id_categoria, nombre normalizado,
+        #                 " token1 token2 " para puntuar prefijos con una búsqueda de texto)
+        self._documentos = {}
+        self._categorias = {}
+        self.construido_en = None
+
+    def _indexar(self, id_producto, tokens):
+        for token in tokens:
+            for largo in range(1, len(token) + 1):
+                self._prefijos[token[:largo]].add(id_producto)
+
+    def _desindexar(self, id_producto, tokens):
+        for token in tokens:
+            for largo in range(1, len(token) + 1):
+                prefijo = token[:largo]
+                ids = self._prefijos.get(prefijo)
+                if ids is not None:
+                    ids.discard(id_producto)
+                    if not ids:
+                        del self._prefijos[prefijo]
+
+    def construir(self, productos, categorias):
+        """
+        Reconstruye el índice completo.
+        productos: iterable de (id_producto, nombre, id_categoria)
+        categorias: {id_categoria: nombre}
+        """
+        with self._lock:
+            self._prefijos = defaultdict(set)
+            self._documentos = {}
+            self._categorias = {id_cat: tokenizar(nombre) for id_cat, nombre in categorias.items()}
+            for id_producto, nombre, id_categoria in productos:
+                self._agregar(id_producto, nombre, id_categoria)
+            self.construido_en = time.monotonic()
+
+    def _agregar(self, id_producto, nombre, id_categoria):
+        tokens_nombre = set(tokenizar(nombre))
+        tokens = tokens_nombre | set(self._categorias.get(id_categoria, ()))
+        self._documentos[id_producto] = (tokens_nombre, tokens, id_categoria, normalizar(nombre),
+                                         _texto_tokens(tokens_nombre))
+        self._indexar(id_producto, tokens)
+
+    def agregar(self, id_producto, nombre, id_categoria):
+        """Agrega o reemplaza un producto"""
+        with self._lock:
+            self.eliminar(id_producto)
+            self._agregar(id_producto, nombre, id_categoria)
+
+    def eliminar(self, id_producto):
+        with self._lock:
+            documento = self._documentos.pop(id_producto, None)
+            if documento:
+                self._desindexar(id_producto, documento[1])
+
+    def actualizar_categoria(self, id_categoria, nombre):
+        """Registra el nombre de una categoría y reindexa sus productos"""
+        with self._lock:
+            if nombre is None:
+                self._categorias.pop(id_categoria, None)
+            else:
+                self._categorias[id_categoria] = tokenizar(nombre)
+
+            afectados = [
+                (id_producto, documento)
+                for id_producto, documento in self._documentos.items()
+                if documento[2] == id_categoria
+            ]
+            for id_producto, (tokens_nombre, tokens, _, nombre_normalizado, texto) in afectados:
+                self._desindexar(id_producto, tokens)
+                nuevos = tokens_nombre | set(self._categorias.get(id_categoria, ()))
+                self._documentos[id_producto] = (tokens_nombre, nuevos, id_categoria, nombre_normalizado, texto)
+                self._indexar(id_producto, nuevos)
+
+    def buscar(self, texto, id_categoria=None, limite=None):
+        """
+        Ids de productos donde cada palabra buscada es prefijo de alguna
+        palabra del nombre o de la categoría. Primero las coincidencias
+        exactas en el nombre, luego por prefijo en el nombre, luego el resto.
+        """
+        terminos = tokenizar(texto)
+        if not terminos:
+            return []
+
+        with self._lock:
+            candidatos = None
+            for termino in sorted(set(terminos), key=len, reverse=True):
+                ids = self._prefijos.get(termino)
+                if not ids:
+                    return []
+                candidatos = set(ids) if candidatos is None else candidatos & ids
+                if not candidatos:
+                    return []
+
+            # " termino " aparece en el texto si es palabra exacta; " termino" si es prefijo
+            buscados = [(f' {termino} ', f' {termino}') for termino in terminos]
+            resultados = []
+            for id_producto in candidatos:
+                _, _, categoria, nombre_normalizado, texto = self._documentos[id_producto]
+                if id_categoria and categoria != id_categoria:
+                    continue
+
+                puntaje = 0
+                for exacto, prefijo in buscados:
+                    if exacto in texto:
+                        puntaje += 2
+                    elif prefijo in texto:
+                        puntaje += 1
+                resultados.append((-puntaje, nombre_normalizado, id_producto))
+
+        # Con límite (sugerencias) basta con los mejores, sin ordenar todo
+        resultados = heapq.nsmallest(limite, resultados) if limite else sorted(resultados)
+        return [id_producto for _, _, id_producto in resultados]
+
+    def __len__(self):
+        return len(self._documentos)
+
+
+indice_productos = IndiceBusqueda()
+
+
+def construir_indice():
+    """Carga nombres de productos y categorías y reconstruye el índice"""
+    categorias = {c.id_categoria: c.nombre for c in Categoria.query.all()}
+    productos = Producto.query.with_entities(
+        Producto.id_producto, Producto.nombre, Producto.id_categoria
+    ).all()
+    indice_productos.construir(productos, categorias)
+
+
+def _asegurar_indice():
+    """
+    Construye el índice si aún no existe y lo reconstruye cada cierto tiempo,
+    para recoger cambios hechos por otros procesos (otros workers de gunicorn)
+    """
+    intervalo = current_app.config.get('BUSQUEDA_REINDEXAR_SEGUNDOS', 300)
+    construido = indice_productos.construido_en
+    if construido is None or time.monotonic() - construido > intervalo:
+        construir_indice()
+
+
+def buscar_productos(texto, id_categoria=None, limite=None):
+    """Ids de productos que coinciden con el texto, ordenados por relevancia"""
+    _asegurar_indice()
+    return indice_productos.buscar(texto, id_categoria, limite)
+
+
+def indexar_producto(producto):
+    indice_productos.agregar(producto.id_producto, producto.nombre, producto.id_categoria)
+
+
+def quitar_producto(id_producto):
+    indice_productos.eliminar(id_producto)
+
+
+def indexar_categoria(id_categoria, nombre=None):
+    """Actualiza el nombre de una categoría en el índice (None si se eliminó)"""
+    indice_productos.actualizar_categoria(id_categoria, nombre)
+
+
+def filtro_ids(columna, ids):
+    """
+    Condición columna IN (...) para los ids encontrados. Los enteros se
+    escriben en el SQL para no chocar con el límite de 2100 parámetros de
+    SQL Server cuando la búsqueda devuelve muchos productos.
+    """
+    return columna.in_(bindparam('ids_busqueda', list(ids), expanding=True, literal_execute=True))
@@ -0,0 +1,229 @@
+"""
+Caché de lectura del catálogo público con TTL e invalidación explícita.
+Se guardan copias inmutables (no instancias ORM) para que puedan
+compartirse entre peticiones sin depender de la sesión de SQLAlchemy.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from flask import current_app
+from sqlalchemy.orm import joinedload, selectinload
+from app.models import Producto, Categoria, armar_srcset
+from app.services.busqueda import buscar_productos, filtro_ids, tokenizar
+
+CANTIDAD_DESTACADOS = 8
+
+CategoriaCacheada = namedtuple('CategoriaCacheada', 'id_categoria nombre')
+
+
+class ProductoCacheado(namedtuple(
+    'ProductoCacheado',
+    'id_producto nombre precio stock imagen_url id_categoria categoria variantes'
+)):
+    """Copia de un producto; variantes es una tupla de (formato, ancho, url)"""
+    __slots__ = ()
+
+    def srcset(self, formato):
+        return armar_srcset(self.variantes, formato)
+
+
+class CacheTTL:
+    """
+    Diccionario con vencimiento por clave y contadores de aciertos/fallos.
+    Con maximo, descarta las entradas usadas hace más tiempo (LRU).
+    """
+
+    def __init__(self, maximo=None):
+        self.maximo = maximo
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.invalidaciones = 0
+
+    def obtener(self, clave, cargar, ttl):
+        """Retorna el valor en caché o lo carga con cargar() y lo guarda"""
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is not None and entrada[0] > ahora:
+                self.aciertos += 1
+                if self.maximo:
+                    self._datos.move_to_end(clave)
+                return entrada[1]
+            self.fallos += 1
+
+        valor = cargar()
+
+        with self._lock:
+            self._datos[clave] = (ahora + ttl, valor)
+            if self.maximo:
+                self._datos.move_to_end(clave)
+                while len(self._datos) > self.maximo:
+                    self._datos.popitem(last=False)
+        return valor
+
+    def claves(self):
+        with self._lock:
+            return list(self._datos.keys())
+
+    def valor(self, clave):
+        """Valor guardado aunque esté vencido, sin contar acierto ni fallo"""
+        with self._lock:
+            entrada = self._datos.get(clave)
+            return entrada[1] if entrada else None
+
+    def invalidar(self, *claves):
+        with self._lock:
+            for clave in claves:
+                if self._datos.pop(clave, None) is not None:
+                    self.invalidaciones += 1
+
+    def limpiar(self):
+        with self._lock:
+            self.invalidaciones += len(self._datos)
+            self._datos.clear()
+
+    def metricas(self):
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                'entradas': len(self._datos),
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'invalidaciones': self.invalidaciones,
+                'tasa_aciertos': round(self.aciertos / consultas, 4) if consultas else 0.0
+            }
+
+
+_cache = CacheTTL()
+# Respuestas del buscador mientras se escribe, por prefijo; se vacía con cualquier cambio del catálogo
+_sugerencias = CacheTTL(maximo=2000)
+
+
+def _ttl():
+    return current_app.config.get('CATALOGO_CACHE_TTL', 60)
+
+
+def _copiar_categoria(categoria):
+    return CategoriaCacheada(categoria.id_categoria, categoria.nombre)
+
+
+def _copiar_producto(producto):
+    return ProductoCacheado(
+        producto.id_producto,
+        producto.nombre,
+        producto.precio,
+        producto.stock,
+        producto.imagen_url,
+        producto.id_categoria,
+        _copiar_categoria(producto.categoria),
+        tuple((imagen.formato, imagen.ancho, imagen.url) for imagen in producto.imagenes)
+    )
+
+
+def _opciones_producto():
+    return (joinedload(Producto.categoria), selectinload(Producto.imagenes))
+
+
+def _consultar_productos(query):
+    return tuple(_copiar_producto(p) for p in query.options(*_opciones_producto()).all())
+
+
+def obtener_producto(id_producto):
+    """Producto por id o None si no existe"""
+    def cargar():
+        producto = Producto.query.options(*_opciones_producto()).get(id_producto)
+        return _copiar_producto(producto) if producto else None
+
+    return _cache.obtener(('producto', id_producto), cargar, _ttl())
+
+
+def obtener_productos_categoria(id_categoria=None):
+    """Productos de una categoría; con id_categoria=None, todo el catálogo"""
+    def cargar():
+        query = Producto.query
+        if id_categoria:
+            query = query.filter_by(id_categoria=id_categoria)
+        return _consultar_productos(query.order_by(Producto.id_producto))
+
+    return _cache.obtener(('categoria', id_categoria), cargar, _ttl())
+
+
+def obtener_destacados():
+    """Productos mostrados en la página principal"""
+    def cargar():
+        return _consultar_productos(Producto.query.order_by(Producto.id_producto).limit(CANTIDAD_DESTACADOS))
+
+    return _cache.obtener(('destacados',), cargar, _ttl())
+
+
+def obtener_categorias():
+    """Lista de categorías"""
+    def cargar():
+        return tuple(_copiar_categoria(c) for c in Categoria.query.order_by(Categoria.id_categoria).all())
+
+    return _cache.obtener(('categorias',), cargar, _ttl())
+
+
+def obtener_sugerencias(texto, id_categoria=None, limite=8):
+    """
+    Mejores productos para lo que se lleva escrito en el buscador. Los ids
+    salen del índice en memoria y los datos de una consulta por ids; el
+    resultado se guarda por prefijo normalizado ("Plá" y "pla " comparten entrada).
+    """
+    prefijo = ' '.join(tokenizar(texto))
+
+    def cargar():
+        ids = buscar_productos(prefijo, id_categoria, limite)
+        if not ids:
+            return ()
+        por_id = {
+            p.id_producto: p
+            for p in _consultar_productos(Producto.query.filter(filtro_ids(Producto.id_producto, ids)))
+        }
+        return tuple(por_id[i] for i in ids if i in por_id)
+
+    return _sugerencias.obtener(
+        (prefijo, id_categoria, limite), cargar,
+        current_app.config.get('SUGERENCIAS_CACHE_TTL', 60)
+    )
+
+
+def invalidar_productos(ids_productos, id_categorias=()):
+    """
+    Invalida solo las claves afectadas por cambios en estos productos: su
+    entrada individual y las listas que ya los contienen. id_categorias indica
+    listas a las que un producto entra (altas o cambio de categoría).
+    """
+    ids = set(ids_productos)
+    afectadas = [('producto', producto_id) for producto_id in ids]
+
+    if id_categorias:
+        afectadas.append(('categoria', None))
+        afectadas.extend(('categoria', id_categoria) for id_categoria in id_categorias)
+
+    for clave in _cache.claves():
+        if clave[0] not in ('categoria', 'destacados'):
+            continue
+        productos = _cache.valor(clave) or ()
+        if any(p.id_producto in ids for p in productos):
+            afectadas.append(clave)
+        elif clave[0] == 'destacados' and id_categorias and len(productos) < CANTIDAD_DESTACADOS:
+            afectadas.append(clave)
+
+    _cache.invalidar(*afectadas)
+    _sugerencias.limpiar()
+
+
+def invalidar_categorias():
+    """
+    Cambios en categorías: el nombre va copiado dentro de cada producto,
+    así que se descarta todo el catálogo
+    """
+    _cache.limpiar()
+    _sugerencias.limpiar()
+
+
+def metricas_cache():
+    return dict(_cache.metricas(), sugerencias=_sugerencias.metricas())
@@ -0,0 +1,63 @@
+"""
+Hidratación del carrito: trae todos los productos con un solo SELECT ... IN
+"""
+from app.models import Producto
+
+
+class CarritoHidratado:
+    """Líneas con precio y subtotal, total del carrito e ids no encontrados"""
+
+    def __init__(self, lineas, total, ids_invalidos):
+        self.lineas = lineas
+        self.total = total
+        self.ids_invalidos = ids_invalidos
+
+    def lineas_sin_stock(self):
+        """Líneas cuya cantidad supera el stock actual del producto"""
+        return [linea for linea in self.lineas if linea['cantidad'] > linea['producto'].stock]
+
+    def __bool__(self):
+        return bool(self.lineas)
+
+
+def hidratar_carrito(carrito):
+    """
+    Convierte {id_producto: cantidad} en líneas listas para mostrar o procesar.
+    No bloquea filas: al crear el pedido el stock se valida y descuenta con
+    el UPDATE condicional de inventario.reservar_stock.
+    """
+    cantidades = {}
+    ids_invalidos = []
+
+    for producto_id, cantidad in carrito.items():
+        try:
+            cantidades[int(producto_id)] = cantidad
+        except (TypeError, ValueError):
+            ids_invalidos.append(producto_id)
+
+    productos = {}
+    if cantidades:
+        productos = {
+            producto.id_producto: producto
+            for producto in Producto.query.filter(Producto.id_producto.in_(cantidades.keys())).all()
+        }
+
+    lineas = []
+    total = 0
+
+    # Se respeta el orden en que el cliente agregó los productos
+    for producto_id, cantidad in cantidades.items():
+        producto = productos.get(producto_id)
+        if not producto:
+            ids_invalidos.append(producto_id)
+            continue
+
+        subtotal = producto.precio * cantidad
+        lineas.append({
+            'producto': producto,
+            'cantidad': cantidad,
+            'subtotal': subtotal
+        })
+        total += subtotal
+
+    return CarritoHidratado(lineas, total, ids_invalidos)
@@ -0,0 +1,251 @@
+"""
+Cliente HTTP para la API de imgbb.
+Reutiliza conexiones keep-alive (una sola sesión de requests con su pool),
+aplica timeouts de conexión y lectura, reintenta con espera exponencial con
+jitter y corta el circuito cuando imgbb falla seguido, para no dejar a los
+hilos de subida esperando a un servicio caído.
+"""
+import base64
+import random
+import threading
+import time
+from collections import deque
+import requests
+from requests.adapters import HTTPAdapter
+from flask import current_app
+
+# Códigos que vale la pena reintentar (saturación o falla del servidor)
+CODIGOS_REINTENTABLES = {429, 500, 502, 503, 504}
+
+CIRCUITO_CERRADO = 'cerrado'
+CIRCUITO_ABIERTO = 'abierto'
+CIRCUITO_SEMIABIERTO = 'semiabierto'
+
+# Latencias recientes que se guardan para calcular percentiles
+MUESTRAS_LATENCIA = 200
+
+
+class CircuitoAbierto(Exception):
+    """imgbb falló demasiadas veces seguidas; no se intenta hasta que pase la espera"""
+
+
+class ErrorImgbb(Exception):
+    """La subida no se pudo completar (error de red, timeout o respuesta inválida)"""
+
+
+class CircuitBreaker:
+    """
+    Cerrado: deja pasar todo. Tras `umbral` fallos seguidos se abre y rechaza
+    al instante durante `espera` segundos; luego deja pasar una sola prueba
+    (semiabierto) que lo cierra si sale bien o lo vuelve a abrir si falla.
+    """
+
+    def __init__(self, umbral, espera):
+        self.umbral = umbral
+        self.espera = espera
+        self.estado = CIRCUITO_CERRADO
+        self._fallos = 0
+        self._abierto_en = 0.0
+        self._prueba_en_curso = False
+        self._lock = threading.Lock()
+
+    def permitir(self):
+        with self._lock:
+            if self.estado == CIRCUITO_CERRADO:
+                return True
+            if self.estado == CIRCUITO_ABIERTO:
+                if time.monotonic() - self._abierto_en < self.espera:
+                    return False
+                self.estado = CIRCUITO_SEMIABIERTO
+            # Semiabierto: solo una petición de prueba a la vez
+            if self._prueba_en_curso:
+                return False
+            self._prueba_en_curso = True
+            return True
+
+    def registrar_exito(self):
+        with self._lock:
+            self.estado = CIRCUITO_CERRADO
+            self._fallos = 0
+            self._prueba_en_curso = False
+
+    def registrar_fallo(self):
+        with self._lock:
+            self._fallos += 1
+            self._prueba_en_curso = False
+            if self.estado == CIRCUITO_SEMIABIERTO or self._fallos >= self.umbral:
+                self.estado = CIRCUITO_ABIERTO
+                self._abierto_en = time.monotonic()
+
+
+class ClienteImgbb:
+    """Sube imágenes a imgbb con una sesión persistente, reintentos y métricas"""
+
+    def __init__(self, url, api_key, timeout_conexion=3.05, timeout_lectura=20,
+                 reintentos=3, espera_base=0.5, espera_maxima=8,
+                 umbral_circuito=5, espera_circuito=30, conexiones=4):
+        self.url = url
+        self.api_key = api_key
+        self.timeout = (timeout_conexion, timeout_lectura)
+        self.reintentos = reintentos
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self.circuito = CircuitBreaker(umbral_circuito, espera_circuito)
+
+        self.sesion = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=conexiones)
+        self.sesion.mount('http://', adaptador)
+        self.sesion.mount('https://', adaptador)
+
+        self._lock = threading.Lock()
+        self._latencias = deque(maxlen=MUESTRAS_LATENCIA)
+        self._contadores = {
+            'subidas': 0,
+            'exitosas': 0,
+            'fallidas': 0,
+            'intentos': 0,
+            'reintentos': 0,
+            'timeouts': 0,
+            'rechazadas_circuito': 0
+        }
+
+    def _contar(self, clave):
+        with self._lock:
+            self._contadores[clave] += 1
+
+    def _espera(self, intento):
+        """Backoff exponencial con jitter completo: aleatorio entre 0 y el tope"""
+        tope = min(self.espera_maxima, self.espera_base * (2 ** intento))
+        return random.uniform(0, tope)
+
+    def _intentar(self, payload):
+        """
+        Un intento de subida
+        Retorna: (url, None) si salió bien o (None, (mensaje, reintentable))
+        """
+        self._contar('intentos')
+        inicio = time.monotonic()
+        try:
+            response = self.sesion.post(self.url, data=payload, timeout=self.timeout)
+        except requests.Timeout:
+            self._contar('timeouts')
+            return None, ('Tiempo de espera agotado con el servidor de imágenes', True)
+        except requests.ConnectionError:
+            return None, ('No se pudo conectar con el servidor de imágenes', True)
+        finally:
+            with self._lock:
+                self._latencias.append(time.monotonic() - inicio)
+
+        if response.status_code == 200:
+            try:
+                data = response.json()
+            except ValueError:
+                return None, ('Respuesta inválida del servidor de imágenes', True)
+            if data.get('success'):
+                return data['data']['url'], None
+            return None, ('El servidor de imágenes rechazó la imagen', False)
+
+        reintentable = response.status_code in CODIGOS_REINTENTABLES
+        return None, (f'Error del servidor de imágenes (código {response.status_code})', reintentable)
+
+    def subir(self, contenido):
+        """
+        Sube los bytes de una imagen
+        Retorna: URL pública de la imagen
+        Lanza: CircuitoAbierto o ErrorImgbb
+        """
+        self._contar('subidas')
+        payload = {
+            'key': self.api_key,
+            'image': base64.b64encode(contenido).decode('utf-8')
+        }
+
+        mensaje = 'Error al subir la imagen'
+        for intento in range(self.reintentos + 1):
+            if not self.circuito.permitir():
+                self._contar('rechazadas_circuito')
+                self._contar('fallidas')
+                raise CircuitoAbierto('El servidor de imágenes no está disponible, intenta más tarde')
+
+            if intento > 0:
+                self._contar('reintentos')
+
+            url, error = self._intentar(payload)
+            if url:
+                self.circuito.registrar_exito()
+                self._contar('exitosas')
+                return url
+
+            mensaje, reintentable = error
+            if not reintentable:
+                # La imagen es el problema, no imgbb: no cuenta para el circuito
+                self.circuito.registrar_exito()
+                break
+
+            self.circuito.registrar_fallo()
+            if intento < self.reintentos:
+                time.sleep(self._espera(intento))
+
+        self._contar('fallidas')
+        raise ErrorImgbb(mensaje)
+
+    def metricas(self):
+        with self._lock:
+            latencias = sorted(self._latencias)
+            resultado = dict(self._contadores)
+
+        resultado['circuito'] = self.circuito.estado
+        if latencias:
+            resultado['latencia_ms'] = {
+                'promedio': round(sum(latencias) / len(latencias) * 1000, 1),
+                'p50': round(latencias[len(latencias) // 2] * 1000, 1),
+                'p95': round(latencias[min(len(latencias) - 1, int(len(latencias) * 0.95))] * 1000, 1),
+                'maxima': round(latencias[-1] * 1000, 1)
+            }
+        else:
+            resultado['latencia_ms'] = None
+        return resultado
+
+
+_cliente = None
+_lock_cliente = threading.Lock()
+
+
+def obtener_cliente():
+    """Cliente único por proceso, creado con la configuración de la app"""
+    global _cliente
+    with _lock_cliente:
+        if _cliente is None:
+            config = current_app.config
+            _cliente = ClienteImgbb(
+                config['IMGBB_API_URL'],
+                config['IMGBB_API_KEY'],
+                timeout_conexion=config.get('IMGBB_TIMEOUT_CONEXION', 3.05),
+                timeout_lectura=config.get('IMGBB_TIMEOUT_LECTURA', 20),
+                reintentos=config.get('IMGBB_REINTENTOS', 3),
+                espera_base=config.get('IMGBB_ESPERA_BASE', 0.5),
+                espera_maxima=config.get('IMGBB_ESPERA_MAXIMA', 8),
+                umbral_circuito=config.get('IMGBB_CIRCUITO_FALLOS', 5),
+                espera_circuito=config.get('IMGBB_CIRCUITO_ESPERA', 30),
+                conexiones=config.get('IMGBB_CONEXIONES', 4)
+            )
+        return _cliente
+
+
+def metricas_imgbb():
+    return obtener_cliente().metricas()
+
+
+def subir_bytes_imgbb(contenido):
+    """
+    Sube a imgbb una imagen ya procesada, sin volver a validarla ni optimizarla
+    Retorna: (url, mensaje_error)
+    """
+    try:
+        # Sesión persistente con timeouts, reintentos y circuit breaker
+        return obtener_cliente().subir(contenido), "Imagen subida exitosamente"
+    except (CircuitoAbierto, ErrorImgbb) as e:
+        return None, str(e)
+    except Exception as e:
+        print(f"Error al subir imagen: {e}")
+        return None, f"Error al procesar la imagen: {str(e)}"
@@ -0,0 +1,35 @@
+"""
+Estadísticas de compras de un cliente calculadas en SQL.
+Se evita cargar todo el historial de pedidos del usuario para contarlo,
+sumarlo y ordenarlo en la plantilla: una consulta agrega y otra trae
+solo los últimos pedidos.
+"""
+from collections import namedtuple
+from sqlalchemy import func
+from app.models import Pedido, db
+
+CANTIDAD_ULTIMOS = 5
+
+EstadisticasCliente = namedtuple(
+    'EstadisticasCliente',
+    'total_pedidos total_gastado ticket_promedio ultimos_pedidos'
+)
+
+
+def estadisticas_cliente(id_usuario, ultimos=CANTIDAD_ULTIMOS):
+    """Cantidad de pedidos, total gastado, ticket promedio y los últimos pedidos del cliente"""
+    total_pedidos, total_gastado = db.session.query(
+        func.count(Pedido.id_pedido),
+        func.coalesce(func.sum(Pedido.total), 0)
+    ).filter(Pedido.id_usuario == id_usuario).one()
+
+    # id_pedido crece con la fecha y viene en el índice de id_usuario
+    ultimos_pedidos = Pedido.query.filter_by(id_usuario=id_usuario) \
+        .order_by(Pedido.id_pedido.desc()).limit(ultimos).all() if total_pedidos else []
+
+    return EstadisticasCliente(
+        total_pedidos,
+        total_gastado,
+        total_gastado / total_pedidos if total_pedidos else 0,
+        ultimos_pedidos
+    )
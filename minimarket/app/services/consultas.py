@@ -0,0 +1,130 @@
+"""
+Opciones de carga y consultas reutilizables para evitar N+1 en pedidos
+"""
+from collections import defaultdict, namedtuple
+from sqlalchemy import func, select
+from sqlalchemy.orm import aliased, joinedload, selectinload
+from app.models import Pedido, PedidoDetalle, Producto, Usuario, db
+
+LineaResumen = namedtuple('LineaResumen', 'cantidad producto')
+
+
+def opciones_pedido_lista():
+    """
+    Carga en lote el cliente, el repartidor y sus roles de cada pedido.
+    El cliente viaja en el mismo SELECT (JOIN) y los repartidores, que son
+    pocos y se repiten, se traen con un único SELECT ... IN.
+    """
+    return (
+        joinedload(Pedido.usuario).joinedload(Usuario.rol),
+        selectinload(Pedido.repartidor).joinedload(Usuario.rol),
+    )
+
+
+def con_relaciones_pedido(query):
+    """Aplica las opciones de carga de listados a una consulta de pedidos"""
+    return query.options(*opciones_pedido_lista())
+
+
+def opciones_pedido_detalle():
+    """
+    Carga un pedido con su cliente y repartidor (JOIN) y todas sus líneas con
+    producto y categoría en un SELECT ... IN: dos consultas sin importar
+    cuántas líneas tenga el pedido.
+    """
+    return (
+        joinedload(Pedido.usuario),
+        joinedload(Pedido.repartidor),
+        selectinload(Pedido.detalles).joinedload(PedidoDetalle.producto).joinedload(Producto.categoria),
+    )
+
+
+def con_detalle_pedido(query):
+    """Aplica las opciones de carga de las vistas de detalle a una consulta de pedidos"""
+    return query.options(*opciones_pedido_detalle())
+
+
+def primeras_lineas(ids_pedidos, cantidad=3):
+    """
+    Primeras líneas (cantidad, nombre del producto) de cada pedido, en una
+    consulta con ROW_NUMBER(): el historial muestra unas pocas por pedido y
+    no necesita traer todas las de pedidos grandes.
+    Retorna: {id_pedido: [LineaResumen, ...]}
+    """
+    if not ids_pedidos:
+        return {}
+
+    orden = func.row_number().over(
+        partition_by=PedidoDetalle.id_pedido, order_by=PedidoDetalle.id_detalle
+    ).label('orden')
+    lineas = select(
+        PedidoDetalle.id_pedido, PedidoDetalle.cantidad, Producto.nombre, orden
+    ).join(Producto, Producto.id_producto == PedidoDetalle.id_producto) \
+     .where(PedidoDetalle.id_pedido.in_(ids_pedidos)).subquery()
+
+    filas = db.session.execute(
+        select(lineas.c.id_pedido, lineas.c.cantidad, lineas.c.nombre)
+        .where(lineas.c.orden <= cantidad)
+        .order_by(lineas.c.id_pedido, lineas.c.orden)
+    ).all()
+
+    resultado = defaultdict(list)
+    for id_pedido, cantidad_linea, producto in filas:
+        resultado[id_pedido].append(LineaResumen(cantidad_linea, producto))
+    return dict(resultado)
+
+
+def detalle_pedido_json(id_pedido):
+    """
+    Detalle compacto de un pedido (cabecera, cliente, repartidor y líneas con
+    su producto) leído en una sola consulta de columnas, sin objetos ORM.
+    Retorna: dict listo para jsonify, o None si el pedido no existe
+    """
+    cliente = aliased(Usuario)
+    repartidor = aliased(Usuario)
+
+    filas = db.session.query(
+        Pedido.id_pedido, Pedido.fecha, Pedido.estado, Pedido.es_delivery, Pedido.total,
+        Pedido.id_usuario, Pedido.repartidor_id,
+        cliente.nombre_completo, cliente.email, cliente.telefono, cliente.direccion,
+        repartidor.nombre_completo,
+        PedidoDetalle.id_producto, Producto.nombre, Producto.imagen_url,
+        PedidoDetalle.cantidad, PedidoDetalle.precio_unitario
+    ).join(cliente, Pedido.id_usuario == cliente.id_usuario) \
+     .outerjoin(repartidor, Pedido.repartidor_id == repartidor.id_usuario) \
+     .outerjoin(PedidoDetalle, PedidoDetalle.id_pedido == Pedido.id_pedido) \
+     .outerjoin(Producto, Producto.id_producto == PedidoDetalle.id_producto) \
+     .filter(Pedido.id_pedido == id_pedido) \
+     .order_by(PedidoDetalle.id_detalle).all()
+
+    if not filas:
+        return None
+
+    primera = filas[0]
+    return {
+        'id_pedido': primera[0],
+        'fecha': primera[1].strftime('%d/%m/%Y %H:%M') if primera[1] else None,
+        'estado': primera[2],
+        'es_delivery': bool(primera[3]),
+        'total': float(primera[4] or 0),
+        'id_usuario': primera[5],
+        'repartidor_id': primera[6],
+        'cliente': {
+            'nombre': primera[7],
+            'email': primera[8],
+            'telefono': primera[9],
+            'direccion': primera[10]
+        },
+        'repartidor': primera[11],
+        'lineas': [
+            {
+                'id_producto': fila[12],
+                'producto': fila[13],
+                'imagen_url': fila[14],
+                'cantidad': fila[15],
+                'precio_unitario': float(fila[16]),
+                'subtotal': float(fila[15] * fila[16])
+            }
+            for fila in filas if fila[12] is not None
+        ]
+    }
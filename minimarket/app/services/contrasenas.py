@@ -0,0 +1,153 @@
+"""
+Hash y verificación de contraseñas con bcrypt fuera de los hilos del servidor.
+bcrypt es CPU pura y lenta a propósito: una ráfaga de inicios de sesión
+dejaba a todos los hilos del worker calculando hashes. Aquí el trabajo va a
+un pool de hilos acotado (bcrypt suelta el GIL mientras calcula) y, si ya
+hay demasiadas peticiones esperando, se rechaza en lugar de encolar sin fin.
+
+El costo (work factor) es fijo en la configuración (CONTRASENAS_COSTO), el
+mismo para todos los workers, y nunca baja de CONTRASENAS_COSTO_MINIMO. El
+comando `flask calibrar-contrasenas` sugiere un valor para esta máquina.
+Los hashes guardados con un costo menor se rehacen en el siguiente inicio de
+sesión correcto; los de costo mayor se dejan como están.
+"""
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+
+COSTO_MAXIMO = 16
+
+_costo = 12
+_pool = None
+_cupos = None
+_espera = 5
+_lock = threading.Lock()
+
+
+def costo_de_hash(hash_guardado):
+    """Costo con el que se generó un hash bcrypt ("$2b$12$..." -> 12) o None si no es bcrypt"""
+    partes = (hash_guardado or '').split('$')
+    if len(partes) < 4 or not partes[2].isdigit():
+        return None
+    return int(partes[2])
+
+
+def calibrar_costo(objetivo_ms, minimo=12):
+    """
+    Mayor costo cuyo hash tarda como máximo objetivo_ms. Cada punto de costo
+    duplica el trabajo, así que basta medir el mínimo y extrapolar.
+    """
+    inicio = time.perf_counter()
+    bcrypt.hashpw(b'calibracion', bcrypt.gensalt(minimo))
+    medido_ms = (time.perf_counter() - inicio) * 1000
+
+    if medido_ms <= 0:
+        return minimo
+    extra = math.floor(math.log2(objetivo_ms / medido_ms))
+    return max(minimo, min(COSTO_MAXIMO, minimo + extra))
+
+
+def configurar(app):
+    """Crea el pool y fija el costo de CONTRASENAS_COSTO (nunca menor que CONTRASENAS_COSTO_MINIMO)"""
+    global _costo, _pool, _cupos, _espera
+
+    hilos = app.config.get('CONTRASENAS_HILOS', 2)
+    costo = max(app.config.get('CONTRASENAS_COSTO', 12), app.config.get('CONTRASENAS_COSTO_MINIMO', 12))
+
+    with _lock:
+        _costo = costo
+        _espera = app.config.get('CONTRASENAS_ESPERA', 5)
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='bcrypt')
+            # Calculando + en cola; el resto se rechaza
+            _cupos = threading.BoundedSemaphore(hilos + app.config.get('CONTRASENAS_COLA', 16))
+
+    app.config['CONTRASENAS_COSTO_ACTUAL'] = costo
+
+
+def costo_actual():
+    return _costo
+
+
+def _ejecutar(funcion, *args):
+    """Corre funcion en el pool y espera el resultado; sin pool (scripts) corre aquí mismo"""
+    if _pool is None:
+        return funcion(*args)
+
+    if not _cupos.acquire(timeout=_espera):
+        raise Exception('El servidor está ocupado verificando contraseñas, intenta de nuevo en unos segundos')
+
+    try:
+        futuro = _pool.submit(funcion, *args)
+    except Exception:
+        _cupos.release()
+        raise
+    futuro.add_done_callback(lambda _: _cupos.release())
+    return futuro.result()
+
+
+def hashear_contrasena(contrasena):
+    costo = _costo
+    return _ejecutar(
+        lambda: bcrypt.hashpw(contrasena.encode('utf-8'), bcrypt.gensalt(costo)).decode('utf-8')
+    )
+
+
+def verificar_contrasena(contrasena, hash_guardado):
+    return _ejecutar(bcrypt.checkpw, contrasena.encode('utf-8'), hash_guardado.encode('utf-8'))
+
+
+def necesita_rehash(hash_guardado):
+    """True si el hash se generó con un costo menor al actual (nunca se rehace hacia abajo)"""
+    costo = costo_de_hash(hash_guardado)
+    return costo is not None and costo < _costo
+
+
+def medir_inicios_sesion(concurrencia, total, contrasena='benchmark'):
+    """
+    Verifica total contraseñas desde concurrencia hilos (como peticiones de
+    login simultáneas) a través del pool.
+    Retorna: dict con inicios por segundo y latencias p50/p99 en ms
+    """
+    hash_guardado = hashear_contrasena(contrasena)
+    latencias = []
+    rechazados = 0
+    restantes = total
+    lock = threading.Lock()
+
+    def cliente():
+        nonlocal rechazados, restantes
+        while True:
+            with lock:
+                if restantes <= 0:
+                    return
+                restantes -= 1
+            inicio = time.perf_counter()
+            try:
+                verificar_contrasena(contrasena, hash_guardado)
+            except Exception:
+                with lock:
+                    rechazados += 1
+                continue
+            with lock:
+                latencias.append((time.perf_counter() - inicio) * 1000)
+
+    inicio = time.perf_counter()
+    hilos = [threading.Thread(target=cliente) for _ in range(concurrencia)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.perf_counter() - inicio
+
+    latencias.sort()
+    return {
+        'costo': _costo,
+        'verificados': len(latencias),
+        'rechazados': rechazados,
+        'por_segundo': round(len(latencias) / duracion, 2) if duracion else 0.0,
+        'p50_ms': round(latencias[len(latencias) // 2], 1) if latencias else 0.0,
+        'p99_ms': round(latencias[min(len(latencias) - 1, int(len(latencias) * 0.99))], 1) if latencias else 0.0
+    }
@@ -0,0 +1,83 @@
+"""
+Foto del dashboard de administración en una sola consulta.
+Los conteos salen como subconsultas escalares de una fila, unida con los
+productos recientes (y su categoría), y el resultado se memoriza unos
+segundos: con varios administradores refrescando, la base de datos ve una
+consulta por intervalo y no una por persona.
+"""
+import threading
+import time
+from collections import namedtuple
+from flask import current_app
+from sqlalchemy import case, func, select, true
+from app.models import Categoria, Producto, VentaDiaria, db, get_local_datetime
+from app.services.cache_catalogo import CategoriaCacheada
+
+CANTIDAD_RECIENTES = 5
+
+DashboardSnapshot = namedtuple(
+    'DashboardSnapshot',
+    'total_productos productos_sin_stock categorias_count pedidos_hoy ingresos_hoy productos_recientes'
+)
+
+ProductoReciente = namedtuple('ProductoReciente', 'id_producto nombre precio stock imagen_url categoria')
+
+_snapshot = None
+_vence = 0.0
+# Un solo hilo recalcula; los demás esperan y usan el mismo resultado
+_lock = threading.Lock()
+
+
+def _consultar():
+    hoy = get_local_datetime().date()
+
+    metricas = select(
+        select(func.count(Producto.id_producto)).scalar_subquery().label('total_productos'),
+        select(func.coalesce(func.sum(case((Producto.stock <= 0, 1), else_=0)), 0))
+            .scalar_subquery().label('productos_sin_stock'),
+        select(func.count(Categoria.id_categoria)).scalar_subquery().label('categorias_count'),
+        select(VentaDiaria.pedidos).where(VentaDiaria.fecha == hoy).scalar_subquery().label('pedidos_hoy'),
+        select(VentaDiaria.ingresos).where(VentaDiaria.fecha == hoy).scalar_subquery().label('ingresos_hoy')
+    ).subquery()
+
+    recientes = select(
+        Producto.id_producto, Producto.nombre, Producto.precio, Producto.stock, Producto.imagen_url,
+        Categoria.id_categoria, Categoria.nombre.label('categoria')
+    ).outerjoin(Categoria, Categoria.id_categoria == Producto.id_categoria) \
+     .order_by(Producto.id_producto.desc()).limit(CANTIDAD_RECIENTES).subquery()
+
+    # La fila de métricas siempre llega, aunque no haya productos
+    filas = db.session.execute(
+        select(metricas, recientes)
+        .select_from(metricas.outerjoin(recientes, true()))
+        .order_by(recientes.c.id_producto.desc())
+    ).all()
+
+    primera = filas[0]
+    productos = tuple(
+        ProductoReciente(
+            fila.id_producto, fila.nombre, fila.precio, fila.stock, fila.imagen_url,
+            CategoriaCacheada(fila.id_categoria, fila.categoria)
+        )
+        for fila in filas if fila.id_producto is not None
+    )
+
+    return DashboardSnapshot(
+        primera.total_productos,
+        primera.productos_sin_stock,
+        primera.categorias_count,
+        primera.pedidos_hoy or 0,
+        primera.ingresos_hoy or 0,
+        productos
+    )
+
+
+def obtener_dashboard():
+    """Métricas del dashboard, recalculadas como máximo cada DASHBOARD_TTL segundos"""
+    global _snapshot, _vence
+
+    with _lock:
+        if _snapshot is None or time.monotonic() >= _vence:
+            _snapshot = _consultar()
+            _vence = time.monotonic() + current_app.config.get('DASHBOARD_TTL', 5)
+        return _snapshot
@@ -0,0 +1,99 @@
+"""
+Estadísticas de pedidos calculadas en SQL con un único GROUP BY estado
+"""
+import threading
+import time
+from flask import current_app
+from sqlalchemy import func
+from app.models import Pedido, db
+
+# Clave usada en el diccionario stats para cada estado de pedido
+CLAVES_ESTADO = {
+    'pendiente': 'pendientes',
+    'confirmado': 'confirmados',
+    'en_preparacion': 'en_preparacion',
+    'en_camino': 'en_camino',
+    'entregado': 'entregados',
+    'cancelado': 'cancelados'
+}
+
+# Caché de contadores por estado compartida por el proceso
+_cache_conteos = {'conteos': None, 'expira': 0.0}
+_cache_lock = threading.Lock()
+
+
+def contar_pedidos_por_estado(repartidor_id=None):
+    """
+    Cuenta pedidos agrupados por estado con una sola consulta
+    Retorna: {estado: cantidad}
+    """
+    query = db.session.query(Pedido.estado, func.count(Pedido.id_pedido))
+
+    if repartidor_id is not None:
+        query = query.filter(Pedido.repartidor_id == repartidor_id)
+
+    return {estado: cantidad for estado, cantidad in query.group_by(Pedido.estado).all()}
+
+
+def armar_stats(conteos):
+    """Convierte los conteos por estado al diccionario que usan las plantillas"""
+    stats = {clave: conteos.get(estado, 0) for estado, clave in CLAVES_ESTADO.items()}
+    stats['total'] = sum(conteos.values())
+    return stats
+
+
+def _cache_habilitada():
+    return current_app.config.get('STATS_PEDIDOS_CACHE', True)
+
+
+def obtener_stats_pedidos():
+    """
+    Estadísticas globales de pedidos para el panel de administración.
+    Si la caché está habilitada los contadores se reutilizan hasta que vence
+    su TTL; mientras tanto se mantienen al día con registrar_cambio_estado.
+    """
+    if not _cache_habilitada():
+        return armar_stats(contar_pedidos_por_estado())
+
+    with _cache_lock:
+        if _cache_conteos['conteos'] is not None and time.monotonic() < _cache_conteos['expira']:
+            return armar_stats(_cache_conteos['conteos'])
+
+    conteos = contar_pedidos_por_estado()
+    ttl = current_app.config.get('STATS_PEDIDOS_TTL', 60)
+
+    with _cache_lock:
+        _cache_conteos['conteos'] = conteos
+        _cache_conteos['expira'] = time.monotonic() + ttl
+
+    return armar_stats(conteos)
+
+
+def obtener_stats_repartidor(repartidor_id):
+    """Estadísticas de los pedidos asignados a un repartidor"""
+    return armar_stats(contar_pedidos_por_estado(repartidor_id))
+
+
+def registrar_cambio_estado(estado_anterior, estado_nuevo):
+    """
+    Actualiza los contadores en caché después de un commit.
+    estado_anterior es None para pedidos recién creados.
+    """
+    if estado_anterior == estado_nuevo:
+        return
+
+    with _cache_lock:
+        conteos = _cache_conteos['conteos']
+        if conteos is None:
+            return
+
+        if estado_anterior is not None:
+            conteos[estado_anterior] = max(conteos.get(estado_anterior, 0) - 1, 0)
+        conteos[estado_nuevo] = conteos.get(estado_nuevo, 0) + 1
+
+
+def invalidar_stats_pedidos():
+    """Descarta los contadores en caché; se recalculan en la próxima lectura"""
+    with _cache_lock:
+        _cache_conteos['conteos'] = None
+        _cache_conteos['expira'] = 0.0
@@ -0,0 +1,240 @@
+"""
+Eventos de pedidos en vivo.
+Cada creación o cambio de estado se guarda en la tabla eventos_pedidos, en la
+misma transacción que el cambio, así lo ve cualquier worker. Las páginas
+leen los eventos nuevos por id creciente y solo los que el usuario puede
+ver: administradores (todos), el repartidor asignado (o el anterior) y el
+cliente dueño del pedido.
+
+Por defecto las páginas consultan /pedidos/eventos/recientes cada pocos
+segundos: peticiones cortas que funcionan con workers síncronos. Con
+EVENTOS_SSE activo usan un stream SSE; cada proceso tiene un solo hilo que
+lee la tabla y reparte los eventos a sus conexiones por un bus en memoria
+con colas acotadas (un cliente lento que llena la suya se reconecta
+pidiendo los eventos perdidos con Last-Event-ID).
+"""
+import json
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from sqlalchemy import func, or_
+from app.models import EventoPedido, db, get_local_datetime
+
+ROL_ADMIN = 'admin'
+ROL_REPARTIDOR = 'repartidor'
+ROL_CLIENTE = 'cliente'
+
+
+def publicar_pedido(tipo, id_pedido, id_usuario, estado, repartidor_id=None,
+                    estado_anterior=None, repartidor_anterior=None):
+    """Registra un evento de pedido (llamar antes del commit del cambio)"""
+    db.session.add(EventoPedido(
+        tipo=tipo,
+        id_pedido=id_pedido,
+        id_usuario=id_usuario,
+        estado=estado,
+        estado_anterior=estado_anterior,
+        repartidor_id=repartidor_id,
+        repartidor_anterior=repartidor_anterior
+    ))
+
+
+def _a_dict(evento):
+    return {
+        'id': evento.id_evento,
+        'tipo': evento.tipo,
+        'id_pedido': evento.id_pedido,
+        'id_usuario': evento.id_usuario,
+        'estado': evento.estado,
+        'estado_anterior': evento.estado_anterior,
+        'repartidor_id': evento.repartidor_id,
+        'repartidor_anterior': evento.repartidor_anterior
+    }
+
+
+def ultimo_evento():
+    """Id del último evento registrado (0 si no hay ninguno)"""
+    return db.session.query(func.coalesce(func.max(EventoPedido.id_evento), 0)).scalar()
+
+
+def eventos_desde(desde, id_usuario=None, rol=ROL_ADMIN, limite=200):
+    """
+    Eventos con id mayor a desde que el usuario puede ver, en orden
+    Retorna: lista de dicts o None si hay más de limite (conviene recargar)
+    """
+    consulta = EventoPedido.query.filter(EventoPedido.id_evento > desde)
+    if rol == ROL_REPARTIDOR:
+        consulta = consulta.filter(or_(EventoPedido.repartidor_id == id_usuario,
+                                       EventoPedido.repartidor_anterior == id_usuario))
+    elif rol != ROL_ADMIN:
+        consulta = consulta.filter(EventoPedido.id_usuario == id_usuario)
+
+    eventos = consulta.order_by(EventoPedido.id_evento).limit(limite + 1).all()
+    if len(eventos) > limite:
+        return None
+    return [_a_dict(evento) for evento in eventos]
+
+
+def limpiar_eventos(dias):
+    """Borra los eventos de más de dias días (las páginas ya no los piden)"""
+    limite = get_local_datetime() - timedelta(days=dias)
+    eliminados = EventoPedido.query.filter(EventoPedido.fecha < limite).delete(synchronize_session=False)
+    db.session.commit()
+    return eliminados
+
+
+# Stream SSE (EVENTOS_SSE)
+
+class Suscripcion:
+    """Conexión SSE abierta de un usuario"""
+
+    def __init__(self, id_usuario, rol, capacidad):
+        self.id_usuario = id_usuario
+        self.rol = rol
+        self.cola = queue.Queue(maxsize=capacidad)
+        # Se marca si la cola se llenó: el stream se cierra y el cliente se reconecta
+        self.desbordada = False
+
+    def puede_ver(self, evento):
+        if self.rol == ROL_ADMIN:
+            return True
+        if self.rol == ROL_REPARTIDOR:
+            return self.id_usuario in (evento['repartidor_id'], evento['repartidor_anterior'])
+        return self.id_usuario == evento['id_usuario']
+
+
+class BusEventos:
+    """Reparte los eventos leídos de la tabla a las conexiones SSE de este proceso"""
+
+    def __init__(self, capacidad=100):
+        self.capacidad = capacidad
+        self._lock = threading.Lock()
+        self._admins = set()
+        self._por_usuario = defaultdict(set)
+        self.publicados = 0
+        self.descartados = 0
+
+    def suscribir(self, id_usuario, rol):
+        suscripcion = Suscripcion(id_usuario, rol, self.capacidad)
+        with self._lock:
+            if rol == ROL_ADMIN:
+                self._admins.add(suscripcion)
+            else:
+                self._por_usuario[id_usuario].add(suscripcion)
+        return suscripcion
+
+    def desuscribir(self, suscripcion):
+        with self._lock:
+            if suscripcion.rol == ROL_ADMIN:
+                self._admins.discard(suscripcion)
+            else:
+                conexiones = self._por_usuario.get(suscripcion.id_usuario)
+                if conexiones is not None:
+                    conexiones.discard(suscripcion)
+                    if not conexiones:
+                        del self._por_usuario[suscripcion.id_usuario]
+
+    def publicar(self, evento):
+        """Encola (sin bloquear) el evento en cada suscripción que lo puede ver"""
+        with self._lock:
+            self.publicados += 1
+            destinos = set(self._admins)
+            for id_usuario in {evento['id_usuario'], evento['repartidor_id'], evento['repartidor_anterior']}:
+                if id_usuario is not None:
+                    destinos.update(self._por_usuario.get(id_usuario, ()))
+
+        for suscripcion in destinos:
+            if not suscripcion.puede_ver(evento):
+                continue
+            try:
+                suscripcion.cola.put_nowait(evento)
+            except queue.Full:
+                suscripcion.desbordada = True
+                with self._lock:
+                    self.descartados += 1
+
+    def metricas(self):
+        with self._lock:
+            return {
+                'conexiones_admin': len(self._admins),
+                'conexiones_usuarios': sum(len(c) for c in self._por_usuario.values()),
+                'publicados': self.publicados,
+                'descartados': self.descartados
+            }
+
+
+bus_pedidos = BusEventos()
+_sondeo = None
+_lock_sondeo = threading.Lock()
+
+
+def _sondear(app, intervalo):
+    """Hilo del proceso: lee los eventos nuevos de la tabla y los reparte en el bus"""
+    with app.app_context():
+        ultimo = ultimo_evento()
+        db.session.remove()
+
+    while True:
+        time.sleep(intervalo)
+        try:
+            with app.app_context():
+                nuevos = eventos_desde(ultimo, limite=1000) or []
+                db.session.remove()
+        except Exception as e:
+            print(f"Error leyendo eventos de pedidos: {e}")
+            continue
+
+        for evento in nuevos:
+            bus_pedidos.publicar(evento)
+            ultimo = evento['id']
+
+
+def iniciar_sondeo(app):
+    """Arranca (una vez por proceso) el hilo que alimenta el bus SSE"""
+    global _sondeo
+    with _lock_sondeo:
+        if _sondeo is None:
+            _sondeo = threading.Thread(
+                target=_sondear, args=(app, app.config.get('EVENTOS_SONDEO', 1)),
+                name='eventos-pedidos', daemon=True
+            )
+            _sondeo.start()
+
+
+def _formatear(evento, nombre='pedido'):
+    return f"id: {evento['id']}\nevent: {nombre}\ndata: {json.dumps(evento)}\n\n"
+
+
+def generar_eventos(suscripcion, pendientes, latido):
+    """
+    Cuerpo del stream SSE. No usa la app ni la base de datos, así la
+    conexión no retiene una conexión del pool mientras está abierta.
+    pendientes: eventos perdidos desde Last-Event-ID (None: demasiados, recargar)
+    """
+    try:
+        yield 'retry: 3000\n\n'
+
+        if pendientes is None:
+            yield 'event: recargar\ndata: {}\n\n'
+            return
+
+        ultimo = 0
+        for evento in pendientes:
+            yield _formatear(evento)
+            ultimo = evento['id']
+
+        while not suscripcion.desbordada:
+            try:
+                evento = suscripcion.cola.get(timeout=latido)
+            except queue.Empty:
+                # Comentario SSE: mantiene viva la conexión a través de proxies
+                yield ': latido\n\n'
+                continue
+            # Puede llegar también por pendientes (se suscribió antes de leerlos)
+            if evento['id'] > ultimo:
+                yield _formatear(evento)
+                ultimo = evento['id']
+    finally:
+        bus_pedidos.desuscribir(suscripcion)
@@ -0,0 +1,136 @@
+"""
+Exportación de pedidos en CSV y JSON Lines sin cargarlos en memoria.
+Las filas se leen por lotes (yield_per, cursor del lado del servidor donde
+el driver lo permite) como tuplas de columnas, no como objetos ORM, y se
+escriben a la respuesta a medida que llegan.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy.orm import aliased
+from app.models import Pedido, PedidoDetalle, Producto, Usuario, db
+
+# Filas que se piden a la base de datos por vuelta
+TAMANO_LOTE = 1000
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8'
+}
+
+COLUMNAS_PEDIDOS = [
+    'id_pedido', 'fecha', 'estado', 'es_delivery', 'total',
+    'id_cliente', 'cliente', 'email_cliente', 'repartidor'
+]
+
+COLUMNAS_DETALLES = [
+    'id_pedido', 'fecha', 'estado', 'id_cliente', 'cliente',
+    'id_producto', 'producto', 'cantidad', 'precio_unitario', 'subtotal'
+]
+
+
+def filas_pedidos(condiciones):
+    """Tuplas con las COLUMNAS_PEDIDOS de los pedidos que cumplen las condiciones"""
+    cliente = aliased(Usuario)
+    repartidor = aliased(Usuario)
+
+    consulta = (
+        db.session.query(
+            Pedido.id_pedido, Pedido.fecha, Pedido.estado, Pedido.es_delivery, Pedido.total,
+            cliente.id_usuario, cliente.nombre_completo, cliente.email,
+            repartidor.nombre_completo
+        )
+        .join(cliente, Pedido.id_usuario == cliente.id_usuario)
+        .outerjoin(repartidor, Pedido.repartidor_id == repartidor.id_usuario)
+        .filter(*condiciones)
+        .order_by(Pedido.id_pedido.desc())
+    )
+    return consulta.yield_per(TAMANO_LOTE)
+
+
+def filas_detalles(condiciones):
+    """Tuplas con las COLUMNAS_DETALLES de las líneas de los pedidos filtrados"""
+    cliente = aliased(Usuario)
+
+    consulta = (
+        db.session.query(
+            Pedido.id_pedido, Pedido.fecha, Pedido.estado,
+            cliente.id_usuario, cliente.nombre_completo,
+            Producto.id_producto, Producto.nombre,
+            PedidoDetalle.cantidad, PedidoDetalle.precio_unitario,
+            PedidoDetalle.cantidad * PedidoDetalle.precio_unitario
+        )
+        .select_from(PedidoDetalle)
+        .join(Pedido, PedidoDetalle.id_pedido == Pedido.id_pedido)
+        .join(cliente, Pedido.id_usuario == cliente.id_usuario)
+        .join(Producto, PedidoDetalle.id_producto == Producto.id_producto)
+        .filter(*condiciones)
+        .order_by(Pedido.id_pedido.desc(), PedidoDetalle.id_detalle)
+    )
+    return consulta.yield_per(TAMANO_LOTE)
+
+
+def _valor(valor):
+    """Convierte fechas y decimales a texto estable para CSV/JSON"""
+    if isinstance(valor, datetime):
+        return valor.isoformat(sep=' ', timespec='seconds')
+    if isinstance(valor, Decimal):
+        return str(valor)
+    return valor
+
+
+# Excel interpreta como fórmula una celda que empieza con estos caracteres
+INICIO_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _celda_csv(valor):
+    """
+    Valor para CSV; el texto que ingresan los usuarios (nombres, direcciones)
+    y empieza como fórmula se prefija con ' para que Excel lo muestre tal cual
+    """
+    if isinstance(valor, str) and valor.startswith(INICIO_FORMULA):
+        return "'" + valor
+    return _valor(valor)
+
+
+def generar_csv(columnas, filas):
+    """
+    Genera el CSV por bloques de TAMANO_LOTE filas. Empieza con BOM para que
+    Excel reconozca UTF-8 (tildes y ñ en los nombres).
+    """
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+
+    buffer.write('\ufeff')
+    escritor.writerow(columnas)
+
+    for numero, fila in enumerate(filas, start=1):
+        escritor.writerow([_celda_csv(valor) for valor in fila])
+        if numero % TAMANO_LOTE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+def generar_jsonl(columnas, filas):
+    """Genera un objeto JSON por línea, agrupando TAMANO_LOTE líneas por bloque"""
+    bloque = []
+    for fila in filas:
+        registro = dict(zip(columnas, (_valor(valor) for valor in fila)))
+        bloque.append(json.dumps(registro, ensure_ascii=False))
+        if len(bloque) >= TAMANO_LOTE:
+            yield '\n'.join(bloque) + '\n'
+            bloque = []
+
+    if bloque:
+        yield '\n'.join(bloque) + '\n'
+
+
+def generar_exportacion(formato, columnas, filas):
+    if formato == 'jsonl':
+        return generar_jsonl(columnas, filas)
+    return generar_csv(columnas, filas)
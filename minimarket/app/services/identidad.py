@@ -0,0 +1,60 @@
+"""
+Caché corta de identidad para el user_loader de Flask-Login.
+Guarda los datos del usuario y de su rol por id y, en cada petición, los
+adjunta a la sesión con merge(load=False), sin ir a la base de datos.
+"""
+import threading
+import time
+from flask import current_app
+from sqlalchemy.orm.attributes import set_committed_value
+from app.models import Usuario, Rol
+from app.services.procedimientos import adjuntar, columnas, hidratar
+
+_identidades = {}
+_lock = threading.Lock()
+
+
+def _recordar(usuario):
+    ttl = current_app.config.get('IDENTIDAD_CACHE_TTL', 30)
+    with _lock:
+        _identidades[usuario.id_usuario] = (time.monotonic() + ttl, columnas(usuario), columnas(usuario.rol))
+
+
+def cargar_usuario(id_usuario):
+    """Usuario con su rol: desde la caché o con un solo SELECT con JOIN"""
+    ahora = time.monotonic()
+
+    with _lock:
+        entrada = _identidades.get(id_usuario)
+
+    if entrada is not None and entrada[0] > ahora:
+        _, datos_usuario, datos_rol = entrada
+        usuario = adjuntar(Usuario, datos_usuario)
+        # Se asigna como valor ya cargado (sin historial): usuario.rol no consulta
+        set_committed_value(usuario, 'rol', adjuntar(Rol, datos_rol))
+        return usuario
+
+    # Usuario.rol usa lazy='joined': el rol llega en la misma consulta
+    usuario = Usuario.query.get(id_usuario)
+    if usuario is None:
+        return None
+
+    _recordar(usuario)
+    return usuario
+
+
+def usuario_desde_sp(fila):
+    """
+    Usuario con su rol armado desde la fila de sp_autenticar, sin otra
+    consulta. Queda en la caché, así la petición siguiente tampoco consulta.
+    """
+    usuario = hidratar(Usuario, fila)
+    set_committed_value(usuario, 'rol', hidratar(Rol, fila, nombre='nombre_rol'))
+    _recordar(usuario)
+    return usuario
+
+
+def invalidar_identidad(id_usuario):
+    """Descarta la identidad en caché después de modificar al usuario"""
+    with _lock:
+        _identidades.pop(id_usuario, None)
@@ -0,0 +1,74 @@
+"""
+Validación y optimización de las imágenes subidas por el administrador.
+Las usan el formulario de productos (validación inmediata) y las tareas de
+imágenes en segundo plano.
+"""
+import io
+from PIL import Image
+from werkzeug.utils import secure_filename
+
+# Configuración de formatos de imagen permitidos
+ALLOWED_IMAGE_EXTENSIONS = {
+    'jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp', 'avif', 'tiff', 'tif', 'ico'
+}
+
+
+def validar_archivo_imagen(archivo):
+    """
+    Valida si el archivo es una imagen válida
+    Retorna: (es_valido, mensaje_error)
+    """
+    if not archivo or not archivo.filename:
+        return False, "No se seleccionó ningún archivo"
+    
+    # Verificar extensión
+    filename = secure_filename(archivo.filename.lower())
+    if '.' not in filename:
+        return False, "El archivo debe tener una extensión válida"
+    
+    extension = filename.rsplit('.', 1)[1]
+    if extension not in ALLOWED_IMAGE_EXTENSIONS:
+        formatos_permitidos = ', '.join(sorted(ALLOWED_IMAGE_EXTENSIONS))
+        return False, f"❌ Formato de imagen no permitido. Por favor, use uno de estos formatos: {formatos_permitidos.upper()}"
+    
+    # Verificar que sea una imagen real usando PIL
+    try:
+        archivo.seek(0)  # Volver al inicio del archivo
+        imagen = Image.open(archivo)
+        imagen.verify()  # Verificar que sea una imagen válida
+        archivo.seek(0)  # Volver al inicio para uso posterior
+        return True, "✅ Archivo de imagen válido"
+    except Exception as e:
+        return False, f"❌ El archivo no es una imagen válida o está corrupto. Error: {str(e)}"
+
+
+def optimizar_imagen(archivo, max_width=1200, max_height=1200, quality=85):
+    """
+    Optimiza la imagen redimensionándola y comprimiéndola
+    """
+    try:
+        archivo.seek(0)
+        imagen = Image.open(archivo)
+        
+        # Convertir a RGB si es necesario (para JPEG)
+        if imagen.mode in ('RGBA', 'LA', 'P'):
+            rgb_imagen = Image.new('RGB', imagen.size, (255, 255, 255))
+            if imagen.mode == 'P':
+                imagen = imagen.convert('RGBA')
+            rgb_imagen.paste(imagen, mask=imagen.split()[-1] if imagen.mode == 'RGBA' else None)
+            imagen = rgb_imagen
+        
+        # Redimensionar si es necesario
+        if imagen.width > max_width or imagen.height > max_height:
+            imagen.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
+        
+        # Guardar en memoria como JPEG optimizado
+        output = io.BytesIO()
+        imagen.save(output, format='JPEG', quality=quality, optimize=True)
+        output.seek(0)
+        
+        return output
+    except Exception as e:
+        print(f"Error al optimizar imagen: {e}")
+        archivo.seek(0)
+        return archivo
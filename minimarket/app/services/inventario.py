@@ -0,0 +1,64 @@
+"""
+Movimientos de stock atómicos: el descuento se hace en la base de datos con
+un UPDATE condicional, nunca leyendo el stock en Python y escribiéndolo luego
+"""
+from sqlalchemy import case, update
+from app.models import Producto, db
+
+
+class StockInsuficiente(Exception):
+    """Alguna línea pide más unidades de las que quedan"""
+
+    def __init__(self, nombres):
+        self.nombres = nombres
+        super().__init__(f'Stock insuficiente para {", ".join(nombres)}')
+
+
+def cantidades_por_producto(lineas):
+    """Agrupa las líneas de un carrito hidratado en {id_producto: cantidad}"""
+    cantidades = {}
+    for linea in lineas:
+        producto_id = linea['producto'].id_producto
+        cantidades[producto_id] = cantidades.get(producto_id, 0) + linea['cantidad']
+    return cantidades
+
+
+def reservar_stock(cantidades):
+    """
+    Descuenta el stock de todos los productos en una sola sentencia:
+        UPDATE productos SET stock = stock - CASE id_producto WHEN ... END
+        WHERE id_producto IN (...) AND stock >= CASE id_producto WHEN ... END
+    Si alguna fila no cumple la condición se revierte la transacción y se
+    lanza StockInsuficiente, por lo que debe llamarse antes de escribir nada más.
+    """
+    if not cantidades:
+        return
+
+    cantidad_por_id = case(cantidades, value=Producto.id_producto)
+    resultado = db.session.execute(
+        update(Producto)
+        .where(Producto.id_producto.in_(cantidades.keys()), Producto.stock >= cantidad_por_id)
+        .values(stock=Producto.stock - cantidad_por_id)
+        .execution_options(synchronize_session=False)
+    )
+
+    if resultado.rowcount != len(cantidades):
+        db.session.rollback()
+        faltantes = db.session.query(Producto.nombre).filter(
+            Producto.id_producto.in_(cantidades.keys()),
+            Producto.stock < case(cantidades, value=Producto.id_producto)
+        ).all()
+        raise StockInsuficiente([nombre for (nombre,) in faltantes] or ['el pedido'])
+
+
+def liberar_stock(cantidades):
+    """Devuelve unidades al stock (cancelaciones) con un UPDATE atómico"""
+    if not cantidades:
+        return
+
+    db.session.execute(
+        update(Producto)
+        .where(Producto.id_producto.in_(cantidades.keys()))
+        .values(stock=Producto.stock + case(cantidades, value=Producto.id_producto))
+        .execution_options(synchronize_session=False)
+    )
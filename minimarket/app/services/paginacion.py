@@ -0,0 +1,129 @@
+"""
+Paginación por cursor (keyset) sobre la clave primaria.
+Cada página filtra con WHERE id < cursor / id > cursor y LIMIT, de modo que
+la página 500 cuesta lo mismo que la primera (no hay OFFSET).
+"""
+import base64
+from flask import current_app, request, url_for
+
+DIRECCION_SIGUIENTE = 's'
+DIRECCION_ANTERIOR = 'a'
+
+
+def codificar_cursor(direccion, valor):
+    """Genera un token opaco y apto para URL a partir de la dirección y el id"""
+    crudo = f'{direccion}:{valor}'.encode('utf-8')
+    return base64.urlsafe_b64encode(crudo).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(token):
+    """
+    Decodifica un token de cursor
+    Retorna: (direccion, valor) o (None, None) si el token no es válido
+    """
+    if not token:
+        return None, None
+
+    try:
+        relleno = '=' * (-len(token) % 4)
+        direccion, valor = base64.urlsafe_b64decode(token + relleno).decode('utf-8').split(':', 1)
+        if direccion not in (DIRECCION_SIGUIENTE, DIRECCION_ANTERIOR):
+            return None, None
+        return direccion, int(valor)
+    except (ValueError, UnicodeDecodeError):
+        return None, None
+
+
+def obtener_por_pagina(valor=None):
+    """Tamaño de página solicitado, acotado al máximo configurado"""
+    por_defecto = current_app.config.get('PAGINACION_POR_PAGINA', 20)
+    maximo = current_app.config.get('PAGINACION_MAXIMO', 100)
+
+    if valor is None:
+        valor = request.args.get('por_pagina', type=int)
+
+    if not valor or valor < 1:
+        return por_defecto
+
+    return min(valor, maximo)
+
+
+class PaginaKeyset:
+    """Resultado de una página: elementos y tokens hacia la página vecina"""
+
+    def __init__(self, items, por_pagina, siguiente=None, anterior=None):
+        self.items = items
+        self.por_pagina = por_pagina
+        self.siguiente = siguiente
+        self.anterior = anterior
+
+    @property
+    def hay_siguiente(self):
+        return self.siguiente is not None
+
+    @property
+    def hay_anterior(self):
+        return self.anterior is not None
+
+    def url_para(self, cursor):
+        """URL de la vista actual conservando sus filtros y cambiando el cursor"""
+        argumentos = request.args.to_dict()
+        argumentos.update(request.view_args or {})
+        argumentos['cursor'] = cursor
+        return url_for(request.endpoint, **argumentos)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def paginar_keyset(query, columna, cursor=None, por_pagina=None, descendente=True):
+    """
+    Pagina una consulta por una columna única y ordenable (la clave primaria).
+    La consulta no debe traer ORDER BY propio: el orden lo fija la columna.
+    """
+    por_pagina = obtener_por_pagina(por_pagina)
+    if cursor is None:
+        cursor = request.args.get('cursor')
+    direccion, valor = decodificar_cursor(cursor)
+
+    # "Hacia adelante" es el orden de la lista; "hacia atrás" se recorre al revés
+    hacia_atras = direccion == DIRECCION_ANTERIOR
+    ascendente = descendente == hacia_atras
+
+    if valor is not None:
+        if ascendente:
+            query = query.filter(columna > valor)
+        else:
+            query = query.filter(columna < valor)
+
+    query = query.order_by(columna.asc() if ascendente else columna.desc())
+
+    # Se pide una fila extra para saber si hay más páginas sin hacer COUNT
+    filas = query.limit(por_pagina + 1).all()
+    hay_mas = len(filas) > por_pagina
+    filas = filas[:por_pagina]
+
+    if hacia_atras:
+        filas.reverse()
+
+    if not filas:
+        return PaginaKeyset(filas, por_pagina)
+
+    clave = columna.key
+    primero = getattr(filas[0], clave)
+    ultimo = getattr(filas[-1], clave)
+
+    if hacia_atras:
+        hay_siguiente, hay_anterior = True, hay_mas
+    else:
+        hay_siguiente, hay_anterior = hay_mas, valor is not None
+
+    return PaginaKeyset(
+        filas,
+        por_pagina,
+        siguiente=codificar_cursor(DIRECCION_SIGUIENTE, ultimo) if hay_siguiente else None,
+        anterior=codificar_cursor(DIRECCION_ANTERIOR, primero) if hay_anterior else None
+    )
@@ -0,0 +1,110 @@
+"""
+Métricas del pool de conexiones a la base de datos.
+PoolMedido es el QueuePool de siempre, pero mide cuánto espera cada petición
+por una conexión y cuenta las que se atienden con conexiones de overflow
+(por encima de pool_size). Con eso se dimensiona el pool para la cantidad
+de workers de gunicorn: esperas largas o mucho overflow piden más
+conexiones; un pool casi vacío permite reducirlo. Las métricas son por
+proceso (cada worker tiene su propio pool).
+"""
+import os
+import threading
+import time
+from collections import deque
+from sqlalchemy.exc import TimeoutError as TimeoutPool
+from sqlalchemy.pool import QueuePool
+
+
+class MedicionPool:
+    """Contadores de checkout de un pool (se conservan si el pool se recrea)"""
+
+    def __init__(self, muestras=1000):
+        self._lock = threading.Lock()
+        self._esperas = deque(maxlen=muestras)
+        self.checkouts = 0
+        self.espera_total_ms = 0.0
+        self.espera_maxima_ms = 0.0
+        self.timeouts = 0
+        self.checkouts_overflow = 0
+        self.en_uso_maximo = 0
+        self.overflow_maximo = 0
+
+    def registrar(self, espera_ms, en_uso, overflow):
+        with self._lock:
+            self.checkouts += 1
+            self.espera_total_ms += espera_ms
+            self.espera_maxima_ms = max(self.espera_maxima_ms, espera_ms)
+            self._esperas.append(espera_ms)
+            self.en_uso_maximo = max(self.en_uso_maximo, en_uso)
+            if overflow > 0:
+                self.checkouts_overflow += 1
+                self.overflow_maximo = max(self.overflow_maximo, overflow)
+
+    def registrar_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def resumen(self):
+        with self._lock:
+            esperas = sorted(self._esperas)
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'checkouts_overflow': self.checkouts_overflow,
+                'en_uso_maximo': self.en_uso_maximo,
+                'overflow_maximo': self.overflow_maximo,
+                'espera_promedio_ms': round(self.espera_total_ms / self.checkouts, 2) if self.checkouts else 0.0,
+                'espera_p50_ms': round(esperas[len(esperas) // 2], 2) if esperas else 0.0,
+                'espera_p99_ms': round(esperas[min(len(esperas) - 1, int(len(esperas) * 0.99))], 2) if esperas else 0.0,
+                'espera_maxima_ms': round(self.espera_maxima_ms, 2)
+            }
+
+
+class PoolMedido(QueuePool):
+    """QueuePool que registra la espera de cada checkout (incluye el pre-ping si está activo)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.medicion = MedicionPool()
+
+    def connect(self):
+        inicio = time.perf_counter()
+        try:
+            conexion = super().connect()
+        except TimeoutPool:
+            self.medicion.registrar_timeout()
+            raise
+        self.medicion.registrar((time.perf_counter() - inicio) * 1000, self.checkedout(), self.overflow())
+        return conexion
+
+    def recreate(self):
+        # engine.dispose() crea un pool nuevo: los contadores siguen
+        nuevo = super().recreate()
+        nuevo.medicion = self.medicion
+        return nuevo
+
+
+def configurar_pool(app):
+    """Usa PoolMedido en los perfiles con pool dimensionado (llamar antes de db.init_app)"""
+    opciones = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+    if 'pool_size' in opciones:
+        opciones.setdefault('poolclass', PoolMedido)
+
+
+def metricas_pool(motor, perfil=None):
+    """Estado actual del pool del motor y, si es PoolMedido, sus esperas y overflow"""
+    pool = motor.pool
+    datos = {'perfil': perfil, 'proceso': os.getpid(), 'pool': type(pool).__name__}
+
+    if isinstance(pool, QueuePool):
+        datos.update({
+            'tamano': pool.size(),
+            'en_uso': pool.checkedout(),
+            'libres': pool.checkedin(),
+            # Negativo mientras no se hayan abierto pool_size conexiones
+            'overflow': pool.overflow(),
+            'timeout_s': pool.timeout()
+        })
+    if isinstance(pool, PoolMedido):
+        datos.update(pool.medicion.resumen())
+    return datos
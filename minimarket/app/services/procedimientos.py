@@ -0,0 +1,43 @@
+"""
+Llamadas a procedimientos almacenados y armado de modelos con su resultado.
+ejecutar_sp() arma el EXEC con parámetros nombrados; hidratar() convierte una
+fila del resultado en una instancia del modelo ya unida a la sesión, así los
+datos que el procedimiento ya devolvió no se vuelven a pedir a la tabla.
+"""
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import make_transient_to_detached
+from app.models import db
+
+
+def ejecutar_sp(nombre, **parametros):
+    """EXEC nombre @p1 = :p1, ... en la sesión actual (misma transacción)"""
+    asignaciones = ', '.join(f'@{parametro} = :{parametro}' for parametro in parametros)
+    return db.session.execute(text(f'EXEC {nombre} {asignaciones}'), parametros)
+
+
+def columnas(instancia):
+    """Valores de las columnas de una instancia, por nombre de atributo"""
+    return {attr.key: getattr(instancia, attr.key) for attr in inspect(type(instancia)).column_attrs}
+
+
+def adjuntar(modelo, datos):
+    """Crea una instancia 'ya cargada' y la une a la sesión sin consultar"""
+    instancia = modelo(**datos)
+    make_transient_to_detached(instancia)
+    return db.session.merge(instancia, load=False)
+
+
+def hidratar(modelo, fila, **renombres):
+    """
+    Instancia del modelo desde una fila de resultado que trae todas sus columnas
+    renombres: atributo del modelo = nombre de la columna en la fila
+    """
+    valores = fila._mapping if hasattr(fila, '_mapping') else fila
+    datos = {}
+    for attr in inspect(modelo).column_attrs:
+        origen = renombres.get(attr.key, attr.key)
+        if origen not in valores:
+            # Sin todas las columnas, el atributo faltante se consultaría después
+            raise Exception(f'El resultado no trae la columna {origen} de {modelo.__name__}')
+        datos[attr.key] = valores[origen]
+    return adjuntar(modelo, datos)
@@ -0,0 +1,164 @@
+"""
+Subida de imágenes de productos en segundo plano.
+La petición del administrador guarda el producto y encola la imagen; un pool
+de hilos la valida, genera sus variantes (en el pool de procesos), las guarda
+en el almacén de imágenes y completa imagen_url y las variantes del producto.
+Una imagen idéntica a otra ya procesada reutiliza sus variantes.
+
+El estado de cada tarea vive en la tabla tareas_imagen, así cualquier worker
+responde la consulta de estado aunque la imagen se procese en otro.
+"""
+import io
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from flask import current_app
+from werkzeug.datastructures import FileStorage
+from app.models import Producto, ProductoImagen, TareaImagen, db, get_local_datetime
+from app.services.imagenes import validar_archivo_imagen
+
+ESTADO_PENDIENTE = 'pendiente'
+ESTADO_PROCESANDO = 'procesando'
+ESTADO_COMPLETADA = 'completada'
+ESTADO_ERROR = 'error'
+ESTADOS_EN_CURSO = (ESTADO_PENDIENTE, ESTADO_PROCESANDO)
+
+# Horas que se conservan las tareas para consultar su estado
+HORAS_TAREAS_GUARDADAS = 24
+# Una tarea en curso sin cambios en este tiempo se interrumpió (el worker se reinició)
+MINUTOS_TAREA_VENCIDA = 10
+
+_lock = threading.Lock()
+_executor = None
+
+
+def _obtener_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=current_app.config.get('IMAGENES_WORKERS', 2),
+                thread_name_prefix='imagenes'
+            )
+        return _executor
+
+
+def _actualizar(id_tarea, **cambios):
+    """Guarda el nuevo estado (y cualquier cambio pendiente de la sesión) con un commit"""
+    TareaImagen.query.filter_by(id_tarea=id_tarea).update(cambios, synchronize_session=False)
+    db.session.commit()
+
+
+def _limite_vencidas():
+    return get_local_datetime() - timedelta(minutes=MINUTOS_TAREA_VENCIDA)
+
+
+def encolar_imagen_producto(id_producto, archivo):
+    """
+    Lee el archivo subido (el stream se cierra al terminar la petición) y
+    encola su procesamiento
+    Retorna: id de la tarea para consultar su estado
+    """
+    archivo.seek(0)
+    contenido = archivo.read()
+    id_tarea = uuid.uuid4().hex
+
+    limite = get_local_datetime() - timedelta(hours=HORAS_TAREAS_GUARDADAS)
+    TareaImagen.query.filter(TareaImagen.actualizado < limite).delete(synchronize_session=False)
+    db.session.add(TareaImagen(id_tarea=id_tarea, id_producto=id_producto,
+                               estado=ESTADO_PENDIENTE, mensaje='Imagen en cola'))
+    # Commit antes de encolar: el hilo del pool debe encontrar la tarea
+    db.session.commit()
+
+    app = current_app._get_current_object()
+    _obtener_executor().submit(
+        _procesar, app, id_tarea, id_producto, contenido, archivo.filename, archivo.mimetype
+    )
+    return id_tarea
+
+
+def _procesar(app, id_tarea, id_producto, contenido, filename, mimetype):
+    """Trabajo del pool: subir la imagen y guardar la URL en el producto"""
+    from app.services.almacen_imagenes import calcular_hash, guardar_imagen, variantes_existentes
+    from app.services.cache_catalogo import invalidar_productos
+    from app.services.variantes_imagen import generar_variantes_en_pool
+
+    with app.app_context():
+        try:
+            _actualizar(id_tarea, estado=ESTADO_PROCESANDO, mensaje='Procesando imagen')
+            hash_original = calcular_hash(contenido)
+            guardadas = variantes_existentes(hash_original)
+            mensaje = 'Imagen reutilizada (ya se había procesado antes)'
+
+            if not guardadas:
+                archivo = FileStorage(stream=io.BytesIO(contenido), filename=filename, content_type=mimetype)
+                es_valido, mensaje = validar_archivo_imagen(archivo)
+                if not es_valido:
+                    _actualizar(id_tarea, estado=ESTADO_ERROR, mensaje=mensaje)
+                    return
+
+                # Redimensionar y codificar en otro proceso
+                for variante, formato, ancho, datos in generar_variantes_en_pool(contenido):
+                    url, hash_variante = guardar_imagen(datos, formato)
+                    guardadas.append((variante, formato, ancho, url, hash_variante))
+                mensaje = 'Imagen subida exitosamente'
+
+            imagenes = []
+            imagen_url = None
+            for variante, formato, ancho, url, hash_variante in guardadas:
+                imagenes.append(ProductoImagen(
+                    variante=variante, formato=formato, ancho=ancho, url=url,
+                    hash=hash_variante, hash_original=hash_original
+                ))
+                if variante == 'detalle' and formato == 'jpeg':
+                    imagen_url = url
+
+            producto = db.session.get(Producto, id_producto)
+            if producto is None:
+                _actualizar(id_tarea, estado=ESTADO_ERROR, mensaje='El producto ya no existe')
+                return
+
+            # imagen_url sigue siendo la versión JPEG grande para quien no use srcset
+            producto.imagen_url = imagen_url
+            producto.imagenes = imagenes
+            # El producto y el estado de la tarea se guardan en el mismo commit
+            _actualizar(id_tarea, estado=ESTADO_COMPLETADA, mensaje=mensaje, imagen_url=imagen_url)
+            invalidar_productos([id_producto])
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error en tarea de imagen {id_tarea}: {e}")
+            try:
+                _actualizar(id_tarea, estado=ESTADO_ERROR, mensaje=f'Error al procesar la imagen: {str(e)}'[:500])
+            except Exception as error_estado:
+                # Sin base de datos la tarea queda en curso y se da por vencida más tarde
+                db.session.rollback()
+                print(f"No se pudo guardar el estado de la tarea {id_tarea}: {error_estado}")
+
+
+def estado_tarea(id_tarea):
+    """Estado de una tarea como dict o None si no existe (o ya se descartó)"""
+    tarea = db.session.get(TareaImagen, id_tarea)
+    if tarea is None:
+        return None
+
+    datos = {
+        'id_tarea': tarea.id_tarea,
+        'id_producto': tarea.id_producto,
+        'estado': tarea.estado,
+        'mensaje': tarea.mensaje,
+        'imagen_url': tarea.imagen_url
+    }
+    if tarea.estado in ESTADOS_EN_CURSO and tarea.actualizado and tarea.actualizado < _limite_vencidas():
+        datos.update(estado=ESTADO_ERROR, mensaje='La subida se interrumpió, vuelve a subir la imagen')
+    return datos
+
+
+def tareas_pendientes():
+    """{id_producto: id_tarea} de las tareas que aún no terminan"""
+    filas = db.session.query(TareaImagen.id_producto, TareaImagen.id_tarea).filter(
+        TareaImagen.estado.in_(ESTADOS_EN_CURSO),
+        TareaImagen.actualizado >= _limite_vencidas()
+    ).all()
+    return {id_producto: id_tarea for id_producto, id_tarea in filas}
@@ -0,0 +1,88 @@
+"""
+Variantes de imagen por tamaño y formato para servir srcset en el catálogo.
+El trabajo de Pillow (decodificar, redimensionar, codificar) es de CPU, así
+que se ejecuta en un pool de procesos y no en los hilos del servidor.
+
+Los procesos se inician con 'spawn' (intérprete nuevo) y no con fork: el
+pool se usa desde los hilos de subida de imágenes, y un fork con hilos
+corriendo y conexiones abiertas (BD, HTTP) puede dejar procesos hijos
+bloqueados o compartiendo sockets con el padre.
+"""
+import io
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+
+# variante -> ancho máximo en píxeles
+TAMANOS = {
+    'miniatura': 160,
+    'tarjeta': 480,
+    'detalle': 1200
+}
+
+# formato -> (formato de Pillow, opciones de guardado)
+FORMATOS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True})
+}
+
+_pool = None
+_procesos = 2
+_lock = threading.Lock()
+
+
+def _a_rgb(imagen):
+    """Aplana transparencias sobre fondo blanco (JPEG no admite canal alfa)"""
+    if imagen.mode in ('RGBA', 'LA', 'P'):
+        if imagen.mode == 'P':
+            imagen = imagen.convert('RGBA')
+        fondo = Image.new('RGB', imagen.size, (255, 255, 255))
+        fondo.paste(imagen, mask=imagen.split()[-1] if imagen.mode in ('RGBA', 'LA') else None)
+        return fondo
+    if imagen.mode != 'RGB':
+        return imagen.convert('RGB')
+    return imagen
+
+
+def generar_variantes(contenido):
+    """
+    Genera todas las variantes de una imagen. Se ejecuta en otro proceso, por
+    eso recibe y devuelve solo bytes y tipos simples.
+    Retorna: lista de (variante, formato, ancho, bytes)
+    """
+    original = _a_rgb(Image.open(io.BytesIO(contenido)))
+    resultado = []
+
+    # De mayor a menor: cada reducción parte de la anterior, que ya es más chica
+    imagen = original
+    for variante, ancho_maximo in sorted(TAMANOS.items(), key=lambda t: t[1], reverse=True):
+        if imagen.width > ancho_maximo:
+            alto = max(1, round(imagen.height * ancho_maximo / imagen.width))
+            imagen = imagen.resize((ancho_maximo, alto), Image.Resampling.LANCZOS)
+
+        for formato, (formato_pil, opciones) in FORMATOS.items():
+            salida = io.BytesIO()
+            imagen.save(salida, format=formato_pil, **opciones)
+            resultado.append((variante, formato, imagen.width, salida.getvalue()))
+
+    return resultado
+
+
+def configurar(app):
+    """Toma la cantidad de procesos de IMAGENES_PROCESOS (el pool se crea al primer uso)"""
+    global _procesos
+    _procesos = app.config.get('IMAGENES_PROCESOS', 2)
+
+
+def _obtener_pool():
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=_procesos, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def generar_variantes_en_pool(contenido):
+    """Genera las variantes en el pool de procesos y espera el resultado"""
+    return _obtener_pool().submit(generar_variantes, contenido).result()
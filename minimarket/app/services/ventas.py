@@ -0,0 +1,245 @@
+"""
+Resúmenes de ventas por día, por producto y por categoría.
+Se actualizan de forma incremental dentro de la misma transacción que crea o
+cancela el pedido, así los reportes leen unas pocas filas por día en lugar
+de recorrer pedidos × pedido_detalle. reconstruir_ventas() los recalcula
+desde las tablas originales (carga inicial o corrección).
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import Date, case, delete, func, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+from app.models import (Categoria, Pedido, PedidoDetalle, Producto, VentaCategoria,
+                        VentaDiaria, VentaProducto, db, get_local_datetime)
+
+
+class dia(FunctionElement):
+    """Parte de la fecha de un DATETIME (sin la hora)"""
+    type = Date()
+    inherit_cache = True
+
+
+@compiles(dia)
+def _dia_sql(elemento, compilador, **kw):
+    return f'CAST({compilador.process(elemento.clauses, **kw)} AS DATE)'
+
+
+@compiles(dia, 'sqlite')
+def _dia_sqlite(elemento, compilador, **kw):
+    return f'date({compilador.process(elemento.clauses, **kw)})'
+
+
+def _acumular(modelo, claves, incrementos):
+    """
+    Suma los incrementos a la fila de las claves con un UPDATE atómico; si la
+    fila no existe la inserta (con punto de guardado por si otro pedido la
+    crea al mismo tiempo, en cuyo caso se vuelve a intentar el UPDATE)
+    """
+    valores = {getattr(modelo, columna): getattr(modelo, columna) + valor for columna, valor in incrementos.items()}
+    consulta = modelo.query.filter_by(**claves)
+
+    if consulta.update(valores, synchronize_session=False):
+        return
+
+    try:
+        with db.session.begin_nested():
+            db.session.add(modelo(**claves, **incrementos))
+    except IntegrityError:
+        consulta.update(valores, synchronize_session=False)
+
+
+def _aplicar(fecha, lineas, pedidos, cancelados, signo):
+    """
+    lineas: (id_producto, id_categoria, cantidad, importe) de un pedido
+    pedidos/cancelados: cuánto sumar a esos contadores
+    signo: +1 suma las unidades e ingresos, -1 las resta
+    """
+    fecha = fecha.date() if isinstance(fecha, datetime) else fecha
+    por_producto = defaultdict(lambda: [0, 0])
+    por_categoria = defaultdict(lambda: [0, 0])
+
+    for id_producto, id_categoria, cantidad, importe in lineas:
+        por_producto[id_producto][0] += cantidad
+        por_producto[id_producto][1] += importe
+        por_categoria[id_categoria][0] += cantidad
+        por_categoria[id_categoria][1] += importe
+
+    def incrementos(unidades, ingresos):
+        return {'pedidos': pedidos, 'cancelados': cancelados,
+                'unidades': signo * unidades, 'ingresos': signo * ingresos}
+
+    _acumular(VentaDiaria, {'fecha': fecha}, incrementos(
+        sum(u for u, _ in por_producto.values()), sum(i for _, i in por_producto.values())
+    ))
+
+    # Siempre en el mismo orden para que dos pedidos simultáneos no se bloqueen entre sí
+    for id_producto in sorted(por_producto):
+        _acumular(VentaProducto, {'fecha': fecha, 'id_producto': id_producto},
+                  incrementos(*por_producto[id_producto]))
+
+    for id_categoria in sorted(por_categoria):
+        _acumular(VentaCategoria, {'fecha': fecha, 'id_categoria': id_categoria},
+                  incrementos(*por_categoria[id_categoria]))
+
+
+def registrar_pedido(pedido, lineas):
+    """
+    Suma un pedido nuevo a los resúmenes (antes del commit del pedido)
+    lineas: líneas del carrito hidratado (producto, cantidad, subtotal)
+    """
+    _aplicar(pedido.fecha or get_local_datetime(), [
+        (linea['producto'].id_producto, linea['producto'].id_categoria, linea['cantidad'], linea['subtotal'])
+        for linea in lineas
+    ], pedidos=1, cancelados=0, signo=1)
+
+
+def _lineas_pedido(id_pedido):
+    """Fecha y líneas de un pedido guardado, en una consulta"""
+    filas = db.session.query(
+        Pedido.fecha, PedidoDetalle.id_producto, Producto.id_categoria,
+        PedidoDetalle.cantidad, PedidoDetalle.cantidad * PedidoDetalle.precio_unitario
+    ).join(PedidoDetalle, PedidoDetalle.id_pedido == Pedido.id_pedido) \
+     .join(Producto, Producto.id_producto == PedidoDetalle.id_producto) \
+     .filter(Pedido.id_pedido == id_pedido).all()
+
+    if not filas:
+        return None, []
+    return filas[0][0], [fila[1:] for fila in filas]
+
+
+def registrar_cambio_estado_ventas(id_pedido, anterior, nuevo):
+    """
+    Ajusta los resúmenes cuando un pedido entra o sale del estado cancelado
+    (antes del commit del cambio de estado)
+    """
+    if nuevo == 'cancelado' and anterior != 'cancelado':
+        pedidos, cancelados, signo = 0, 1, -1
+    elif anterior == 'cancelado' and nuevo != 'cancelado':
+        pedidos, cancelados, signo = 0, -1, 1
+    else:
+        return
+
+    fecha, lineas = _lineas_pedido(id_pedido)
+    if fecha is not None:
+        _aplicar(fecha, lineas, pedidos=pedidos, cancelados=cancelados, signo=signo)
+
+
+def reconstruir_ventas(desde=None, hasta=None):
+    """
+    Recalcula los resúmenes desde pedidos y pedido_detalle, para todo el
+    historial o para un rango de fechas (date, ambos incluidos). Las ventas
+    se asignan a la categoría actual de cada producto.
+    """
+    condiciones = []
+    if desde:
+        condiciones.append(Pedido.fecha >= datetime.combine(desde, datetime.min.time()))
+    if hasta:
+        condiciones.append(Pedido.fecha < datetime.combine(hasta + timedelta(days=1), datetime.min.time()))
+
+    for modelo in (VentaDiaria, VentaProducto, VentaCategoria):
+        borrar = delete(modelo)
+        if desde:
+            borrar = borrar.where(modelo.fecha >= desde)
+        if hasta:
+            borrar = borrar.where(modelo.fecha <= hasta)
+        db.session.execute(borrar)
+
+    fecha = dia(Pedido.fecha)
+    vigente = Pedido.estado != 'cancelado'
+    cancelado = Pedido.estado == 'cancelado'
+    importe = PedidoDetalle.cantidad * PedidoDetalle.precio_unitario
+
+    # Por día: pedidos contados desde la tabla pedidos y unidades desde sus líneas
+    lineas = select(
+        PedidoDetalle.id_pedido,
+        func.sum(PedidoDetalle.cantidad).label('unidades'),
+        func.sum(importe).label('ingresos')
+    ).group_by(PedidoDetalle.id_pedido).subquery()
+
+    diario = select(
+        fecha,
+        func.count(Pedido.id_pedido),
+        func.sum(case((cancelado, 1), else_=0)),
+        func.coalesce(func.sum(case((vigente, lineas.c.unidades), else_=0)), 0),
+        func.coalesce(func.sum(case((vigente, lineas.c.ingresos), else_=0)), 0)
+    ).select_from(Pedido).outerjoin(lineas, lineas.c.id_pedido == Pedido.id_pedido) \
+     .where(*condiciones).group_by(fecha)
+
+    def por_clave(columna_clave):
+        return select(
+            fecha,
+            columna_clave,
+            func.count(func.distinct(Pedido.id_pedido)),
+            func.count(func.distinct(case((cancelado, Pedido.id_pedido)))),
+            func.sum(case((vigente, PedidoDetalle.cantidad), else_=0)),
+            func.sum(case((vigente, importe), else_=0))
+        ).select_from(PedidoDetalle) \
+         .join(Pedido, Pedido.id_pedido == PedidoDetalle.id_pedido) \
+         .join(Producto, Producto.id_producto == PedidoDetalle.id_producto) \
+         .where(*condiciones).group_by(fecha, columna_clave)
+
+    columnas = ['pedidos', 'cancelados', 'unidades', 'ingresos']
+    db.session.execute(insert(VentaDiaria).from_select(['fecha'] + columnas, diario))
+    db.session.execute(insert(VentaProducto).from_select(
+        ['fecha', 'id_producto'] + columnas, por_clave(PedidoDetalle.id_producto)
+    ))
+    db.session.execute(insert(VentaCategoria).from_select(
+        ['fecha', 'id_categoria'] + columnas, por_clave(Producto.id_categoria)
+    ))
+    db.session.commit()
+
+
+# Lecturas para los reportes
+
+def resumen_ventas(desde, hasta):
+    """Totales del rango: pedidos, cancelados, unidades, ingresos y ticket promedio"""
+    fila = db.session.query(
+        func.coalesce(func.sum(VentaDiaria.pedidos), 0),
+        func.coalesce(func.sum(VentaDiaria.cancelados), 0),
+        func.coalesce(func.sum(VentaDiaria.unidades), 0),
+        func.coalesce(func.sum(VentaDiaria.ingresos), 0)
+    ).filter(VentaDiaria.fecha >= desde, VentaDiaria.fecha <= hasta).one()
+
+    pedidos, cancelados, unidades, ingresos = fila
+    vigentes = pedidos - cancelados
+    return {
+        'pedidos': pedidos,
+        'cancelados': cancelados,
+        'unidades': unidades,
+        'ingresos': ingresos,
+        'ticket_promedio': ingresos / vigentes if vigentes else 0
+    }
+
+
+def ventas_por_dia(desde, hasta):
+    return VentaDiaria.query.filter(
+        VentaDiaria.fecha >= desde, VentaDiaria.fecha <= hasta
+    ).order_by(VentaDiaria.fecha.desc()).all()
+
+
+def productos_mas_vendidos(desde, hasta, limite=10):
+    """(id_producto, nombre, pedidos, cancelados, unidades, ingresos) por unidades vendidas"""
+    unidades = func.sum(VentaProducto.unidades)
+    return db.session.query(
+        VentaProducto.id_producto, Producto.nombre,
+        func.sum(VentaProducto.pedidos), func.sum(VentaProducto.cancelados),
+        unidades, func.sum(VentaProducto.ingresos)
+    ).outerjoin(Producto, Producto.id_producto == VentaProducto.id_producto) \
+     .filter(VentaProducto.fecha >= desde, VentaProducto.fecha <= hasta) \
+     .group_by(VentaProducto.id_producto, Producto.nombre) \
+     .order_by(unidades.desc()).limit(limite).all()
+
+
+def ventas_por_categoria(desde, hasta):
+    """(id_categoria, nombre, pedidos, cancelados, unidades, ingresos) por ingresos"""
+    ingresos = func.sum(VentaCategoria.ingresos)
+    return db.session.query(
+        VentaCategoria.id_categoria, Categoria.nombre,
+        func.sum(VentaCategoria.pedidos), func.sum(VentaCategoria.cancelados),
+        func.sum(VentaCategoria.unidades), ingresos
+    ).outerjoin(Categoria, Categoria.id_categoria == VentaCategoria.id_categoria) \
+     .filter(VentaCategoria.fecha >= desde, VentaCategoria.fecha <= hasta) \
+     .group_by(VentaCategoria.id_categoria, Categoria.nombre) \
+     .order_by(ingresos.desc()).all()
@@ -7,6 +7,7 @@ document.addEventListener('DOMContentLoaded', function() {
     initializeCartFunctions();
     initializeQuantityControls();
     initializeImageLazyLoading();
+    initializeRealTimeSearch();
     
     // Event listeners globales
     setupGlobalEventListeners();
@@ -322,16 +323,123 @@ function debounce(func, wait, immediate) {
     };
 }
 
-// Búsqueda en tiempo real
+// Búsqueda en tiempo real: sugerencias mientras se escribe en los buscadores
+// marcados con data-sugerencias="<url del endpoint>"
 function initializeRealTimeSearch() {
-    const searchInput = document.querySelector('input[name="q"]');
-    if (searchInput) {
-        const debouncedSearch = debounce(function() {
-            // Implementar búsqueda AJAX aquí si es necesario
-        }, 300);
+    const searchInput = document.querySelector('input[name="q"][data-sugerencias]');
+    if (!searchInput) {
+        return;
+    }
+    
+    const url = searchInput.dataset.sugerencias;
+    const categoria = searchInput.form && searchInput.form.querySelector('input[name="categoria"]');
+    const respuestas = new Map();
+    let peticion = null;
+    
+    const lista = document.createElement('div');
+    lista.className = 'dropdown-menu w-100';
+    lista.style.top = '100%';
+    lista.style.left = '0';
+    searchInput.parentNode.classList.add('position-relative');
+    searchInput.parentNode.appendChild(lista);
+    searchInput.setAttribute('autocomplete', 'off');
+    
+    function ocultar() {
+        lista.classList.remove('show');
+    }
+    
+    function mostrar(sugerencias) {
+        if (!sugerencias.length) {
+            ocultar();
+            return;
+        }
         
-        searchInput.addEventListener('input', debouncedSearch);
+        lista.innerHTML = '';
+        sugerencias.forEach(function(producto) {
+            const item = document.createElement('a');
+            item.className = 'dropdown-item d-flex justify-content-between align-items-center';
+            item.href = producto.url;
+            
+            const nombre = document.createElement('span');
+            nombre.textContent = producto.nombre;
+            const precio = document.createElement('small');
+            precio.className = producto.stock > 0 ? 'text-muted ms-2' : 'text-danger ms-2';
+            precio.textContent = producto.stock > 0 ? 'S/. ' + producto.precio.toFixed(2) : 'Agotado';
+            
+            item.appendChild(nombre);
+            item.appendChild(precio);
+            lista.appendChild(item);
+        });
+        lista.classList.add('show');
     }
+    
+    const debouncedSearch = debounce(function() {
+        const texto = searchInput.value.trim();
+        const clave = texto.toLowerCase() + '|' + (categoria ? categoria.value : '');
+        
+        if (texto.length < 2) {
+            ocultar();
+            return;
+        }
+        
+        if (respuestas.has(clave)) {
+            mostrar(respuestas.get(clave));
+            return;
+        }
+        
+        // Solo interesa la respuesta de lo último que se escribió
+        if (peticion) {
+            peticion.abort();
+        }
+        peticion = new AbortController();
+        
+        const params = new URLSearchParams({ q: texto });
+        if (categoria) {
+            params.set('categoria', categoria.value);
+        }
+        
+        fetch(url + '?' + params.toString(), { signal: peticion.signal })
+            .then(response => response.json())
+            .then(data => {
+                respuestas.set(clave, data.sugerencias);
+                if (searchInput.value.trim() === texto) {
+                    mostrar(data.sugerencias);
+                }
+            })
+            .catch(error => {
+                if (error.name !== 'AbortError') {
+                    console.error('Error en sugerencias:', error);
+                }
+            });
+    }, 150);
+    
+    searchInput.addEventListener('input', debouncedSearch);
+    searchInput.addEventListener('keydown', function(e) {
+        if (e.key === 'Escape') {
+            ocultar();
+        } else if (e.key === 'ArrowDown' && lista.classList.contains('show')) {
+            e.preventDefault();
+            lista.querySelector('.dropdown-item').focus();
+        }
+    });
+    lista.addEventListener('keydown', function(e) {
+        const actual = document.activeElement;
+        if (e.key === 'ArrowDown' && actual.nextElementSibling) {
+            e.preventDefault();
+            actual.nextElementSibling.focus();
+        } else if (e.key === 'ArrowUp') {
+            e.preventDefault();
+            (actual.previousElementSibling || searchInput).focus();
+        } else if (e.key === 'Escape') {
+            ocultar();
+            searchInput.focus();
+        }
+    });
+    document.addEventListener('click', function(e) {
+        if (!searchInput.parentNode.contains(e.target)) {
+            ocultar();
+        }
+    });
 }
 
 // Exportar funciones principales para uso global
@@ -0,0 +1,91 @@
+// Actualización en vivo de pedidos
+
+// Llama a manejador(evento) por cada pedido creado o actualizado desde que
+// se renderizó la página. Por defecto consulta config.urlRecientes cada
+// config.intervalo ms; con config.sse abre un stream SSE (el navegador se
+// reconecta solo y el servidor reenvía los eventos perdidos con Last-Event-ID).
+function escucharPedidos(config, manejador) {
+    if (config.sse && window.EventSource) {
+        const fuente = new EventSource(config.urlStream + '?desde=' + config.ultimo);
+
+        fuente.addEventListener('pedido', function(e) {
+            manejador(JSON.parse(e.data));
+        });
+
+        // Se perdieron demasiados eventos: solo queda recargar
+        fuente.addEventListener('recargar', function() {
+            location.reload();
+        });
+
+        return fuente;
+    }
+
+    let ultimo = config.ultimo;
+
+    function consultar() {
+        fetch(config.urlRecientes + '?desde=' + ultimo)
+            .then(function(response) {
+                return response.ok ? response.json() : null;
+            })
+            .then(function(data) {
+                if (!data) return;
+                if (data.recargar) {
+                    location.reload();
+                    return;
+                }
+                data.eventos.forEach(manejador);
+                ultimo = data.ultimo;
+            })
+            .catch(function() {})
+            .then(function() {
+                setTimeout(consultar, config.intervalo);
+            });
+    }
+
+    setTimeout(consultar, config.intervalo);
+    return null;
+}
+
+// Trae la fila del pedido ya renderizada y la reemplaza en la tabla (o la
+// agrega arriba si es nueva). Si el usuario ya no puede verla, la quita.
+function actualizarFilaPedido(idPedido, tabla, agregarSiNoExiste) {
+    const actual = tabla.querySelector('tr[data-pedido="' + idPedido + '"]');
+    if (!actual && !agregarSiNoExiste) {
+        return Promise.resolve(null);
+    }
+
+    return fetch('/pedidos/pedido/' + idPedido + '/fila')
+        .then(function(response) {
+            return response.ok ? response.text() : null;
+        })
+        .then(function(html) {
+            if (!html) {
+                if (actual) actual.remove();
+                return null;
+            }
+
+            const contenedor = document.createElement('tbody');
+            contenedor.innerHTML = html.trim();
+            const nueva = contenedor.firstElementChild;
+
+            if (actual) {
+                actual.replaceWith(nueva);
+            } else {
+                tabla.prepend(nueva);
+            }
+
+            nueva.classList.add('fila-actualizada');
+            setTimeout(function() {
+                nueva.classList.remove('fila-actualizada');
+            }, 2000);
+            return nueva;
+        });
+}
+
+// Suma delta al contador de estadísticas marcado con data-stat="clave"
+function ajustarEstadistica(clave, delta) {
+    const elemento = document.querySelector('[data-stat="' + clave + '"]');
+    if (elemento) {
+        elemento.textContent = Math.max(0, (parseInt(elemento.textContent, 10) || 0) + delta);
+    }
+}
@@ -35,6 +35,9 @@ CREATE TABLE productos (
     FOREIGN KEY (id_categoria) REFERENCES categorias(id_categoria)
 );
 
+-- Conteo de productos por categoría y chequeo antes de eliminar una categoría
+CREATE INDEX ix_productos_id_categoria ON productos(id_categoria);
+
 CREATE TABLE pedidos (
     id_pedido INT IDENTITY(1,1) PRIMARY KEY,
     id_usuario INT, 
@@ -48,6 +51,9 @@ CREATE TABLE pedidos (
 
 );
 
+-- Estadísticas y últimos pedidos de un cliente (total incluido para no leer la tabla)
+CREATE INDEX ix_pedidos_id_usuario ON pedidos(id_usuario) INCLUDE (total);
+
 
 CREATE TABLE pedido_detalle (
     id_detalle INT IDENTITY(1,1) PRIMARY KEY,
@@ -59,6 +65,108 @@ CREATE TABLE pedido_detalle (
     FOREIGN KEY (id_producto) REFERENCES productos(id_producto)
 );
 
+-- Líneas de un pedido (detalle, historial y conteo de líneas)
+CREATE INDEX ix_pedido_detalle_id_pedido ON pedido_detalle(id_pedido);
+
+CREATE TABLE producto_imagenes (
+    id_imagen INT IDENTITY(1,1) PRIMARY KEY,
+    id_producto INT NOT NULL,
+    variante VARCHAR(20) NOT NULL,
+    formato VARCHAR(10) NOT NULL,
+    ancho INT NOT NULL,
+    url VARCHAR(500) NOT NULL,
+    hash CHAR(64) NULL,
+    hash_original CHAR(64) NULL,
+    FOREIGN KEY (id_producto) REFERENCES productos(id_producto)
+);
+
+CREATE INDEX ix_producto_imagenes_producto ON producto_imagenes(id_producto);
+CREATE INDEX ix_producto_imagenes_hash ON producto_imagenes(hash);
+CREATE INDEX ix_producto_imagenes_hash_original ON producto_imagenes(hash_original);
+
+CREATE TABLE imagenes_almacen (
+    hash CHAR(64) PRIMARY KEY,
+    formato VARCHAR(10) NOT NULL,
+    url VARCHAR(500) NOT NULL,
+    tamano INT NOT NULL,
+    fecha DATETIME DEFAULT GETDATE()
+);
+
+-- Eventos de pedidos para los listados en vivo (se leen por id creciente;
+-- los antiguos se borran con "flask --app run limpiar-eventos")
+CREATE TABLE eventos_pedidos (
+    id_evento INT IDENTITY(1,1) PRIMARY KEY,
+    fecha DATETIME DEFAULT GETDATE(),
+    tipo VARCHAR(30) NOT NULL,
+    id_pedido INT NOT NULL,
+    id_usuario INT NOT NULL,
+    estado VARCHAR(20) NOT NULL,
+    estado_anterior VARCHAR(20) NULL,
+    repartidor_id INT NULL,
+    repartidor_anterior INT NULL
+);
+
+CREATE INDEX ix_eventos_pedidos_fecha ON eventos_pedidos(fecha);
+
+-- Subidas de imagen en segundo plano (estado consultable desde cualquier worker)
+CREATE TABLE tareas_imagen (
+    id_tarea CHAR(32) PRIMARY KEY,
+    id_producto INT NOT NULL,
+    estado VARCHAR(20) NOT NULL,
+    mensaje VARCHAR(500) NULL,
+    imagen_url VARCHAR(500) NULL,
+    actualizado DATETIME DEFAULT GETDATE()
+);
+
+CREATE INDEX ix_tareas_imagen_producto ON tareas_imagen(id_producto);
+
+-- Resúmenes de ventas (mantenidos por la aplicación; se reconstruyen con
+-- "flask --app run reconstruir-ventas")
+CREATE TABLE ventas_diarias (
+    fecha DATE PRIMARY KEY,
+    pedidos INT NOT NULL DEFAULT 0,
+    cancelados INT NOT NULL DEFAULT 0,
+    unidades INT NOT NULL DEFAULT 0,
+    ingresos DECIMAL(12,2) NOT NULL DEFAULT 0
+);
+
+CREATE TABLE ventas_producto_dia (
+    fecha DATE NOT NULL,
+    id_producto INT NOT NULL,
+    pedidos INT NOT NULL DEFAULT 0,
+    cancelados INT NOT NULL DEFAULT 0,
+    unidades INT NOT NULL DEFAULT 0,
+    ingresos DECIMAL(12,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (fecha, id_producto)
+);
+
+CREATE INDEX ix_ventas_producto_dia_id_producto ON ventas_producto_dia(id_producto);
+
+CREATE TABLE ventas_categoria_dia (
+    fecha DATE NOT NULL,
+    id_categoria INT NOT NULL,
+    pedidos INT NOT NULL DEFAULT 0,
+    cancelados INT NOT NULL DEFAULT 0,
+    unidades INT NOT NULL DEFAULT 0,
+    ingresos DECIMAL(12,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (fecha, id_categoria)
+);
+
+CREATE INDEX ix_ventas_categoria_dia_id_categoria ON ventas_categoria_dia(id_categoria);
+
+-- Carritos del lado del servidor: la cookie solo lleva id_carrito.
+-- Líneas compactas "id_producto:cantidad,..."; id_usuario NULL = anónimo
+CREATE TABLE carritos (
+    id_carrito CHAR(32) PRIMARY KEY,
+    id_usuario INT NULL,
+    lineas VARCHAR(MAX) NOT NULL DEFAULT '',
+    actualizado DATETIME DEFAULT GETDATE(),
+    FOREIGN KEY (id_usuario) REFERENCES usuarios(id_usuario)
+);
+
+-- Un carrito por usuario; los anónimos no cuentan
+CREATE UNIQUE INDEX ix_carritos_id_usuario ON carritos(id_usuario) WHERE id_usuario IS NOT NULL;
+
 -- INSERCIONES
 
 -- Roles
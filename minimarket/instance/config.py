@@ -4,6 +4,47 @@ import urllib.parse
 
 load_dotenv()
 
+# Perfiles del motor de base de datos, elegidos con DB_PERFIL. Cada worker de
+# gunicorn tiene su propio pool: con -w N el servidor puede recibir hasta
+# N * (pool_size + max_overflow) conexiones
+PERFILES_BD = {
+    # Producción: conexiones verificadas antes de usarse y renovadas cada 30 min
+    'mssql': {
+        'pool_size': 10, 'max_overflow': 10, 'pool_timeout': 30,
+        'pool_recycle': 1800, 'pool_pre_ping': True, 'fast_executemany': True
+    },
+    # Pruebas de carga: más conexiones, sin ping y espera corta para ver la saturación
+    'carga': {
+        'pool_size': 20, 'max_overflow': 20, 'pool_timeout': 5,
+        'pool_recycle': 1800, 'pool_pre_ping': False, 'fast_executemany': True
+    },
+    # Desarrollo local sin SQL Server (los procedimientos almacenados no existen)
+    'sqlite': {
+        'pool_size': 5, 'max_overflow': 5, 'pool_timeout': 10
+    }
+}
+
+# Variables de entorno que ajustan el pool del perfil elegido
+_AJUSTES_POOL = {
+    'pool_size': 'DB_POOL_SIZE',
+    'max_overflow': 'DB_MAX_OVERFLOW',
+    'pool_timeout': 'DB_POOL_TIMEOUT',
+    'pool_recycle': 'DB_POOL_RECYCLE'
+}
+
+
+def opciones_motor(perfil):
+    """Opciones de create_engine del perfil con los ajustes de DB_POOL_*"""
+    if perfil not in PERFILES_BD:
+        raise Exception(f'DB_PERFIL desconocido: {perfil} (opciones: {", ".join(PERFILES_BD)})')
+
+    opciones = dict(PERFILES_BD[perfil])
+    for clave, variable in _AJUSTES_POOL.items():
+        if os.environ.get(variable):
+            opciones[clave] = int(os.environ[variable])
+    return opciones
+
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'tu-clave-secreta-muy-segura'
     
@@ -14,14 +55,93 @@ class Config:
     SQLSERVER_PASSWORD = os.environ.get('SQLSERVER_PASSWORD') or '123456'
     SQLSERVER_DRIVER = os.environ.get('SQLSERVER_DRIVER') or 'ODBC Driver 17 for SQL Server'
     
+    # Perfil del motor: 'mssql' (producción), 'carga' (SQL Server en pruebas de carga) o 'sqlite'
+    DB_PERFIL = os.environ.get('DB_PERFIL') or 'mssql'
+    SQLITE_RUTA = os.environ.get('SQLITE_RUTA') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'minimarket.db')
+    
     # URL de conexión para SQLAlchemy con SQL Server
     connection_string = f'DRIVER={{{SQLSERVER_DRIVER}}};SERVER={SQLSERVER_SERVER};DATABASE={SQLSERVER_DATABASE};UID={SQLSERVER_USERNAME};PWD={SQLSERVER_PASSWORD};TrustServerCertificate=yes;'
-    SQLALCHEMY_DATABASE_URI = f"mssql+pyodbc:///?odbc_connect={urllib.parse.quote_plus(connection_string)}"
+    if DB_PERFIL == 'sqlite':
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{SQLITE_RUTA}'
+    else:
+        SQLALCHEMY_DATABASE_URI = f"mssql+pyodbc:///?odbc_connect={urllib.parse.quote_plus(connection_string)}"
+    SQLALCHEMY_ENGINE_OPTIONS = opciones_motor(DB_PERFIL)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
     # API de imgbb
     IMGBB_API_KEY = os.environ.get('IMGBB_API_KEY') or 'tu-api-key-de-imgbb'
-    IMGBB_API_URL = 'https://api.imgbb.com/1/upload'
+    IMGBB_API_URL = os.environ.get('IMGBB_API_URL') or 'https://api.imgbb.com/1/upload'
+    # Timeouts en segundos, reintentos con espera exponencial y circuit breaker
+    IMGBB_TIMEOUT_CONEXION = float(os.environ.get('IMGBB_TIMEOUT_CONEXION', 3.05))
+    IMGBB_TIMEOUT_LECTURA = float(os.environ.get('IMGBB_TIMEOUT_LECTURA', 20))
+    IMGBB_REINTENTOS = int(os.environ.get('IMGBB_REINTENTOS', 3))
+    IMGBB_ESPERA_BASE = float(os.environ.get('IMGBB_ESPERA_BASE', 0.5))
+    IMGBB_ESPERA_MAXIMA = float(os.environ.get('IMGBB_ESPERA_MAXIMA', 8))
+    IMGBB_CIRCUITO_FALLOS = int(os.environ.get('IMGBB_CIRCUITO_FALLOS', 5))
+    IMGBB_CIRCUITO_ESPERA = int(os.environ.get('IMGBB_CIRCUITO_ESPERA', 30))
+    IMGBB_CONEXIONES = int(os.environ.get('IMGBB_CONEXIONES', 4))
+    
+    # Hilos que procesan las subidas de imágenes en segundo plano
+    IMAGENES_WORKERS = int(os.environ.get('IMAGENES_WORKERS', 2))
+    # Procesos para generar variantes de imagen con Pillow
+    IMAGENES_PROCESOS = int(os.environ.get('IMAGENES_PROCESOS', 2))
+    
+    # Almacén de imágenes por contenido: 'imgbb' o 'local' (servidas por la app)
+    IMAGENES_BACKEND = os.environ.get('IMAGENES_BACKEND') or 'imgbb'
+    IMAGENES_DIR = os.environ.get('IMAGENES_DIR') or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'imagenes')
+    IMAGENES_URL_BASE = '/imagenes'
+    IMAGENES_GC_GRACIA_HORAS = int(os.environ.get('IMAGENES_GC_GRACIA_HORAS', 24))
+    
+    # Caché de estadísticas de pedidos (segundos antes de recalcular con SQL)
+    STATS_PEDIDOS_CACHE = os.environ.get('STATS_PEDIDOS_CACHE', 'true').lower() == 'true'
+    STATS_PEDIDOS_TTL = int(os.environ.get('STATS_PEDIDOS_TTL', 60))
+    
+    # Caché del catálogo público (segundos que vive cada entrada)
+    CATALOGO_CACHE_TTL = int(os.environ.get('CATALOGO_CACHE_TTL', 60))
+    
+    # Segundos que se reutiliza la foto del dashboard de administración
+    DASHBOARD_TTL = int(os.environ.get('DASHBOARD_TTL', 5))
+    
+    # Pedidos en vivo. Por defecto las páginas consultan los eventos nuevos
+    # cada EVENTOS_INTERVALO segundos (peticiones cortas, sirve con workers
+    # síncronos). Con EVENTOS_SSE=true usan un stream SSE, que ocupa un hilo
+    # del servidor por pestaña abierta (gunicorn -k gthread --threads N)
+    EVENTOS_SSE = os.environ.get('EVENTOS_SSE', 'false').lower() == 'true'
+    EVENTOS_INTERVALO = int(os.environ.get('EVENTOS_INTERVALO', 5))
+    # Eventos por consulta; con más pendientes la página se recarga
+    EVENTOS_MAXIMO = int(os.environ.get('EVENTOS_MAXIMO', 200))
+    # Con SSE: segundos entre lecturas de la tabla de eventos y entre latidos
+    EVENTOS_SONDEO = float(os.environ.get('EVENTOS_SONDEO', 1))
+    EVENTOS_LATIDO = int(os.environ.get('EVENTOS_LATIDO', 15))
+    
+    # Índice de búsqueda: reconstrucción periódica para ver cambios de otros workers
+    BUSQUEDA_REINDEXAR_SEGUNDOS = int(os.environ.get('BUSQUEDA_REINDEXAR_SEGUNDOS', 300))
+    
+    # Sugerencias del buscador mientras se escribe
+    SUGERENCIAS_LIMITE = int(os.environ.get('SUGERENCIAS_LIMITE', 8))
+    SUGERENCIAS_MIN_CARACTERES = int(os.environ.get('SUGERENCIAS_MIN_CARACTERES', 2))
+    SUGERENCIAS_CACHE_TTL = int(os.environ.get('SUGERENCIAS_CACHE_TTL', 60))
+    
+    # Contraseñas (bcrypt): hilos del pool, peticiones en espera y segundos
+    # máximos de espera. El costo es el mismo para todos los workers; para
+    # elegirlo en un servidor nuevo: flask calibrar-contrasenas
+    CONTRASENAS_HILOS = int(os.environ.get('CONTRASENAS_HILOS', os.cpu_count() or 2))
+    CONTRASENAS_COLA = int(os.environ.get('CONTRASENAS_COLA', 16))
+    CONTRASENAS_ESPERA = int(os.environ.get('CONTRASENAS_ESPERA', 5))
+    CONTRASENAS_COSTO = int(os.environ.get('CONTRASENAS_COSTO', 12))
+    CONTRASENAS_OBJETIVO_MS = int(os.environ.get('CONTRASENAS_OBJETIVO_MS', 250))
+    CONTRASENAS_COSTO_MINIMO = int(os.environ.get('CONTRASENAS_COSTO_MINIMO', 12))
+    
+    # Carrito del lado del servidor: 'bd' (tabla carritos) o 'memoria' (por proceso)
+    CARRITO_BACKEND = os.environ.get('CARRITO_BACKEND') or 'bd'
+    CARRITO_MEMORIA_MAXIMO = int(os.environ.get('CARRITO_MEMORIA_MAXIMO', 10000))
+    
+    # Caché de identidad del usuario logueado (segundos)
+    IDENTIDAD_CACHE_TTL = int(os.environ.get('IDENTIDAD_CACHE_TTL', 30))
+    
+    # Paginación por cursor en los listados
+    PAGINACION_POR_PAGINA = 20
+    PAGINACION_MAXIMO = 100
     
     # Configuración de uploads
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB máximo
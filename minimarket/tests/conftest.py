@@ -0,0 +1,178 @@
+"""
+Configuración común de las pruebas.
+Usan una base SQLite temporal (DB_PERFIL=sqlite) en lugar de SQL Server;
+lo que depende de procedimientos almacenados se reemplaza en cada prueba.
+Ejecutar desde minimarket/: python -m pytest -q
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Antes de importar la configuración de la app
+_directorio = tempfile.mkdtemp(prefix='minimarket-pruebas-')
+os.environ['DB_PERFIL'] = 'sqlite'
+os.environ['SQLITE_RUTA'] = os.path.join(_directorio, 'pruebas.db')
+os.environ['IMAGENES_DIR'] = os.path.join(_directorio, 'imagenes')
+# Hashes baratos: el costo de bcrypt no es lo que se prueba aquí
+os.environ['CONTRASENAS_COSTO'] = '4'
+os.environ['CONTRASENAS_COSTO_MINIMO'] = '4'
+
+import pytest
+from sqlalchemy import text
+from app import create_app, crear_roles_por_defecto
+from app.models import Categoria, Producto, Rol, Usuario, db
+from app.services import identidad
+from app.services.busqueda import construir_indice
+from app.services.cache_catalogo import invalidar_categorias
+
+CONTRASENA = 'clave-de-prueba'
+
+# Consultas SQLite equivalentes a los procedimientos almacenados de SQL Server
+PROCEDIMIENTOS_SQLITE = {
+    'sp_autenticar': (
+        'SELECT u.id_usuario, u.nombre_completo, u.email, u.contrasena, u.telefono, '
+        'u.direccion, u.id_rol, r.nombre AS nombre_rol '
+        'FROM usuarios u JOIN roles r ON r.id_rol = u.id_rol WHERE u.email = :email'
+    ),
+    'sp_actualizar_estado_pedido': (
+        'UPDATE pedidos SET estado = :nuevo_estado, repartidor_id = :repartidor_id '
+        'WHERE id_pedido = :id_pedido'
+    )
+}
+
+
+@pytest.fixture(scope='session')
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+    return app
+
+
+@pytest.fixture
+def bd(app):
+    """Base vacía (solo roles) y cachés de proceso limpias para cada prueba"""
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        crear_roles_por_defecto()
+        construir_indice()
+        db.session.remove()
+
+    identidad._identidades.clear()
+    invalidar_categorias()
+    return db
+
+
+@pytest.fixture
+def procedimientos(monkeypatch):
+    """ejecutar_sp() corre la consulta SQLite equivalente en lugar del EXEC"""
+    def texto_sqlite(sql):
+        nombre = sql.split()[1]
+        return text(PROCEDIMIENTOS_SQLITE[nombre])
+
+    monkeypatch.setattr('app.services.procedimientos.text', texto_sqlite)
+
+
+@pytest.fixture
+def usuarios(app, bd):
+    """Un usuario por rol: {'admin': id, 'cliente': id, 'repartidor': id}"""
+    ids = {}
+    with app.app_context():
+        for rol in Rol.query.all():
+            usuario = Usuario(nombre_completo=f'Usuario {rol.nombre}', email=f'{rol.nombre}@prueba.com',
+                              telefono='999999999', direccion='Av. Prueba 123', id_rol=rol.id_rol)
+            usuario.set_password(CONTRASENA)
+            db.session.add(usuario)
+            db.session.flush()
+            ids[rol.nombre] = usuario.id_usuario
+        db.session.commit()
+    return ids
+
+
+def crear_productos(app, cantidad, stock=10, precio=1.5):
+    """Crea una categoría con cantidad productos y reconstruye el índice de búsqueda"""
+    with app.app_context():
+        categoria = Categoria(nombre='Abarrotes')
+        db.session.add(categoria)
+        db.session.flush()
+        db.session.add_all([
+            Producto(nombre=f'Producto {i}', precio=precio, stock=stock, id_categoria=categoria.id_categoria)
+            for i in range(cantidad)
+        ])
+        db.session.commit()
+        construir_indice()
+        return [id_producto for (id_producto,) in db.session.query(Producto.id_producto).order_by(Producto.id_producto)]
+
+
+@pytest.fixture
+def cliente_como(app):
+    """Cliente de pruebas con la sesión iniciada como id_usuario"""
+    def crear(id_usuario):
+        cliente = app.test_client()
+        with cliente.session_transaction() as sesion:
+            sesion['_user_id'] = str(id_usuario)
+            sesion['_fresh'] = True
+        return cliente
+    return crear
+
+
+class ImgbbFalso:
+    """
+    Servidor HTTP local que imita la API de imgbb. Cada POST consume la
+    siguiente respuesta de `respuestas`: 200 (subida exitosa), otro código
+    HTTP, o ('lenta', segundos) para provocar un timeout. Sin respuestas
+    pendientes, la subida sale bien.
+    """
+
+    def __init__(self):
+        self.respuestas = []
+        self.recibidas = 0
+        self._lock = threading.Lock()
+        falso = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                with falso._lock:
+                    falso.recibidas += 1
+                    numero = falso.recibidas
+                    respuesta = falso.respuestas.pop(0) if falso.respuestas else 200
+
+                if isinstance(respuesta, tuple):
+                    time.sleep(respuesta[1])
+                    respuesta = 200
+
+                cuerpo = b''
+                if respuesta == 200:
+                    cuerpo = json.dumps({'success': True, 'data': {'url': f'http://img.prueba/{numero}.jpg'}}).encode()
+                try:
+                    self.send_response(respuesta)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(cuerpo)))
+                    self.end_headers()
+                    self.wfile.write(cuerpo)
+                except (BrokenPipeError, ConnectionResetError):
+                    # El cliente ya se fue por timeout
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', 0), Manejador)
+        self.servidor.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.servidor.server_port}/1/upload'
+        threading.Thread(target=self.servidor.serve_forever, args=(0.05,), daemon=True).start()
+
+    def cerrar(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+
+@pytest.fixture
+def imgbb_falso():
+    falso = ImgbbFalso()
+    yield falso
+    falso.cerrar()
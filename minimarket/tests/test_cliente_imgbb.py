@@ -0,0 +1,109 @@
+"""
+Cliente de imgbb contra un servidor HTTP local: reintentos, timeouts,
+circuit breaker y métricas.
+"""
+import time
+import pytest
+from app.services.cliente_imgbb import (CIRCUITO_ABIERTO, CIRCUITO_CERRADO, CircuitoAbierto,
+                                        ClienteImgbb, ErrorImgbb)
+
+IMAGEN = b'bytes de una imagen'
+
+
+def crear_cliente(imgbb_falso, **opciones):
+    # Sin espera entre reintentos para que las pruebas sean rápidas
+    opciones.setdefault('espera_base', 0)
+    opciones.setdefault('timeout_lectura', 2)
+    return ClienteImgbb(imgbb_falso.url, 'clave', **opciones)
+
+
+def test_reintenta_errores_5xx(imgbb_falso):
+    imgbb_falso.respuestas = [500, 503]
+    cliente = crear_cliente(imgbb_falso, reintentos=3)
+
+    assert cliente.subir(IMAGEN) == 'http://img.prueba/3.jpg'
+
+    metricas = cliente.metricas()
+    assert imgbb_falso.recibidas == 3
+    assert metricas['intentos'] == 3
+    assert metricas['reintentos'] == 2
+    assert metricas['exitosas'] == 1
+    assert metricas['fallidas'] == 0
+    assert metricas['circuito'] == CIRCUITO_CERRADO
+
+
+def test_reintenta_timeouts(imgbb_falso):
+    imgbb_falso.respuestas = [('lenta', 0.6)]
+    cliente = crear_cliente(imgbb_falso, timeout_lectura=0.2, reintentos=1)
+
+    assert cliente.subir(IMAGEN) == 'http://img.prueba/2.jpg'
+
+    metricas = cliente.metricas()
+    assert metricas['timeouts'] == 1
+    assert metricas['reintentos'] == 1
+    # La latencia del intento fallido llega hasta el timeout de lectura
+    assert metricas['latencia_ms']['maxima'] >= 200
+
+
+def test_no_reintenta_si_imgbb_rechaza_la_imagen(imgbb_falso):
+    imgbb_falso.respuestas = [400]
+    cliente = crear_cliente(imgbb_falso, reintentos=3)
+
+    with pytest.raises(ErrorImgbb, match='400'):
+        cliente.subir(IMAGEN)
+
+    assert imgbb_falso.recibidas == 1
+    assert cliente.metricas()['circuito'] == CIRCUITO_CERRADO
+
+
+def test_agota_reintentos_y_cuenta_la_falla(imgbb_falso):
+    imgbb_falso.respuestas = [502, 502, 502]
+    cliente = crear_cliente(imgbb_falso, reintentos=2, umbral_circuito=10)
+
+    with pytest.raises(ErrorImgbb, match='502'):
+        cliente.subir(IMAGEN)
+
+    metricas = cliente.metricas()
+    assert metricas['intentos'] == 3
+    assert metricas['fallidas'] == 1
+    assert metricas['exitosas'] == 0
+    assert metricas['latencia_ms'] is not None
+
+
+def test_circuito_se_abre_y_se_cierra_tras_la_prueba(imgbb_falso):
+    imgbb_falso.respuestas = [500, 500]
+    cliente = crear_cliente(imgbb_falso, reintentos=1, umbral_circuito=2, espera_circuito=0.3)
+
+    with pytest.raises(ErrorImgbb):
+        cliente.subir(IMAGEN)
+    assert cliente.metricas()['circuito'] == CIRCUITO_ABIERTO
+
+    # Abierto: rechaza sin llamar a imgbb
+    with pytest.raises(CircuitoAbierto):
+        cliente.subir(IMAGEN)
+    assert imgbb_falso.recibidas == 2
+    assert cliente.metricas()['rechazadas_circuito'] == 1
+
+    # Pasada la espera deja pasar una prueba (semiabierto) que lo cierra
+    time.sleep(0.35)
+    assert cliente.subir(IMAGEN) == 'http://img.prueba/3.jpg'
+    assert cliente.metricas()['circuito'] == CIRCUITO_CERRADO
+
+
+def test_circuito_semiabierto_se_reabre_si_la_prueba_falla(imgbb_falso):
+    imgbb_falso.respuestas = [500, 500, 500]
+    cliente = crear_cliente(imgbb_falso, reintentos=1, umbral_circuito=2, espera_circuito=0.3)
+
+    with pytest.raises(ErrorImgbb):
+        cliente.subir(IMAGEN)
+
+    time.sleep(0.35)
+    # La prueba falla: vuelve a abrirse y el reintento ya no llega a imgbb
+    with pytest.raises(CircuitoAbierto):
+        cliente.subir(IMAGEN)
+    assert imgbb_falso.recibidas == 3
+    assert cliente.metricas()['circuito'] == CIRCUITO_ABIERTO
+
+    metricas = cliente.metricas()
+    assert metricas['fallidas'] == 2
+    assert metricas['rechazadas_circuito'] == 1
@@ -0,0 +1,73 @@
+"""
+Consultas del inicio de sesión: el usuario y su rol salen de una sola fila
+de sp_autenticar y la petición siguiente los toma de la caché de identidad.
+"""
+import pytest
+from sqlalchemy import event
+from app.models import Rol, Usuario, db
+from app.services.procedimientos import hidratar
+from conftest import CONTRASENA
+
+
+@pytest.fixture
+def consultas(app):
+    """Sentencias SQL ejecutadas mientras dura la prueba"""
+    sentencias = []
+
+    def registrar(conexion, cursor, sentencia, *args):
+        sentencias.append(' '.join(sentencia.lower().split()))
+
+    with app.app_context():
+        motor = db.engine
+    event.listen(motor, 'before_cursor_execute', registrar)
+    yield sentencias
+    event.remove(motor, 'before_cursor_execute', registrar)
+
+
+def de_usuarios_o_roles(sentencias):
+    return [s for s in sentencias if 'from usuarios' in s or 'from roles' in s or 'join roles' in s]
+
+
+def test_login_consulta_usuario_y_rol_una_sola_vez(app, usuarios, procedimientos, consultas):
+    cliente = app.test_client()
+
+    respuesta = cliente.post('/auth/login', data={'email': 'admin@prueba.com', 'password': CONTRASENA})
+
+    assert respuesta.status_code == 302
+    [sentencia] = de_usuarios_o_roles(consultas)
+    assert 'join roles' in sentencia
+
+    # load_user arma el usuario desde la caché: ni usuarios ni roles
+    consultas.clear()
+    respuesta = cliente.get('/auth/perfil')
+
+    assert respuesta.status_code == 200
+    assert de_usuarios_o_roles(consultas) == []
+
+
+def test_login_con_contrasena_incorrecta(app, usuarios, procedimientos):
+    respuesta = app.test_client().post('/auth/login', data={'email': 'admin@prueba.com', 'password': 'otra'})
+
+    assert respuesta.status_code == 200
+    assert 'incorrectos' in respuesta.get_data(as_text=True)
+
+
+def test_hidratar_falla_si_falta_una_columna(app):
+    fila = {'id_usuario': 1, 'nombre_completo': 'Ana', 'email': 'ana@prueba.com',
+            'contrasena': 'hash', 'direccion': 'Av. Prueba 123', 'id_rol': 1}
+
+    with app.app_context():
+        with pytest.raises(Exception, match='columna telefono de Usuario'):
+            hidratar(Usuario, fila)
+
+
+def test_hidratar_con_columnas_renombradas(app):
+    fila = {'id_rol': 1, 'nombre_rol': 'admin'}
+
+    with app.app_context():
+        with pytest.raises(Exception, match='columna nombre de Rol'):
+            hidratar(Rol, fila)
+
+        rol = hidratar(Rol, fila, nombre='nombre_rol')
+        assert (rol.id_rol, rol.nombre) == (1, 'admin')
+        db.session.rollback()
@@ -0,0 +1,67 @@
+"""
+Reserva de stock concurrente: muchos checkouts a la vez sobre el mismo
+producto nunca venden más unidades de las que hay.
+"""
+import threading
+import time
+import pytest
+from app.models import Producto, db
+from app.services.inventario import StockInsuficiente, reservar_stock
+from conftest import crear_productos
+
+HILOS = 16
+INTENTOS_POR_HILO = 10
+STOCK = 50
+
+
+def test_reservas_concurrentes_no_sobrevenden(app, bd):
+    [id_producto] = crear_productos(app, 1, stock=STOCK)
+    exitos = []
+    rechazos = []
+    errores = []
+    inicio_comun = threading.Barrier(HILOS)
+
+    def comprar():
+        inicio_comun.wait()
+        for _ in range(INTENTOS_POR_HILO):
+            with app.app_context():
+                try:
+                    reservar_stock({id_producto: 1})
+                    db.session.commit()
+                    exitos.append(1)
+                except StockInsuficiente:
+                    rechazos.append(1)
+                except Exception as e:
+                    db.session.rollback()
+                    errores.append(e)
+
+    hilos = [threading.Thread(target=comprar) for _ in range(HILOS)]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.perf_counter() - inicio
+
+    with app.app_context():
+        stock_final = db.session.get(Producto, id_producto).stock
+
+    print(f'\n{HILOS * INTENTOS_POR_HILO} checkouts en {duracion:.2f} s '
+          f'({HILOS * INTENTOS_POR_HILO / duracion:.0f} checkouts/s)')
+    assert errores == []
+    assert len(exitos) == STOCK
+    assert len(rechazos) == HILOS * INTENTOS_POR_HILO - STOCK
+    assert stock_final == 0
+
+
+def test_reserva_de_varios_productos_es_todo_o_nada(app, bd):
+    id_a, id_b = crear_productos(app, 2, stock=3)
+
+    with app.app_context():
+        with pytest.raises(StockInsuficiente) as error:
+            reservar_stock({id_a: 2, id_b: 5})
+        db.session.commit()
+
+        assert error.value.nombres == ['Producto 1']
+
+        assert [p.stock for p in Producto.query.order_by(Producto.id_producto)] == [3, 3]
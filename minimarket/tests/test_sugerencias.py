@@ -0,0 +1,79 @@
+"""
+Sugerencias del buscador: resultados por prefijo sin tildes y latencia con
+un catálogo de 10.000 productos.
+"""
+import os
+import random
+import time
+from sqlalchemy import insert
+from app.models import Categoria, Producto, db
+from app.services.busqueda import construir_indice
+from app.services.cache_catalogo import invalidar_categorias
+
+PRODUCTOS = 10000
+# Se puede relajar en máquinas lentas: SUGERENCIAS_P99_MS=20 python -m pytest
+LIMITE_P99_MS = float(os.environ.get('SUGERENCIAS_P99_MS', 10))
+PALABRAS = ['leche', 'pan', 'arroz', 'gaseosa', 'plátano', 'manzana', 'queso', 'yogur', 'aceite',
+            'azúcar', 'café', 'galleta', 'jugo', 'agua', 'detergente', 'jabón', 'papel', 'pollo']
+
+
+def sembrar_catalogo(app):
+    azar = random.Random(18)
+    with app.app_context():
+        categorias = [Categoria(nombre=nombre) for nombre in ('Abarrotes', 'Bebidas', 'Limpieza')]
+        db.session.add_all(categorias)
+        db.session.flush()
+        db.session.execute(insert(Producto), [
+            {
+                'nombre': f'{azar.choice(PALABRAS).capitalize()} {azar.choice(PALABRAS)} {i}',
+                'precio': 2.5,
+                'stock': i % 3,
+                'id_categoria': azar.choice(categorias).id_categoria
+            }
+            for i in range(PRODUCTOS)
+        ])
+        db.session.commit()
+        construir_indice()
+
+
+def medir(cliente, consultas):
+    latencias = []
+    for texto in consultas:
+        inicio = time.perf_counter()
+        respuesta = cliente.get('/productos/sugerencias', query_string={'q': texto})
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        assert respuesta.status_code == 200
+    latencias.sort()
+    return latencias[len(latencias) // 2], latencias[min(len(latencias) - 1, int(len(latencias) * 0.99))]
+
+
+def test_sugerencias_ignoran_tildes_y_mayusculas(app, bd):
+    sembrar_catalogo(app)
+    cliente = app.test_client()
+
+    sugerencias = cliente.get('/productos/sugerencias?q=PLATA').get_json()['sugerencias']
+
+    assert len(sugerencias) == 8
+    assert all('plátano' in s['nombre'].lower() for s in sugerencias)
+    assert cliente.get('/productos/sugerencias?q=p').get_json()['sugerencias'] == []
+
+
+def test_latencia_de_sugerencias_con_10000_productos(app, bd):
+    sembrar_catalogo(app)
+    cliente = app.test_client()
+    prefijos = [palabra[:n] for palabra in PALABRAS for n in range(2, len(palabra) + 1)]
+    prefijos += ['leche 1', 'pan arr', 'xyz']
+    cliente.get('/productos/sugerencias?q=calentamiento')
+
+    # Sin caché: cada prefijo recorre el índice y consulta sus productos
+    invalidar_categorias()
+    p50_frio, p99_frio = medir(cliente, prefijos)
+
+    # Tráfico repetido: la mayoría sale de la caché de sugerencias
+    azar = random.Random(99)
+    p50, p99 = medir(cliente, [azar.choice(prefijos) for _ in range(1000)])
+
+    print(f'\nsugerencias ({PRODUCTOS} productos): sin caché p50 {p50_frio:.2f} ms p99 {p99_frio:.2f} ms; '
+          f'con caché p50 {p50:.2f} ms p99 {p99:.2f} ms')
+    assert p99_frio < LIMITE_P99_MS
+    assert p99 < LIMITE_P99_MS
@@ -0,0 +1,123 @@
+"""
+Subida de imágenes en segundo plano con imgbb reemplazado por un servidor
+local: el estado de la tarea se consulta en /productos/api/imagen/<id>.
+"""
+import io
+import time
+from datetime import timedelta
+import pytest
+from PIL import Image
+from app.models import Producto, TareaImagen, db, get_local_datetime
+from app.services.tareas_imagenes import ESTADOS_EN_CURSO, MINUTOS_TAREA_VENCIDA
+from conftest import crear_productos
+
+
+@pytest.fixture
+def imgbb(app, monkeypatch, imgbb_falso):
+    """La app sube al servidor falso con un cliente nuevo"""
+    monkeypatch.setitem(app.config, 'IMAGENES_BACKEND', 'imgbb')
+    monkeypatch.setitem(app.config, 'IMGBB_API_URL', imgbb_falso.url)
+    monkeypatch.setitem(app.config, 'IMGBB_ESPERA_BASE', 0)
+    monkeypatch.setattr('app.services.cliente_imgbb._cliente', None)
+    return imgbb_falso
+
+
+def imagen_png():
+    contenido = io.BytesIO()
+    Image.new('RGB', (800, 600), (200, 10, 10)).save(contenido, 'PNG')
+    contenido.seek(0)
+    return contenido
+
+
+def subir_imagen(admin, id_producto, archivo, nombre='foto.png'):
+    return admin.post(f'/productos/admin/producto/{id_producto}/editar', data={
+        'nombre': 'Producto 0', 'precio': '2.50', 'stock': '5', 'id_categoria': '1',
+        'imagen': (archivo, nombre)
+    }, content_type='multipart/form-data')
+
+
+def ultima_tarea(app):
+    with app.app_context():
+        return TareaImagen.query.order_by(TareaImagen.actualizado.desc()).first().id_tarea
+
+
+def esperar_tarea(admin, id_tarea, limite=30):
+    """Estados vistos al consultar la tarea hasta que termina"""
+    vistos = []
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        datos = admin.get(f'/productos/api/imagen/{id_tarea}').get_json()
+        if not vistos or vistos[-1]['estado'] != datos['estado']:
+            vistos.append(datos)
+        if datos['estado'] not in ESTADOS_EN_CURSO:
+            return vistos
+        time.sleep(0.05)
+    raise AssertionError(f'La tarea {id_tarea} no terminó: {vistos}')
+
+
+def test_subida_pasa_de_pendiente_a_completada(app, usuarios, cliente_como, imgbb):
+    [id_producto] = crear_productos(app, 1)
+    admin = cliente_como(usuarios['admin'])
+    # La primera subida tarda: la tarea se ve en curso antes de completarse
+    imgbb.respuestas = [('lenta', 0.5)]
+
+    respuesta = subir_imagen(admin, id_producto, imagen_png())
+    assert respuesta.status_code == 302
+
+    vistos = esperar_tarea(admin, ultima_tarea(app))
+
+    assert vistos[0]['estado'] in ESTADOS_EN_CURSO
+    final = vistos[-1]
+    assert final['estado'] == 'completada', final['mensaje']
+    assert final['imagen_url'].startswith('http://img.prueba/')
+    assert imgbb.recibidas >= 2
+    with app.app_context():
+        producto = db.session.get(Producto, id_producto)
+        assert producto.imagen_url == final['imagen_url']
+        assert len(producto.imagenes) == imgbb.recibidas
+
+
+def test_imagen_invalida_termina_en_error(app, usuarios, cliente_como, imgbb):
+    [id_producto] = crear_productos(app, 1)
+    admin = cliente_como(usuarios['admin'])
+
+    subir_imagen(admin, id_producto, io.BytesIO(b'no es una imagen'), nombre='foto.jpg')
+    final = esperar_tarea(admin, ultima_tarea(app))[-1]
+
+    assert final['estado'] == 'error'
+    assert imgbb.recibidas == 0
+
+
+def test_tarea_desconocida_responde_404(app, usuarios, cliente_como):
+    respuesta = cliente_como(usuarios['admin']).get('/productos/api/imagen/no-existe')
+
+    assert respuesta.status_code == 404
+    assert respuesta.get_json()['success'] is False
+
+
+def test_estado_solo_para_administradores(app, usuarios, cliente_como):
+    respuesta = cliente_como(usuarios['cliente']).get('/productos/api/imagen/no-existe')
+
+    assert respuesta.status_code == 403
+
+
+def test_tarea_en_curso_vencida_se_informa_como_error(app, usuarios, cliente_como):
+    [id_producto] = crear_productos(app, 1)
+    admin = cliente_como(usuarios['admin'])
+    vencida = get_local_datetime() - timedelta(minutes=MINUTOS_TAREA_VENCIDA + 1)
+    with app.app_context():
+        db.session.add_all([
+            TareaImagen(id_tarea='vencida', id_producto=id_producto, estado='procesando',
+                        mensaje='Procesando imagen', actualizado=vencida),
+            TareaImagen(id_tarea='reciente', id_producto=id_producto, estado='procesando',
+                        mensaje='Procesando imagen')
+        ])
+        db.session.commit()
+
+    assert admin.get('/productos/api/imagen/vencida').get_json()['estado'] == 'error'
+    assert admin.get('/productos/api/imagen/reciente').get_json()['estado'] == 'procesando'
+
+    # El listado ya no la muestra como pendiente
+    listado = admin.get('/productos/admin/productos').get_data(as_text=True)
+    assert 'vencida' not in listado
+    assert 'reciente' in listado